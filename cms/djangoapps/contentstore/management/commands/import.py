@@ -20,15 +20,23 @@ class Command(BaseCommand):
         make_option('--nostatic',
                     action='store_true',
                     help='Skip import of static content'),
+        make_option('--incremental',
+                    action='store_true',
+                    help='Only write the modules which changed since the last import, '
+                         'and delete the ones which were removed'),
     )
 
     def handle(self, *args, **options):
         "Execute the command"
         if len(args) == 0:
-            raise CommandError("import requires at least one argument: <data directory> [--nostatic] [<course dir>...]")
+            raise CommandError(
+                "import requires at least one argument: "
+                "<data directory> [--nostatic] [--incremental] [<course dir>...]"
+            )
 
         data_dir = args[0]
         do_import_static = not (options.get('nostatic', False))
+        incremental = options.get('incremental', False)
         if len(args) > 1:
             course_dirs = args[1:]
         else:
@@ -47,7 +55,7 @@ class Command(BaseCommand):
         _, course_items = import_from_xml(
             mstore, data_dir, course_dirs, load_error_modules=False,
             static_content_store=contentstore(), verbose=True,
-            do_import_static=do_import_static
+            do_import_static=do_import_static, incremental=incremental
         )
 
         for module in course_items:
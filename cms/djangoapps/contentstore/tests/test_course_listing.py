@@ -8,13 +8,14 @@ from unittest import skip
 
 from django.contrib.auth.models import Group
 from django.test import RequestFactory
+from django.test.utils import override_settings
 
 from contentstore.views.course import _accessible_courses_list, _accessible_courses_list_from_groups
 from contentstore.tests.utils import AjaxEnabledTestClient
 from student.tests.factories import UserFactory
 from student.roles import CourseInstructorRole, CourseStaffRole
 from xmodule.modulestore import Location
-from xmodule.modulestore.django import loc_mapper
+from xmodule.modulestore.django import loc_mapper, modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory
@@ -145,6 +146,51 @@ class TestCourseListing(ModuleStoreTestCase):
         with self.assertRaises(ItemNotFoundError):
             courses_list_by_groups = _accessible_courses_list_from_groups(request)
 
+    def test_course_summaries(self):
+        """
+        Test the course summaries follow course updates and the course listing pages through them
+        """
+        for number in range(3):
+            course_location = Location(['i4x', 'Org{}'.format(number), 'Course', 'course', 'Run'])
+            course = self._create_course_with_access_groups(course_location, 'group_name_with_dots', self.user)
+        course.display_name = 'A changed name'
+        modulestore('direct').update_item(course, self.user.id)
+
+        summaries = modulestore('direct').get_course_summaries()
+        self.assertEqual(
+            [(summary['display_name'], summary['lower_id']) for summary in summaries],
+            [('A changed name', 'org2.course.run'), ('Run', 'org0.course.run'), ('Run', 'org1.course.run')]
+        )
+        self.assertEqual(modulestore('direct').count_course_summaries(lower_ids=['org1.course.run']), 1)
+
+        with override_settings(COURSE_LISTING_PAGE_SIZE=2):
+            response = self.client.get_html('/course')
+            self.assertContains(response, 'A changed name')
+            self.assertNotContains(response, 'Org1')
+            self.assertContains(response, '?page=2')
+
+            response = self.client.get_html('/course', {'page': 2})
+            self.assertContains(response, 'Org1')
+            self.assertNotContains(response, '?page=3')
+
+    def test_course_summaries_of_older_courses(self):
+        """
+        Test that courses created before the course summary index existed are listed, even once
+        newer courses were added to the index
+        """
+        for number in range(2):
+            course_location = Location(['i4x', 'Org{}'.format(number), 'Course', 'course', 'Run'])
+            self._create_course_with_access_groups(course_location, 'group_name_with_dots', self.user)
+        modulestore('direct').course_summaries.drop()
+        course_location = Location(['i4x', 'Org2', 'Course', 'course', 'Run'])
+        self._create_course_with_access_groups(course_location, 'group_name_with_dots', self.user)
+
+        summaries = modulestore('direct').get_course_summaries()
+        self.assertEqual(
+            [summary['lower_id'] for summary in summaries],
+            ['org0.course.run', 'org1.course.run', 'org2.course.run']
+        )
+
 
     # Temporarily disabling this test because it caused the following failure intermittently in Jenkins.
     # Perhaps due to a test ordering or cleanup issue?
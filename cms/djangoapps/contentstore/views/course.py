@@ -19,7 +19,6 @@ from django.http import HttpResponseBadRequest, HttpResponseNotFound
 from util.json_request import JsonResponse
 from edxmako.shortcuts import render_to_response
 
-from xmodule.error_module import ErrorDescriptor
 from xmodule.modulestore.django import modulestore, loc_mapper
 from xmodule.contentstore.content import StaticContent
 
@@ -159,35 +158,29 @@ def _xmodule_json(xmodule, course_id):
     return result
 
 
-def _accessible_courses_list(request):
+def _course_summary_location(course):
     """
-    List all courses available to the logged in user by iterating through all the courses
+    Returns the Location of the course with the given summary (see MongoModuleStore.get_course_summaries)
     """
-    courses = modulestore('direct').get_courses()
+    return Location('i4x', course['org'], course['course'], 'course', course['run'])
 
-    # filter out courses that we don't have access too
-    def course_filter(course):
-        """
-        Get courses to which this user has access
-        """
-        if GlobalStaff().has_user(request.user):
-            return course.location.course != 'templates'
 
-        return (has_course_access(request.user, course.location)
-                # pylint: disable=fixme
-                # TODO remove this condition when templates purged from db
-                and course.location.course != 'templates'
-                )
-    courses = filter(course_filter, courses)
-    return courses
+def _accessible_courses_list(request):
+    """
+    List the summaries of all courses available to the logged in user by iterating through all the
+    course summaries (the templates are left out by the modulestore)
+    """
+    courses = modulestore('direct').get_course_summaries()
+    if GlobalStaff().has_user(request.user):
+        return courses
+    return [course for course in courses if has_course_access(request.user, _course_summary_location(course))]
 
 
 # pylint: disable=invalid-name
 def _accessible_courses_list_from_groups(request):
     """
-    List all courses available to the logged in user by reversing access group names
+    List the summaries of all courses available to the logged in user by reversing access group names
     """
-    courses_list = []
     course_ids = set()
 
     user_staff_group_names = request.user.groups.filter(
@@ -207,16 +200,10 @@ def _accessible_courses_list_from_groups(request):
 
         course_ids.add(course_id.replace('/', '.').lower())
 
-    for course_id in course_ids:
-        # get course_location with lowercase id
-        course_location = loc_mapper().translate_locator_to_location(
-            CourseLocator(package_id=course_id), get_course=True, lower_only=True
-        )
-        if course_location is None:
-            raise ItemNotFoundError(course_id)
-
-        course = modulestore('direct').get_course(course_location.course_id)
-        courses_list.append(course)
+    courses_list = modulestore('direct').get_course_summaries(lower_ids=course_ids)
+    missing_course_ids = course_ids.difference(course['lower_id'] for course in courses_list)
+    if missing_course_ids:
+        raise ItemNotFoundError(missing_course_ids.pop())
 
     return courses_list
 
@@ -225,13 +212,23 @@ def _accessible_courses_list_from_groups(request):
 @ensure_csrf_cookie
 def course_listing(request):
     """
-    List all courses available to the logged in user
+    List all courses available to the logged in user, a page (the 'page' GET parameter, from 1) at a time
     Try to get all courses by first reversing django groups and fallback to old method if it fails
     Note: overhead of pymongo reads will increase if getting courses from django groups fails
     """
+    page_size = settings.COURSE_LISTING_PAGE_SIZE
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * page_size
+
     if GlobalStaff().has_user(request.user):
-        # user has global access so no need to get courses from django groups
-        courses = _accessible_courses_list(request)
+        # user has global access so no need to get courses from django groups, and the
+        # modulestore can page through the courses
+        store = modulestore('direct')
+        course_count = store.count_course_summaries()
+        courses = store.get_course_summaries(start=start, count=page_size)
     else:
         try:
             courses = _accessible_courses_list_from_groups(request)
@@ -242,28 +239,34 @@ def course_listing(request):
 
             # update location entry in "loc_mapper" for user courses (add keys 'lower_id' and 'lower_course_id')
             for course in courses:
-                loc_mapper().create_map_entry(course.location)
+                loc_mapper().create_map_entry(_course_summary_location(course))
+        course_count = len(courses)
+        courses = courses[start:start + page_size]
 
     def format_course_for_view(course):
         """
         return tuple of the data which the view requires for each course
         """
+        course_location = _course_summary_location(course)
         # published = false b/c studio manipulates draft versions not b/c the course isn't pub'd
         course_loc = loc_mapper().translate_location(
-            course.location.course_id, course.location, published=False, add_entry_if_missing=True
+            course_location.course_id, course_location, published=False, add_entry_if_missing=True
         )
         return (
-            course.display_name,
+            course['display_name'],
             # note, couldn't get django reverse to work; so, wrote workaround
             course_loc.url_reverse('course/', ''),
-            get_lms_link_for_item(course.location),
-            course.display_org_with_default,
-            course.display_number_with_default,
-            course.location.name
+            get_lms_link_for_item(course_location),
+            course['display_org_with_default'],
+            course['display_number_with_default'],
+            course['run']
         )
 
     return render_to_response('index.html', {
-        'courses': [format_course_for_view(c) for c in courses if not isinstance(c, ErrorDescriptor)],
+        'courses': [format_course_for_view(c) for c in courses],
+        'page': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if start + page_size < course_count else None,
         'user': request.user,
         'request_course_creator_url': reverse('contentstore.views.request_course_creator'),
         'course_creator_status': _get_course_creator_status(request.user),
@@ -10,6 +10,7 @@ from datetime import datetime
 from io import BytesIO
 from pytz import UTC
 import json
+import pymongo
 from contentstore.tests.utils import CourseTestCase
 from contentstore.views import assets
 from xmodule.contentstore.content import StaticContent
@@ -93,6 +94,55 @@ class PaginationTestCase(AssetsTestCase):
         self.assert_correct_asset_response(self.url + "?page_size=2&page=2", 2, 1, 3)
         self.assert_correct_asset_response(self.url + "?page_size=3&page=1", 0, 3, 3)
 
+    def test_sequential_pages(self):
+        for number in range(1, 6):
+            self.upload_asset("asset-{}".format(number))
+        url = self.url + "?page_size=2&sort=display_name&direction=asc&page="
+
+        # the pages after the first one start after the last asset of the previous page
+        names = []
+        for page in range(3):
+            resp = self.client.get(url + str(page), HTTP_ACCEPT='application/json')
+            names.extend(asset['display_name'] for asset in json.loads(resp.content)['assets'])
+        self.assertEqual(names, ["asset-{}.txt".format(number) for number in range(1, 6)])
+
+        # a new asset changes the pages and the count
+        self.upload_asset("asset-0")
+        resp = self.client.get(url + "1", HTTP_ACCEPT='application/json')
+        json_response = json.loads(resp.content)
+        self.assertEqual(json_response['totalCount'], 6)
+        self.assertEqual(
+            [asset['display_name'] for asset in json_response['assets']], ["asset-2.txt", "asset-3.txt"]
+        )
+
+    def test_descending_pages_without_display_name(self):
+        for number in range(1, 4):
+            self.upload_asset("asset-{}".format(number))
+        contentstore().fs_files.update({'_id.name': 'asset-1.txt'}, {'$unset': {'displayname': True}})
+
+        names = []
+        for start in (0, 2):
+            assets, count = contentstore().get_all_content_for_course(
+                self.course.location, start=start, maxresults=2, sort=[('displayname', pymongo.DESCENDING)]
+            )
+            self.assertEqual(count, 3)
+            names.extend(asset['_id']['name'] for asset in assets)
+        self.assertEqual(names, ["asset-3.txt", "asset-2.txt", "asset-1.txt"])
+
+    def test_count_after_concurrent_deletes(self):
+        for number in range(1, 4):
+            self.upload_asset("asset-{}".format(number))
+        content_id = StaticContent.get_id_from_location(
+            StaticContent.compute_location(self.course.location.org, self.course.location.course, "asset-1.txt")
+        )
+        _, count = contentstore().get_all_content_for_course(self.course.location, maxresults=1)
+        self.assertEqual(count, 3)
+        # a second delete of the same content, e.g. from another process, doesn't change the count again
+        contentstore().delete(content_id)
+        contentstore().delete(content_id)
+        _, count = contentstore().get_all_content_for_course(self.course.location, maxresults=1)
+        self.assertEqual(count, 2)
+
     def assert_correct_asset_response(self, url, expected_start, expected_length, expected_total):
         resp = self.client.get(url, HTTP_ACCEPT='application/json')
         json_response = json.loads(resp.content)
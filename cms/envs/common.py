@@ -539,6 +539,9 @@ YOUTUBE_API = {
 MAX_FAILED_LOGIN_ATTEMPTS_ALLOWED = 5
 MAX_FAILED_LOGIN_ATTEMPTS_LOCKOUT_PERIOD_SECS = 15 * 60
 
+# Number of courses per page of the Studio course listing
+COURSE_LISTING_PAGE_SIZE = 100
+
 
 ### Apps only installed in some instances
 
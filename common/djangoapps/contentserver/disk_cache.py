@@ -0,0 +1,258 @@
+"""
+A local disk cache for static content that is too large to keep in memcached.
+
+Each app server keeps its own copy of the data of large assets on disk, keyed by
+the asset's location and md5, so that a changed asset is never served from a
+stale file. memcached holds a data-less `CachedFileContent` for each such asset,
+so that once every server has a copy, serving the asset doesn't touch GridFS.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from xmodule.contentstore.content import StaticContent
+
+log = logging.getLogger(__name__)
+
+# read files in chunks of this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+class CachedFileContent(StaticContent):
+    """
+    Static content whose data is kept in a file in the local disk cache.
+
+    Only the asset's attributes are pickled, so instances cached in memcached
+    have no `data_file` until they're found in the disk cache of the server
+    using them. `data_file` is opened when the content is found, so that the
+    data stays readable even if the file is evicted while it's being served.
+    """
+    def __init__(self, content, data_file=None):
+        super(CachedFileContent, self).__init__(
+            content.location, content.name, content.content_type, None,
+            last_modified_at=content.last_modified_at, thumbnail_location=content.thumbnail_location,
+            import_path=content.import_path, length=content.length, locked=content.locked,
+            content_digest=content.content_digest,
+        )
+        self.data_file = data_file
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['data_file'] = None
+        return state
+
+    @property
+    def data(self):
+        self.data_file.seek(0)
+        return self.data_file.read()
+
+    def stream_data(self):
+        return self.stream_data_in_range(0, self.length - 1)
+
+    def stream_data_in_range(self, first_byte, last_byte):
+        """
+        Stream the data from first_byte to last_byte, inclusive, from a memory map
+        of the file, and close the file once done
+        """
+        try:
+            if self.length == 0:
+                return
+            data_map = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for position in xrange(first_byte, last_byte + 1, CHUNK_SIZE):
+                    yield data_map[position:min(position + CHUNK_SIZE, last_byte + 1)]
+            finally:
+                data_map.close()
+        finally:
+            self.data_file.close()
+
+    def close(self):
+        """
+        Close the file, for when the data won't be streamed
+        """
+        if self.data_file is not None:
+            self.data_file.close()
+
+
+class DiskContentCache(object):
+    """
+    A size bounded cache of static content data in `directory`, which evicts the
+    least recently used files once they take up more than `max_bytes`.
+
+    Files are written atomically, so several processes can share a directory.
+    Each process keeps a running total of the size of the cache, which it
+    corrects by listing the directory at least every RESCAN_INTERVAL seconds,
+    and whenever it has to evict files.
+    """
+    # how often (in seconds) to list the directory, to count files that other
+    # processes added or evicted
+    RESCAN_INTERVAL = 5 * 60
+    # eviction removes files until the cache is no larger than this fraction of
+    # max_bytes, so that it isn't needed again on the next store
+    EVICT_TO_FRACTION = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        # the size of the cache when the directory was last listed, plus what we stored since
+        self._size = None
+        self._scanned_at = None
+        # paths of files that this process is copying into the cache
+        self._storing = set()
+
+    def _path(self, content):
+        """
+        Return the path of the file holding the data of `content`
+        """
+        location_hash = hashlib.sha1(unicode(content.location).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, u'{}.{}'.format(location_hash, content.content_digest))
+
+    def get(self, content):
+        """
+        Return a CachedFileContent for `content`, with its file open, if its data is
+        in the cache, else None
+        """
+        path = self._path(content)
+        try:
+            data_file = open(path, 'rb')
+            # mark the file as recently used
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return CachedFileContent(content, data_file)
+
+    def store_while_streaming(self, content, on_stored=None):
+        """
+        Yield the data of `content`, a StaticContentStream, while copying it into the
+        cache, so that the request which copies it doesn't wait for the whole copy.
+
+        The copy is only kept if all of the data was streamed, after which `on_stored`
+        is called with a data-less CachedFileContent for it. If this process is
+        already copying the same content, the data is only streamed.
+        """
+        path = self._path(content)
+        with self._lock:
+            if path in self._storing:
+                copying = False
+            else:
+                copying = True
+                self._storing.add(path)
+        if not copying:
+            for chunk in content.stream_data():
+                yield chunk
+            return
+
+        try:
+            temp_fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            stored = False
+            try:
+                with os.fdopen(temp_fd, 'wb') as temp_file:
+                    for chunk in content.stream_data():
+                        temp_file.write(chunk)
+                        yield chunk
+                os.rename(temp_path, path)
+                stored = True
+            finally:
+                if not stored:
+                    os.remove(temp_path)
+        finally:
+            with self._lock:
+                self._storing.discard(path)
+
+        self._add_size(content.length)
+        if on_stored is not None:
+            on_stored(CachedFileContent(content))
+
+    def store_in_background(self, content, load_stream, on_stored=None):
+        """
+        Copy the data of `content` into the cache from a background thread, reading
+        it from the StaticContentStream returned by `load_stream`, for requests
+        which don't stream all of the data themselves (e.g. Range requests).
+        See `store_while_streaming`.
+        """
+        def _store():
+            """
+            Copy the content, logging any failure
+            """
+            try:
+                for _ in self.store_while_streaming(load_stream(), on_stored):
+                    pass
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Failed to copy %s into the disk cache", content.location)
+
+        thread = threading.Thread(target=_store, name='DiskContentCache')
+        thread.daemon = True
+        thread.start()
+
+    def _add_size(self, size):
+        """
+        Count `size` newly stored bytes, and evict files if the cache is too large
+        """
+        with self._lock:
+            if self._size is not None and time.time() - self._scanned_at < self.RESCAN_INTERVAL:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+        self._evict()
+
+    def _evict(self):
+        """
+        List the directory to find the size of the cache, and if it's larger than
+        max_bytes, remove the least recently used files until it fits in
+        EVICT_TO_FRACTION of max_bytes
+        """
+        entries = []
+        total_bytes = 0
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.tmp'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # another process evicted it
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+        if total_bytes > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes * self.EVICT_TO_FRACTION:
+                    break
+                try:
+                    # files that are being served stay readable until they're closed
+                    os.remove(path)
+                except OSError:
+                    pass
+                total_bytes -= size
+
+        with self._lock:
+            self._size = total_bytes
+            self._scanned_at = time.time()
+
+
+_DISK_CACHE = {}
+
+
+def disk_cache():
+    """
+    Return the DiskContentCache configured by settings.CONTENTSERVER_DISK_CACHE_DIR,
+    or None if it isn't set
+    """
+    directory = getattr(settings, 'CONTENTSERVER_DISK_CACHE_DIR', None)
+    if not directory:
+        return None
+    if directory not in _DISK_CACHE:
+        _DISK_CACHE[directory] = DiskContentCache(
+            directory, getattr(settings, 'CONTENTSERVER_DISK_CACHE_MAX_BYTES', 10 * 1024 ** 3)
+        )
+    return _DISK_CACHE[directory]
@@ -1,13 +1,55 @@
+import calendar
+
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
+from django.utils.http import http_date, parse_http_date_safe
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
 from xmodule.contentstore.content import StaticContent, XASSET_LOCATION_TAG
 from xmodule.modulestore import InvalidLocationError
 from cache_toolbox.core import get_cached_content, set_cached_content
+from contentserver.disk_cache import CachedFileContent, disk_cache
 from xmodule.exceptions import NotFoundError
 
+# Static content smaller than this is cached in memcached
+MAX_MEMCACHED_CONTENT_LENGTH = 1048576
+
+
+def parse_range_header(header_value, content_length):
+    """
+    Return the (first byte, last byte) positions, inclusive, that the Range
+    header `header_value` asks for out of `content_length` bytes, or None if it
+    isn't a single, well-formed byte range, in which case the header is ignored
+    and the whole content should be sent (RFC 7233, section 3.1).
+
+    Raises ValueError if the range is well-formed but can't be satisfied.
+    """
+    units, _, byte_range = header_value.partition('=')
+    if units.strip() != 'bytes' or ',' in byte_range:
+        return None
+    first, _, last = byte_range.strip().partition('-')
+    try:
+        if first:
+            first_byte = int(first)
+            last_byte = int(last) if last else content_length - 1
+        else:
+            # a suffix range: the last n bytes
+            suffix_length = int(last)
+    except ValueError:
+        return None
+    if first:
+        if first_byte < 0 or (last and first_byte > last_byte):
+            return None
+    else:
+        if suffix_length < 0:
+            return None
+        first_byte = max(content_length - suffix_length, 0)
+        last_byte = content_length - 1
+    if first_byte >= content_length:
+        raise ValueError(header_value)
+    return first_byte, min(last_byte, content_length - 1)
+
 
 class StaticContentServer(object):
     def process_request(self, request):
@@ -23,6 +65,11 @@ class StaticContentServer(object):
 
             # first look in our cache so we don't have to round-trip to the DB
             content = get_cached_content(loc)
+            local_disk_cache = disk_cache()
+            cache_on_disk = False
+            if isinstance(content, CachedFileContent):
+                # the data of large assets is cached on local disk, if this server has read it before
+                content = local_disk_cache.get(content) if local_disk_cache is not None else None
             if content is None:
                 # nope, not in cache, let's fetch from DB
                 try:
@@ -35,10 +82,18 @@ class StaticContentServer(object):
                 # since we fetched it from DB, let's cache it going forward, but only if it's < 1MB
                 # this is because I haven't been able to find a means to stream data out of memcached
                 if content.length is not None:
-                    if content.length < 1048576:
+                    if content.length < MAX_MEMCACHED_CONTENT_LENGTH:
                         # since we've queried as a stream, let's read in the stream into memory to set in cache
                         content = content.copy_to_in_mem()
                         set_cached_content(content)
+                    elif local_disk_cache is not None and content.content_digest:
+                        # larger assets can be cached on local disk instead
+                        cached_file = local_disk_cache.get(content)
+                        if cached_file is not None:
+                            content = cached_file
+                            set_cached_content(content)
+                        else:
+                            cache_on_disk = True
             else:
                 # NOP here, but we may wish to add a "cache-hit" counter in the future
                 pass
@@ -46,24 +101,107 @@ class StaticContentServer(object):
             # Check that user has access to content
             if getattr(content, "locked", False):
                 if not hasattr(request, "user") or not request.user.is_authenticated():
+                    self._close(content)
                     return HttpResponseForbidden('Unauthorized')
                 course_partial_id = "/".join([loc.org, loc.course])
                 if not request.user.is_staff and not CourseEnrollment.is_enrolled_by_partial(
                         request.user, course_partial_id):
+                    self._close(content)
                     return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
+            # convert over the DB persistent last modified timestamp to a HTTP compatible one
+            last_modified_at = calendar.timegm(content.last_modified_at.utctimetuple())
+            # getattr b/c caching may mean some pickled instances don't have attr
+            content_digest = getattr(content, 'content_digest', None)
+            etag = u'"{}"'.format(content_digest) if content_digest else None
+
+            # see if the client has cached this content, if so then just return a 304 (Not Modified)
+            if self._is_not_modified(request, etag, last_modified_at):
+                self._close(content)
+                response = HttpResponseNotModified()
+                if etag:
+                    response['ETag'] = etag
+                return response
+
+            # serve a single byte range, if asked for, seeking straight to it in the stream
+            byte_range = None
+            if 'HTTP_RANGE' in request.META and content.length is not None and \
+                    self._if_range_matches(request, etag, last_modified_at):
+                try:
+                    byte_range = parse_range_header(request.META['HTTP_RANGE'], content.length)
+                except ValueError:
+                    self._close(content)
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = 'bytes */{}'.format(content.length)
+                    return response
 
-            # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            if byte_range is not None:
+                first_byte, last_byte = byte_range
+                if cache_on_disk:
+                    # this request only reads part of the data, so copy all of it into the cache separately
+                    local_disk_cache.store_in_background(
+                        content, lambda: contentstore().find(loc, as_stream=True), set_cached_content
+                    )
+                response = HttpResponse(
+                    content.stream_data_in_range(first_byte, last_byte), content_type=content.content_type, status=206
+                )
+                response['Content-Range'] = 'bytes {}-{}/{}'.format(first_byte, last_byte, content.length)
+                response['Content-Length'] = str(last_byte - first_byte + 1)
+            elif cache_on_disk:
+                # copy the data into the cache as it's sent, and cache the asset once it's all there
+                response = HttpResponse(
+                    local_disk_cache.store_while_streaming(content, set_cached_content),
+                    content_type=content.content_type
+                )
+                response['Content-Length'] = str(content.length)
+            else:
+                response = HttpResponse(content.stream_data(), content_type=content.content_type)
+                if content.length is not None:
+                    response['Content-Length'] = str(content.length)
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
-            response['Last-Modified'] = last_modified_at_str
+            response['Accept-Ranges'] = 'bytes'
+            response['Last-Modified'] = http_date(last_modified_at)
+            if etag:
+                response['ETag'] = etag
 
             return response
+
+    @staticmethod
+    def _close(content):
+        """
+        Close the stream or file which `content` would have served its data from, if any,
+        when responding without the data
+        """
+        close = getattr(content, 'close', None)
+        if close is not None:
+            close()
+
+    @staticmethod
+    def _is_not_modified(request, etag, last_modified_at):
+        """
+        Whether the request's conditional headers show that the client's copy,
+        with `etag` and last modified at the `last_modified_at` timestamp, is current.
+        If-None-Match takes precedence over If-Modified-Since.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            if etag is None:
+                return False
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and last_modified_at <= if_modified_since
+
+    @staticmethod
+    def _if_range_matches(request, etag, last_modified_at):
+        """
+        Whether a Range header should be honored given the request's If-Range
+        header, which makes the range conditional on the content being unchanged
+        """
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == etag
+        return parse_http_date_safe(if_range) == last_modified_at
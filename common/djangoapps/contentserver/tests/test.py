@@ -3,6 +3,10 @@ Tests for StaticContentServer
 """
 import copy
 import logging
+import os
+import shutil
+import tempfile
+from mock import patch
 from uuid import uuid4
 from path import path
 from pymongo import MongoClient
@@ -12,6 +16,8 @@ from django.conf import settings
 from django.test.client import Client
 from django.test.utils import override_settings
 
+from cache_toolbox.core import del_cached_content
+from contentserver.disk_cache import CachedFileContent, DiskContentCache, disk_cache
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore, _CONTENTSTORE
@@ -134,3 +140,102 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) #pylint: disable=E1103
 
+
+    def test_range_request(self):
+        """
+        Test that a single byte range is served as partial content.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes 0-9/577')
+        self.assertEqual(len(resp.content), 10)  # pylint: disable=E1103
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=-7')
+        self.assertEqual(resp['Content-Range'], 'bytes 570-576/577')
+
+    def test_unsatisfiable_range_request(self):
+        """
+        Test that a range outside the content is rejected.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(resp.status_code, 416)  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes */577')
+
+    def test_invalid_range_request(self):
+        """
+        Test that a malformed range is ignored, and the whole content served.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=5-2')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+        self.assertEqual(len(resp.content), 577)  # pylint: disable=E1103
+
+    def test_conditional_requests(self):
+        """
+        Test that clients holding current copies get a 304 (Not Modified).
+        """
+        resp = self.client.get(self.url_unlocked)
+        etag = resp['ETag']
+        last_modified = resp['Last-Modified']
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_disk_cache(self):
+        """
+        Test that content too large for memcached is served from the local disk cache.
+        """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        del_cached_content(self.loc_unlocked)
+        self.addCleanup(del_cached_content, self.loc_unlocked)
+        expected = self.contentstore.find(self.loc_unlocked).data
+        with override_settings(CONTENTSERVER_DISK_CACHE_DIR=cache_dir):
+            with patch('contentserver.middleware.MAX_MEMCACHED_CONTENT_LENGTH', 100):
+                resp = self.client.get(self.url_unlocked)
+                self.assertEqual(resp.content, expected)  # pylint: disable=E1103
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+                with patch('contentserver.middleware.contentstore') as mock_contentstore:
+                    resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19')
+                    self.assertFalse(mock_contentstore.called)
+                self.assertEqual(resp.content, expected[10:20])  # pylint: disable=E1103
+
+                # the file is closed even if its data isn't sent
+                with patch.object(CachedFileContent, 'close', autospec=True) as mock_close:
+                    resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=resp['ETag'])
+                self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+                self.assertTrue(mock_close.called)
+
+    def test_disk_cache_range_miss(self):
+        """
+        Test that a Range request for content missing from the disk cache is served
+        from the contentstore, and copies all of the content into the cache separately.
+        """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        del_cached_content(self.loc_unlocked)
+        self.addCleanup(del_cached_content, self.loc_unlocked)
+        expected = self.contentstore.find(self.loc_unlocked).data
+        with override_settings(CONTENTSERVER_DISK_CACHE_DIR=cache_dir):
+            with patch('contentserver.middleware.MAX_MEMCACHED_CONTENT_LENGTH', 100):
+                with patch.object(DiskContentCache, 'store_in_background') as mock_store:
+                    resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19')
+                self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+                self.assertEqual(resp.content, expected[10:20])  # pylint: disable=E1103
+                self.assertEqual(os.listdir(cache_dir), [])
+
+                # copy the content the way the background thread would
+                _, load_stream, on_stored = mock_store.call_args[0]
+                for _ in disk_cache().store_while_streaming(load_stream(), on_stored):
+                    pass
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                with patch('contentserver.middleware.contentstore') as mock_contentstore:
+                    resp = self.client.get(self.url_unlocked)
+                    self.assertFalse(mock_contentstore.called)
+                self.assertEqual(resp.content, expected)  # pylint: disable=E1103
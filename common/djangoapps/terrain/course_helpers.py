@@ -73,3 +73,4 @@ def clear_courses():
     # $ mongo test_xmodule --eval "db.dropDatabase()"
     editable_modulestore().collection.drop()
     contentstore().fs_files.drop()
+    contentstore().content_counts.drop()
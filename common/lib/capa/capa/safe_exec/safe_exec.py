@@ -6,6 +6,7 @@ from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
 from dogapi import dog_stats_api
 
+from collections import OrderedDict
 import hashlib
 
 # Establish the Python environment for Capa.
@@ -46,6 +47,46 @@ for name, modname in ASSUMED_IMPORTS:
 
 LAZY_IMPORTS = "".join(LAZY_IMPORTS)
 
+# Runs a list of `jobs`, each a (code, globals) pair, one after the other in a
+# single sandbox, after LAZY_IMPORTS has been run.  The assumed imports are
+# shared, so they are only imported once for the whole batch.  The result of
+# each job, as in safe_exec, is an (exception message, JSON-safe globals) pair:
+# a job which raises an exception leaves its globals unchanged, and its message
+# is worded as codejail's would be, or as codejail's not_safe_exec's if
+# `plain_errors` is true.
+BATCH_RUNNER = """
+import json as _json
+import random as _random_module
+import sys as _sys
+import traceback as _traceback
+
+_shared = dict((_name, globals()[_name]) for _name in %r)
+results = []
+for _code, _globals in jobs:
+    _sys.modules['random'] = _random_module
+    _namespace = dict(_shared)
+    _namespace.update(_globals)
+    try:
+        exec _code in _namespace
+    except Exception as _e:
+        if plain_errors:
+            _emsg = "{0.__class__.__name__}: {0!s}".format(_e)
+        else:
+            _emsg = "Couldn't execute jailed code: " + "".join(_traceback.format_exception(*_sys.exc_info()))
+        results.append([_emsg, _globals])
+        continue
+    _safe_globals = {}
+    for _name, _value in _namespace.items():
+        if _shared.get(_name) is _value:
+            continue
+        try:
+            _safe_globals[_name] = _json.loads(_json.dumps(_value))
+        except Exception:
+            pass
+    results.append([None, _safe_globals])
+del jobs
+""" % (["LazyModule"] + [name for name, _ in ASSUMED_IMPORTS],)
+
 
 def update_hash(hasher, obj):
     """
@@ -70,6 +111,17 @@ def update_hash(hasher, obj):
         hasher.update(repr(obj))
 
 
+def _cache_key(code, globals_dict, random_seed):
+    """
+    Return the cache key for the result of running `code` with `globals_dict` and `random_seed`.
+    """
+    safe_globals = json_safe(globals_dict)
+    md5er = hashlib.md5()
+    md5er.update(repr(code))
+    update_hash(md5er, safe_globals)
+    return "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+
+
 @dog_stats_api.timed('capa.safe_exec.time')
 def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None, slug=None, unsafely=False):
     """
@@ -95,11 +147,7 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     """
     # Check the cache for a previous result.
     if cache:
-        safe_globals = json_safe(globals_dict)
-        md5er = hashlib.md5()
-        md5er.update(repr(code))
-        update_hash(md5er, safe_globals)
-        key = "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+        key = _cache_key(code, globals_dict, random_seed)
         cached = cache.get(key)
         if cached is not None:
             # We have a cached result.  The result is a pair: the exception
@@ -139,3 +187,82 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     # If an exception happened, raise it now.
     if emsg:
         raise e
+
+
+@dog_stats_api.timed('capa.safe_exec_many.time')
+def safe_exec_many(jobs, python_path=None, cache=None, slug=None, unsafely=False, batch_size=50):
+    """
+    Execute many pieces of python code safely, `batch_size` at a time in each sandbox.
+
+    `jobs` is a list of (code, globals_dict, random_seed) triples, each as it
+    would be passed to `safe_exec`, and each globals_dict is updated just as
+    `safe_exec` would.  The other arguments are the same as for `safe_exec`,
+    and apply to all of the jobs.
+
+    Jobs whose results are already cached aren't run, and identical jobs are
+    only run once.  Since the jobs in a batch run one after the other in the
+    same process, they share its time and memory limits, and are trusted not
+    to interfere with each other beyond that.  If a batch fails as a whole,
+    its jobs are run again one at a time with `safe_exec`.
+
+    Returns a list with an item for each job: the SafeExecException that it
+    raised, or None if it ran successfully.
+
+    """
+    errors = [None] * len(jobs)
+
+    def _apply_result(index, emsg, cleaned_results):
+        """Update the globals of job `index` with its results, like safe_exec does."""
+        jobs[index][1].update(cleaned_results)
+        if emsg:
+            errors[index] = SafeExecException(emsg)
+
+    # Find the jobs that need to be run: cache key -> indexes of the jobs with that key.
+    pending = OrderedDict()
+    for index, (code, globals_dict, random_seed) in enumerate(jobs):
+        key = _cache_key(code, globals_dict, random_seed)
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            _apply_result(index, *cached)
+        else:
+            pending.setdefault(key, []).append(index)
+
+    # Decide which code executor to use.
+    if unsafely:
+        exec_fn = codejail_not_safe_exec
+    else:
+        exec_fn = codejail_safe_exec
+
+    pending = pending.items()
+    for start in xrange(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        batch_globals = {'jobs': [], 'plain_errors': exec_fn is codejail_not_safe_exec}
+        for _, indexes in batch:
+            code, globals_dict, random_seed = jobs[indexes[0]]
+            batch_globals['jobs'].append([CODE_PROLOG % random_seed + code, json_safe(globals_dict)])
+
+        try:
+            exec_fn(LAZY_IMPORTS + BATCH_RUNNER, batch_globals, python_path=python_path, slug=slug)
+        except SafeExecException:
+            # The sandbox itself failed, e.g. by running out of time, so none
+            # of the results are known.  Run the batch's jobs one at a time,
+            # so that only the jobs which caused the failure fail.
+            for _, indexes in batch:
+                for index in indexes:
+                    code, globals_dict, random_seed = jobs[index]
+                    try:
+                        safe_exec(
+                            code, globals_dict, random_seed=random_seed, python_path=python_path,
+                            cache=cache, slug=slug, unsafely=unsafely,
+                        )
+                    except SafeExecException as e:
+                        errors[index] = e
+            continue
+
+        for (key, indexes), (emsg, cleaned_results) in zip(batch, batch_globals['results']):
+            if cache:
+                cache.set(key, (emsg, cleaned_results))
+            for index in indexes:
+                _apply_result(index, emsg, cleaned_results)
+
+    return errors
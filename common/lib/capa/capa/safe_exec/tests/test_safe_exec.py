@@ -4,12 +4,14 @@ import hashlib
 import os
 import os.path
 import random
+import sys
 import textwrap
 import unittest
 
+from mock import patch
 from nose.plugins.skip import SkipTest
 
-from capa.safe_exec import safe_exec, update_hash
+from capa.safe_exec import safe_exec, safe_exec_many, update_hash
 from codejail.safe_exec import SafeExecException
 from codejail.jail_code import is_configured
 
@@ -177,6 +179,75 @@ class TestSafeExecCaching(unittest.TestCase):
                 self.fail("Tried executing code with non-ASCII unicode: {0}".format(code))
 
 
+class TestSafeExecMany(unittest.TestCase):
+    """Test running batches of jobs with safe_exec_many."""
+
+    def test_results_match_safe_exec(self):
+        code = "rnums = [random.randint(0, 999) for _ in xrange(10)]\na = int(math.pi) + x"
+        g = {'x': 1}
+        safe_exec(code, g, random_seed=17)
+
+        jobs = [(code, {'x': 1}, 17), ("1/0", {}, None), ("b = 1/2", {}, None)]
+        errors = safe_exec_many(jobs, batch_size=2)
+        self.assertEqual(jobs[0][1], g)
+        self.assertIsNone(errors[0])
+        self.assertIn("ZeroDivisionError", errors[1].message)
+        self.assertEqual(jobs[2][1]['b'], 0.5)
+        self.assertIsNone(errors[2])
+
+    def test_caching(self):
+        cache = {}
+        jobs = [("a = 17", {}, None), ("a = 17", {}, None), ("a = 18", {}, None)]
+        safe_exec_many(jobs, cache=DictCache(cache))
+        # identical jobs are only run, and cached, once
+        self.assertEqual(len(cache), 2)
+
+        # the cache is shared with safe_exec
+        g = {}
+        safe_exec("a = 18", g, cache=DictCache(cache))
+        self.assertEqual(len(cache), 2)
+        cache[cache.keys()[0]] = (None, {'a': 99})
+        cache[cache.keys()[1]] = (None, {'a': 99})
+        jobs = [("a = 17", {}, None)]
+        safe_exec_many(jobs, cache=DictCache(cache))
+        self.assertEqual(jobs[0][1], {'a': 99})
+
+    def test_caching_failure_like_safe_exec(self):
+        code = "a = 17\n1/0"
+        cache = {}
+        g = {'x': 1}
+        with self.assertRaises(SafeExecException):
+            safe_exec(code, g, cache=DictCache(cache), unsafely=True)
+        batch_cache = {}
+        jobs = [(code, {'x': 1}, None)]
+        errors = safe_exec_many(jobs, cache=DictCache(batch_cache), unsafely=True)
+        # the same entry as safe_exec's, without the globals assigned before the exception
+        self.assertEqual(batch_cache, cache)
+        self.assertEqual(jobs[0][1], {'x': 1})
+        self.assertEqual(errors[0].message, cache.values()[0][0])
+
+    def test_batch_failure(self):
+        # a job which brings down its whole sandbox only fails itself
+        # the package exports the function under the module's name, so get the module itself
+        safe_exec_module = sys.modules['capa.safe_exec.safe_exec']
+        real_safe_exec = safe_exec_module.codejail_safe_exec
+
+        def fail_batches(code, globals_dict, **kwargs):
+            """Fail like a sandbox that ran out of time, when running a batch."""
+            if 'jobs' in globals_dict:
+                raise SafeExecException("Couldn't execute jailed code: timed out")
+            return real_safe_exec(code, globals_dict, **kwargs)
+
+        jobs = [("a = 17", {}, None), ("1/0", {}, None), ("a = 17", {}, None)]
+        with patch.object(safe_exec_module, 'codejail_safe_exec', side_effect=fail_batches):
+            errors = safe_exec_many(jobs)
+        self.assertEqual(jobs[0][1], {'a': 17})
+        self.assertIsNone(errors[0])
+        self.assertIn("ZeroDivisionError", errors[1].message)
+        self.assertEqual(jobs[2][1], {'a': 17})
+        self.assertIsNone(errors[2])
+
+
 class TestUpdateHash(unittest.TestCase):
     """Test the safe_exec.update_hash function to be sure it canonicalizes properly."""
 
@@ -1,3 +1,7 @@
+from collections import OrderedDict
+import threading
+import time
+
 import pymongo
 import gridfs
 from gridfs.errors import NoFile
@@ -14,6 +18,16 @@ from fs.osfs import OSFS
 import os
 import json
 
+# the sort fields which _get_all_content_for_course can page through with range queries
+INDEXED_SORT_FIELDS = ('uploadDate', 'displayname')
+
+# the number of page bookmarks each MongoContentStore remembers
+MAX_CACHED_BOOKMARKS = 1000
+
+# how many seconds a course's maintained asset count is used before it is counted again, which
+# corrects any drift from writes racing with the count's initialization
+CONTENT_COUNT_TIMEOUT = 60 * 60
+
 
 class MongoContentStore(ContentStore):
     # pylint: disable=W0613
@@ -38,7 +52,22 @@ class MongoContentStore(ContentStore):
 
         self.fs = gridfs.GridFS(_db, bucket)
 
-        self.fs_files = _db[bucket + ".files"]  # the underlying collection GridFS uses
+        self.fs_files = _db[bucket + ".files"]  # the underlying collections GridFS uses
+        self.fs_chunks = _db[bucket + ".chunks"]
+        # the number of assets and thumbnails of each course, and a version which changes with them
+        self.content_counts = _db[bucket + ".counts"]
+
+        # so pages sorted by the indexed fields are range queries over the index, rather than
+        # skips through all the course's assets (see _get_all_content_for_course)
+        for field in INDEXED_SORT_FIELDS:
+            self.fs_files.ensure_index(
+                [('_id.tag', 1), ('_id.org', 1), ('_id.course', 1), ('_id.category', 1), (field, 1), ('_id.name', 1)],
+                background=True
+            )
+
+        # (course key, content version, sort, start) -> bookmark of the asset before start, least recently used first
+        self._bookmarks = OrderedDict()
+        self._bookmarks_lock = threading.Lock()
 
     def save(self, content):
         content_id = content.get_id()
@@ -56,12 +85,53 @@ class MongoContentStore(ContentStore):
                     fp.write(chunk)
             else:
                 fp.write(content.data)
+        self._update_content_count(content_id, 1)
 
         return content
 
     def delete(self, content_id):
-        if self.fs.exists({"_id": content_id}):
-            self.fs.delete(content_id)
+        # remove the file's document atomically (as GridFS.delete does first), so that when several
+        # processes delete the same content only the one which removed it updates the count
+        if self.fs_files.find_and_modify({"_id": content_id}, remove=True) is not None:
+            self.fs_chunks.remove({"files_id": content_id})
+            self._update_content_count(content_id, -1)
+
+    @staticmethod
+    def _content_count_key(org, course, category):
+        """
+        Return the _id of the content_counts document for the given course's assets or thumbnails
+        """
+        return {'org': org, 'course': course, 'category': category}
+
+    def _update_content_count(self, content_id, change):
+        """
+        Add change to the count of the content like content_id, and bump its version. Does nothing
+        if the count hasn't been computed yet, as _get_content_count will compute it from scratch.
+        A change made while the count is being computed may be lost, until the next recount.
+        """
+        self.content_counts.update(
+            {'_id': self._content_count_key(content_id['org'], content_id['course'], content_id['category'])},
+            {'$inc': {'count': change, 'version': 1}},
+        )
+
+    def _get_content_count(self, course_filter):
+        """
+        Return the number of assets (or thumbnails) matching course_filter, and the version of
+        that count, computing and saving the count if it isn't saved yet or was computed more
+        than CONTENT_COUNT_TIMEOUT seconds ago.
+        """
+        key = self._content_count_key(course_filter.org, course_filter.course, course_filter.category)
+        counts = self.content_counts.find_one({'_id': key})
+        if counts is None or counts.get('counted_at', 0) < time.time() - CONTENT_COUNT_TIMEOUT:
+            count = self.fs_files.find(location_to_query(course_filter)).count()
+            # one atomic upsert, which also bumps the version so that bookmarks made with the
+            # previous count aren't used
+            counts = self.content_counts.find_and_modify(
+                {'_id': key},
+                {'$set': {'count': count, 'counted_at': time.time()}, '$inc': {'version': 1}},
+                upsert=True, new=True
+            )
+        return counts['count'], counts['version']
 
     def find(self, location, throw_on_not_found=True, as_stream=False):
         content_id = StaticContent.get_id_from_location(location)
@@ -72,7 +142,8 @@ class MongoContentStore(ContentStore):
                     location, fp.displayname, fp.content_type, fp, last_modified_at=fp.uploadDate,
                     thumbnail_location=getattr(fp, 'thumbnail_location', None),
                     import_path=getattr(fp, 'import_path', None),
-                    length=fp.length, locked=getattr(fp, 'locked', False)
+                    length=fp.length, locked=getattr(fp, 'locked', False),
+                    content_digest=getattr(fp, 'md5', None)
                 )
             else:
                 with self.fs.get(content_id) as fp:
@@ -80,7 +151,8 @@ class MongoContentStore(ContentStore):
                         location, fp.displayname, fp.content_type, fp.read(), last_modified_at=fp.uploadDate,
                         thumbnail_location=getattr(fp, 'thumbnail_location', None),
                         import_path=getattr(fp, 'import_path', None),
-                        length=fp.length, locked=getattr(fp, 'locked', False)
+                        length=fp.length, locked=getattr(fp, 'locked', False),
+                        content_digest=getattr(fp, 'md5', None)
                     )
         except NoFile:
             if throw_on_not_found:
@@ -171,15 +243,56 @@ class MongoContentStore(ContentStore):
         course_filter = Location(XASSET_LOCATION_TAG, category="asset" if not get_thumbnails else "thumbnail",
                                  course=location.course, org=location.org)
         # 'borrow' the function 'location_to_query' from the Mongo modulestore implementation
-        if maxresults > 0:
-            items = self.fs_files.find(
-                location_to_query(course_filter),
-                skip=start, limit=maxresults, sort=sort
-            )
+        query = location_to_query(course_filter)
+        if maxresults <= 0:
+            items = list(self.fs_files.find(query, sort=sort))
+            return items, len(items)
+
+        count, version = self._get_content_count(course_filter)
+        if sort is None or len(sort) != 1 or sort[0][0] not in INDEXED_SORT_FIELDS:
+            return list(self.fs_files.find(query, skip=start, limit=maxresults, sort=sort)), count
+
+        # page by the sort field and then the name, which keeps the order of equal values stable, so
+        # that a page can start after the last asset of the previous one instead of skipping to it
+        field, direction = sort[0]
+        sort = [(field, direction), ('_id.name', direction)]
+        bookmarks_key = (query['_id.org'], query['_id.course'], query['_id.category'], version, tuple(sort))
+        bookmark = self._get_bookmark(bookmarks_key + (start,))
+        if bookmark is None:
+            items = list(self.fs_files.find(query, skip=start, limit=maxresults, sort=sort))
         else:
-            items = self.fs_files.find(location_to_query(course_filter), sort=sort)
-        count = items.count()
-        return list(items), count
+            after = '$gt' if direction == pymongo.ASCENDING else '$lt'
+            value, name = bookmark
+            query['$or'] = [{field: {after: value}}, {field: value, '_id.name': {after: name}}]
+            if direction != pymongo.ASCENDING:
+                # assets without a value sort last in descending order, but don't match $lt
+                query['$or'].append({field: None})
+            items = list(self.fs_files.find(query, limit=maxresults, sort=sort))
+
+        if items and items[-1].get(field) is not None:
+            self._set_bookmark(bookmarks_key + (start + len(items),), (items[-1][field], items[-1]['_id']['name']))
+        return items, count
+
+    def _get_bookmark(self, key):
+        """
+        Return the (sort value, name) of the asset before the page cached under key, or None
+        """
+        with self._bookmarks_lock:
+            bookmark = self._bookmarks.pop(key, None)
+            if bookmark is not None:
+                # move it to the most recently used end
+                self._bookmarks[key] = bookmark
+            return bookmark
+
+    def _set_bookmark(self, key, bookmark):
+        """
+        Remember the bookmark for the page under key, forgetting the least recently used ones
+        beyond MAX_CACHED_BOOKMARKS
+        """
+        with self._bookmarks_lock:
+            self._bookmarks[key] = bookmark
+            while len(self._bookmarks) > MAX_CACHED_BOOKMARKS:
+                self._bookmarks.popitem(last=False)
 
     def set_attr(self, location, attr, value=True):
         """
@@ -225,6 +338,8 @@ class MongoContentStore(ContentStore):
         if item is None:
             raise NotFoundError()
         self.fs_files.update({"_id": item["_id"]}, {"$set": attr_dict})
+        # the attrs may change the order of the course's assets
+        self._update_content_count(item["_id"], 0)
 
     def get_attrs(self, location):
         """
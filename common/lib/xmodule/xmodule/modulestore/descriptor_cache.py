@@ -0,0 +1,95 @@
+"""
+A bounded, process-local cache of the data that descriptors are loaded from, so
+that the descriptors of frequently used courses can be rebuilt without going
+back to the database on every request.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class DescriptorCache(object):
+    """
+    A least recently used cache of descriptor data, holding entries whose sizes
+    add up to at most `max_bytes`, each for at most `timeout` seconds.
+
+    Every entry is stored along with the content version of its course at the
+    time it was loaded, and is only returned to callers that pass that same
+    version, so entries become stale as soon as the course is written to.
+    Entries for a course can also be dropped eagerly with `invalidate_course`.
+
+    The cached values are shared between requests, so they must not be bound
+    to any request or user, and callers must not modify them.
+    """
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        # the total size of the entries, in bytes
+        self.size = 0
+        # (course_id, key) -> (version, expiration time, value, size), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pop(self, entry_key):
+        """
+        Remove and return the entry for `entry_key`, or None. Must hold the lock.
+        """
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.size -= entry[3]
+        return entry
+
+    def get(self, course_id, key, version):
+        """
+        Return the value cached for `key` in `course_id` at `version`, or None
+        """
+        with self._lock:
+            entry = self._pop((course_id, key))
+            if entry is None:
+                return None
+            cached_version, expires, value, size = entry
+            if cached_version != version or expires < time.time():
+                return None
+            # move it to the most recently used end
+            self._entries[(course_id, key)] = entry
+            self.size += size
+            return value
+
+    def set(self, course_id, key, version, value, size):
+        """
+        Cache `value`, which takes `size` bytes, for `key` in `course_id` at
+        `version`, evicting the least recently used entries if the cache is full.
+        Values larger than the whole cache aren't cached.
+        """
+        with self._lock:
+            self._pop((course_id, key))
+            if size > self.max_bytes:
+                return
+            self._entries[(course_id, key)] = (version, time.time() + self.timeout, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate_course(self, course_id):
+        """
+        Drop all the entries for `course_id`, which may be a full course id
+        (org/course/run) or just an org/course
+        """
+        prefix = course_id.rstrip('/') + '/'
+        with self._lock:
+            for entry_key in self._entries.keys():
+                entry_course_id = entry_key[0]
+                if entry_course_id == course_id or entry_course_id.startswith(prefix):
+                    self._pop(entry_key)
+
+    def clear(self):
+        """
+        Drop all the entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -6,11 +6,12 @@ Passes settings.MODULESTORE as kwargs to MongoModuleStore
 
 from __future__ import absolute_import
 from importlib import import_module
+from uuid import uuid4
 import re
 
 from django.conf import settings
-from django.core.cache import get_cache, InvalidCacheBackendError
-from django.dispatch import Signal
+from django.core.cache import cache, get_cache, InvalidCacheBackendError
+from django.dispatch import Signal, receiver
 import django.utils
 
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
@@ -28,6 +29,11 @@ _MODULESTORES = {}
 
 FUNCTION_KEYS = ['render_template']
 
+# Sent by the Mongo modulestores (MongoModuleStore and DraftModuleStore) created by
+# `create_modulestore_instance` whenever they write to a course. `course_id` is the
+# org/course of the written location. The split and XML modulestores don't send it.
+modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
+
 
 def load_function(path):
     """
@@ -63,10 +69,17 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     except InvalidCacheBackendError:
         metadata_inheritance_cache = get_cache('default')
 
+    # split structures never change once written, so they can be shared between processes
+    try:
+        structure_cache = get_cache('split_structure_cache')
+    except InvalidCacheBackendError:
+        structure_cache = None
+
     return class_(
         metadata_inheritance_cache_subsystem=metadata_inheritance_cache,
+        structure_cache_subsystem=structure_cache,
         request_cache=request_cache,
-        modulestore_update_signal=Signal(providing_args=['modulestore', 'course_id', 'location']),
+        modulestore_update_signal=modulestore_update_signal,
         xblock_mixins=getattr(settings, 'XBLOCK_MIXINS', ()),
         xblock_select=getattr(settings, 'XBLOCK_SELECT_FUNCTION', None),
         doc_store_config=doc_store_config,
@@ -75,6 +88,41 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     )
 
 
+def _course_version_cache_key(course_id):
+    """
+    Return the cache key for the content version of `course_id`. Since
+    modulestore writes are signalled per org/course, the run is ignored.
+    """
+    return u"modulestore.course_version.{}".format(u'/'.join(course_id.split('/')[:2]))
+
+
+def course_content_version(course_id):
+    """
+    Return an opaque marker for the current content of `course_id`.
+
+    The marker is kept in the shared cache and changes whenever a Mongo
+    modulestore writes to the course (see `modulestore_update_signal`), so it
+    can be used to key or validate cached data that is derived from the
+    content of courses stored in them. It never changes for courses in other
+    modulestores. It may also change when the cache entry is evicted, which
+    only causes such data to be recomputed.
+    """
+    key = _course_version_cache_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        # If another process won the race to set the marker, use theirs.
+        if not cache.add(key, version):
+            version = cache.get(key, version)
+    return version
+
+
+@receiver(modulestore_update_signal)
+def _invalidate_course_content_version(sender, course_id, **kwargs):  # pylint: disable=unused-argument
+    """Change the content version marker of the course that was just written to."""
+    cache.delete(_course_version_cache_key(course_id))
+
+
 def get_default_store_name_for_current_request():
     """
     This method will return the appropriate default store mapping for the current Django request,
@@ -155,9 +203,9 @@ def clear_existing_modulestores():
     _MODULESTORES.clear()
     # pylint: disable=W0603
     global _loc_singleton
-    cache = getattr(_loc_singleton, "cache", None)
-    if cache:
-        cache.clear()
+    loc_cache = getattr(_loc_singleton, "cache", None)
+    if loc_cache:
+        loc_cache.clear()
     _loc_singleton = None
 
 
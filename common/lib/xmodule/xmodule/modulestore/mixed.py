@@ -8,12 +8,16 @@ In this way, courses can be served up both - say - XMLModuleStore or MongoModule
 import logging
 
 from . import ModuleStoreWriteBase
-from xmodule.modulestore.django import create_modulestore_instance, loc_mapper
+from xmodule.modulestore.django import (
+    create_modulestore_instance, loc_mapper, course_content_version, modulestore_update_signal
+)
+from xmodule.modulestore.descriptor_cache import DescriptorCache
 from xmodule.modulestore import Location, SPLIT_MONGO_MODULESTORE_TYPE, XML_MODULESTORE_TYPE
 from xmodule.modulestore.locator import CourseLocator, Locator
 from xmodule.modulestore.exceptions import ItemNotFoundError, InvalidLocationError
 from uuid import uuid4
 from xmodule.modulestore.mongo.base import MongoModuleStore
+from xmodule.modulestore.mongo.draft import DraftModuleStore
 from xmodule.modulestore.split_mongo.split import SplitMongoModuleStore
 from xmodule.exceptions import UndefinedContext
 
@@ -24,13 +28,24 @@ class MixedModuleStore(ModuleStoreWriteBase):
     """
     ModuleStore knows how to route requests to the right persistence ms
     """
-    def __init__(self, mappings, stores, i18n_service=None, **kwargs):
+    def __init__(self, mappings, stores, i18n_service=None,
+                 descriptor_cache_bytes=0, descriptor_cache_timeout=300, **kwargs):
         """
         Initialize a MixedModuleStore. Here we look into our passed in kwargs which should be a
         collection of other modulestore configuration informations
+
+        If descriptor_cache_bytes is set, up to that many bytes of the json data of courses
+        and items loaded from published mongo stores are kept in memory for up to
+        descriptor_cache_timeout seconds, and used by later requests to build their
+        descriptors until their course is written to.
         """
         super(MixedModuleStore, self).__init__(**kwargs)
 
+        self.descriptor_cache = None
+        if descriptor_cache_bytes:
+            self.descriptor_cache = DescriptorCache(descriptor_cache_bytes, descriptor_cache_timeout)
+            modulestore_update_signal.connect(self._invalidate_cached_descriptors)
+
         self.modulestores = {}
         self.mappings = mappings
 
@@ -89,7 +104,9 @@ class MixedModuleStore(ModuleStoreWriteBase):
 
     def get_instance(self, course_id, location, depth=0):
         store = self._get_modulestore_for_courseid(course_id)
-        return store.get_instance(course_id, location, depth)
+        if not self._caches_descriptor_data(store, course_id):
+            return store.get_instance(course_id, location, depth)
+        return self._load_cached_descriptor(store, course_id, location, depth)
 
     def get_items(self, location, course_id=None, depth=0, qualifiers=None):
         """
@@ -162,11 +179,59 @@ class MixedModuleStore(ModuleStoreWriteBase):
         store = self._get_modulestore_for_courseid(
             course_id.package_id if hasattr(course_id, 'package_id') else course_id
         )
+
         try:
-            return store.get_course(course_id)
+            if not self._caches_descriptor_data(store, course_id):
+                return store.get_course(course_id)
+
+            # the same location as MongoModuleStore.get_course loads
+            id_components = Location.parse_course_id(course_id)
+            id_components['tag'] = 'i4x'
+            id_components['category'] = 'course'
+            return self._load_cached_descriptor(store, course_id, Location(id_components), 0)
         except ItemNotFoundError:
             return None
 
+    def _caches_descriptor_data(self, store, course_id):
+        """
+        Return whether the descriptor cache is enabled and keeps the data of
+        `course_id` in `store`. Only published mongo stores are cached: not
+        drafts, xml courses (which are always in memory) or split courses.
+        """
+        return (
+            self.descriptor_cache is not None and
+            isinstance(course_id, basestring) and
+            isinstance(store, MongoModuleStore) and
+            not isinstance(store, DraftModuleStore)
+        )
+
+    def _load_cached_descriptor(self, store, course_id, location, depth):
+        """
+        Return a new descriptor for the item at `location` in `store`, with its
+        descendents up to `depth`, loaded from json data that is reused from the
+        descriptor cache while the course's content version is unchanged.
+
+        Descriptors are bound to a student's runtime and field data when they're
+        rendered, so they are never shared between requests. Only their unbound
+        json data is.
+        """
+        # Read the version before loading, so that a write while we're loading
+        # leaves the cached data stale rather than serving it as current
+        version = course_content_version(course_id)
+        key = (unicode(location), depth)
+        item_data = self.descriptor_cache.get(course_id, key, version)
+        if item_data is None:
+            item_data, size = store.get_item_data(location, depth)
+            self.descriptor_cache.set(course_id, key, version, item_data, size)
+        return store.load_item_data(item_data)
+
+    def _invalidate_cached_descriptors(self, sender, course_id=None, **kwargs):  # pylint: disable=unused-argument
+        """
+        Drop the cached descriptors of a course that was just written to
+        """
+        if course_id is not None:
+            self.descriptor_cache.invalidate_course(course_id)
+
     def get_parent_locations(self, location, course_id):
         """
         returns the parent locations for a given location and course_id
@@ -12,11 +12,16 @@ structure:
 }
 """
 
+import copy
 import pymongo
 import sys
 import logging
-import copy
+import hashlib
+import json
+import time
+from uuid import uuid4
 
+from bson import BSON
 from bson.son import SON
 from fs.osfs import OSFS
 from itertools import repeat
@@ -34,6 +39,7 @@ from xmodule.modulestore import ModuleStoreWriteBase, Location, MONGO_MODULESTOR
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.inheritance import own_metadata, InheritanceMixin, inherit_metadata, InheritanceKeyValueStore
 from xmodule.modulestore.xml import LocationReader
+from xmodule.modulestore.mongo.definition_lazy_loader import DefinitionLazyLoader
 from xblock.core import XBlock
 
 log = logging.getLogger(__name__)
@@ -60,13 +66,33 @@ class MongoKeyValueStore(InheritanceKeyValueStore):
     """
     def __init__(self, data, children, metadata):
         super(MongoKeyValueStore, self).__init__()
-        if not isinstance(data, dict):
-            self._data = {'data': data}
+        if isinstance(data, DefinitionLazyLoader):
+            self._definition_loader = data
         else:
-            self._data = data
+            self._definition_loader = None
+            self._set_data(data)
         self._children = children
         self._metadata = metadata
 
+    def _set_data(self, data):
+        """
+        Set the content scoped fields, wrapping non-dict definitions as the 'data' field
+        """
+        if not isinstance(data, dict):
+            self._loaded_data = {'data': data}
+        else:
+            self._loaded_data = data
+
+    @property
+    def _data(self):
+        """
+        The content scoped fields, fetched on first access if the block was loaded structure-only
+        """
+        if self._definition_loader is not None:
+            self._set_data(self._definition_loader.fetch())
+            self._definition_loader = None
+        return self._loaded_data
+
     def get(self, key):
         if key.scope == Scope.children:
             return self._children
@@ -199,6 +225,9 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
                 return module
             except:
                 log.warning("Failed to load descriptor", exc_info=True)
+                definition_data = json_data.get('definition', {}).get('data')
+                if isinstance(definition_data, DefinitionLazyLoader):
+                    definition_data.fetch()
                 return ErrorDescriptor.from_json(
                     json_data,
                     self,
@@ -238,9 +267,199 @@ def location_to_query(location, wildcard=True):
     return query
 
 
+def content_hash(definition_data, metadata, children=None):
+    """
+    Return a hash of the fields of a block as update_item stores them, for telling whether a block
+    needs to be written again (see MongoModuleStore.get_content_hashes)
+    """
+    return hashlib.md5(
+        json.dumps([definition_data, metadata, children], sort_keys=True, default=unicode)
+    ).hexdigest()
+
+
+# the _id of the document which marks that the course summary index was built from the courses
+COURSE_SUMMARIES_BUILT_ID = u'__built__'
+
+
+def course_summary(location, metadata):
+    """
+    Return the document which MongoModuleStore keeps in its course summary index for the
+    course at location with the given own metadata
+    """
+    display_name = metadata.get('display_name')
+    return {
+        '_id': location.course_id,
+        # the form of the course id in the names of course access groups, e.g. instructor_edx.demox.2014
+        'lower_id': u'{0.org}.{0.course}.{0.name}'.format(location).lower(),
+        'org': location.org,
+        'course': location.course,
+        'run': location.name,
+        'display_name': display_name,
+        'display_org_with_default': metadata.get('display_organization') or location.org,
+        'display_number_with_default': metadata.get('display_coursenumber') or location.course,
+        # for sorting by display name regardless of case
+        'sort_name': display_name.lower() if display_name else u'',
+    }
+
+
+# Cached metadata inheritance trees are recomputed in full at least this often
+# (in seconds). Updating a cached tree in place (see
+# `MongoModuleStore.update_cached_metadata_inheritance_tree`) doesn't extend
+# its lifetime, since it leaves the entries of removed blocks behind.
+METADATA_INHERITANCE_CACHE_TIMEOUT = 60 * 60
+
+# How long (in seconds) an in-place update of a cached inheritance tree may
+# hold the lock which keeps concurrent updates from overwriting each other.
+METADATA_INHERITANCE_LOCK_TIMEOUT = 10
+
+
+class InheritanceTree(object):
+    """
+    The metadata inheritance tree of a course: a mapping from the location url
+    of each block to the (json repr) metadata it inherits from its ancestors.
+
+    Most blocks in a course inherit exactly the same metadata as their
+    siblings, so each distinct metadata dict is stored only once and blocks
+    refer to it by index. This keeps the pickled tree small enough to cache
+    for large courses. The dicts returned are shared between blocks and must
+    never be modified in place.
+
+    `computed_at` is the time at which the tree was computed in full; copies
+    keep it, so that it tells how stale an updated copy may be.
+    """
+    # Bump this whenever the pickled state changes, so that trees cached by
+    # older code are ignored instead of misread (see `metadata_cache_key`)
+    SERIALIZATION_VERSION = 2
+
+    def __init__(self, metadata_by_url=None):
+        self.computed_at = time.time()
+        # distinct metadata dicts, in the order they were first seen
+        self._metadata = []
+        # location url -> index into self._metadata
+        self._indexes = {}
+        # canonical form of a metadata dict -> index into self._metadata.
+        # Only needed while adding entries, so rebuilt lazily after unpickling
+        self._interned = None
+        if metadata_by_url:
+            for url, metadata in metadata_by_url.iteritems():
+                self[url] = metadata
+
+    @staticmethod
+    def _canonical(metadata):
+        """
+        Return a hashable representation of `metadata` that is equal for any
+        two dicts with the same contents
+        """
+        return json.dumps(metadata, sort_keys=True, default=unicode)
+
+    def _intern(self, metadata):
+        """
+        Return the index of the stored dict equal to `metadata`, storing it first if needed
+        """
+        if self._interned is None:
+            self._interned = dict(
+                (self._canonical(stored), index) for index, stored in enumerate(self._metadata)
+            )
+        canonical = self._canonical(metadata)
+        index = self._interned.get(canonical)
+        if index is None:
+            index = len(self._metadata)
+            self._metadata.append(metadata)
+            self._interned[canonical] = index
+        return index
+
+    def __setitem__(self, url, metadata):
+        self._indexes[url] = self._intern(metadata)
+
+    def __getitem__(self, url):
+        return self._metadata[self._indexes[url]]
+
+    def get(self, url, default=None):
+        """
+        Return the metadata inherited by the block at `url`, or `default` if it isn't in the tree
+        """
+        index = self._indexes.get(url)
+        if index is None:
+            return default
+        return self._metadata[index]
+
+    def __contains__(self, url):
+        return url in self._indexes
+
+    def __iter__(self):
+        return iter(self._indexes)
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __eq__(self, other):
+        if not isinstance(other, InheritanceTree):
+            return NotImplemented
+        return dict(self.iteritems()) == dict(other.iteritems())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def iteritems(self):
+        """
+        Iterate over (location url, inherited metadata) pairs
+        """
+        for url, index in self._indexes.iteritems():
+            yield url, self._metadata[index]
+
+    def copy(self):
+        """
+        Return a copy of the tree that can be updated without affecting this one.
+        The metadata dicts themselves are shared.
+        """
+        tree = InheritanceTree()
+        tree.computed_at = self.computed_at
+        tree._metadata = list(self._metadata)
+        tree._indexes = dict(self._indexes)
+        if self._interned is not None:
+            tree._interned = dict(self._interned)
+        return tree
+
+    def _compacted(self):
+        """
+        Return the (metadata dicts, indexes) of the tree without the dicts that
+        no block refers to any more, e.g. because updates replaced them.
+        """
+        referenced = sorted(set(self._indexes.itervalues()))
+        if len(referenced) == len(self._metadata):
+            return self._metadata, self._indexes
+        new_indexes = dict((old_index, new_index) for new_index, old_index in enumerate(referenced))
+        return (
+            [self._metadata[index] for index in referenced],
+            dict((url, new_indexes[index]) for url, index in self._indexes.iteritems()),
+        )
+
+    def __getstate__(self):
+        # Only pickle the metadata dicts which are still in use
+        metadata, indexes = self._compacted()
+        return (self.SERIALIZATION_VERSION, self.computed_at, metadata, indexes)
+
+    def __setstate__(self, state):
+        version = state[0]
+        if version != self.SERIALIZATION_VERSION:
+            raise ValueError(
+                u"Can't load an inheritance tree serialized with version {}".format(version)
+            )
+        _, self.computed_at, metadata, indexes = state
+        self._metadata = metadata
+        self._indexes = indexes
+        self._interned = None
+
+
+# The fields to load for blocks that are loaded structure-only, without their
+# definition data, which is fetched lazily if it's needed.
+STRUCTURE_ONLY_FIELDS = {'definition.data': False}
+
+
 def metadata_cache_key(location):
     """Turn a `Location` into a useful cache key."""
-    return u"{0.org}/{0.course}".format(location)
+    return u"{0.org}/{0.course}/v{1}".format(location, InheritanceTree.SERIALIZATION_VERSION)
 
 
 class MongoModuleStore(ModuleStoreWriteBase):
@@ -279,6 +498,7 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 db
             )
             self.collection = self.database[collection]
+            self.course_summaries = self.database[collection + '.course_summaries']
 
             if user is not None and password is not None:
                 self.database.authenticate(user, password)
@@ -295,6 +515,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
             zip(('_id.' + field for field in Location._fields), repeat(1)),
         )
         # pylint: enable=no-member, protected_access
+        self.course_summaries.ensure_index('lower_id')
+        self.course_summaries.ensure_index([('sort_name', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
 
         if default_class is not None:
             module_path, _, class_name = default_class.rpartition('.')
@@ -309,18 +531,20 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         self.ignore_write_events_on_courses = []
 
-    def compute_metadata_inheritance_tree(self, location):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-        # get all collections in the course, this query should not return any leaf nodes
-        # note this is a bit ugly as when we add new categories of containers, we have to add it here
-
-        block_types_with_children = set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
-        query = {'_id.org': location.org,
-                 '_id.course': location.course,
-                 '_id.category': {'$in': list(block_types_with_children)}
-                 }
+    def _inheritance_query(self, location, **query):
+        """
+        Return a query and record filter for the container blocks (i.e. the
+        ones that can have children) in location's course, which load only
+        their locations, children and inheritable metadata.
+        """
+        block_types_with_children = set(
+            name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False)
+        )
+        query.update({
+            '_id.org': location.org,
+            '_id.course': location.course,
+            '_id.category': {'$in': list(block_types_with_children)}
+        })
         # we just want the Location, children, and inheritable metadata
         record_filter = {'_id': 1, 'definition.children': 1}
 
@@ -329,13 +553,15 @@ class MongoModuleStore(ModuleStoreWriteBase):
         for field_name in InheritanceMixin.fields:
             record_filter['metadata.{0}'.format(field_name)] = 1
 
-        # call out to the DB
-        resultset = self.collection.find(query, record_filter)
+        return query, record_filter
 
+    @staticmethod
+    def _collate_inheritance_records(resultset):
+        """
+        Return a dict mapping location url -> record for the records in
+        resultset, as loaded with the filter from `_inheritance_query`.
+        """
         results_by_url = {}
-        root = None
-
-        # now go through the results and order them by the location url
         for result in resultset:
             location = Location(result['_id'])
             # We need to collate between draft and non-draft
@@ -347,37 +573,83 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 additional_children = result.get('definition', {}).get('children', [])
                 total_children = existing_children + additional_children
                 results_by_url[location_url].setdefault('definition', {})['children'] = total_children
-            results_by_url[location.url()] = result
-            if location.category == 'course':
-                root = location.url()
+            results_by_url[location_url] = result
+        return results_by_url
+
+    @staticmethod
+    def _inherit_from(inherited_metadata, own_metadata):
+        """
+        Return the metadata that a block with `own_metadata` passes on to its
+        children, if it inherited `inherited_metadata`.
+
+        Dicts are shared between blocks whenever they have the same contents,
+        and are only copied when a block overrides some of what it inherited,
+        so callers must never modify them in place.
+        """
+        if not own_metadata:
+            return inherited_metadata
+        metadata = dict(inherited_metadata)
+        metadata.update(own_metadata)
+        return metadata
+
+    def compute_metadata_inheritance_tree(self, location):
+        '''
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        # get all collections in the course, this query should not return any leaf nodes
+        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+        query, record_filter = self._inheritance_query(location)
+
+        # call out to the DB
+        results_by_url = self._collate_inheritance_records(self.collection.find(query, record_filter))
+
+        root = None
+        for location_url, result in results_by_url.iteritems():
+            if result['_id']['category'] == 'course':
+                root = location_url
 
         # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+        metadata_to_inherit = InheritanceTree()
 
-        def _compute_inherited_metadata(url):
+        def _compute_inherited_metadata(url, my_metadata):
             """
             Helper method for computing inherited metadata for a specific location url
             """
-            my_metadata = results_by_url[url].get('metadata', {})
-
             # go through all the children and recurse, but only if we have
             # in the result set. Remember results will not contain leaf nodes
             for child in results_by_url[url].get('definition', {}).get('children', []):
                 if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
+                    new_child_metadata = self._inherit_from(my_metadata, results_by_url[child].get('metadata', {}))
                     metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
+                    _compute_inherited_metadata(child, new_child_metadata)
                 else:
                     # this is likely a leaf node, so let's record what metadata we need to inherit
                     metadata_to_inherit[child] = my_metadata
 
         if root is not None:
-            _compute_inherited_metadata(root)
+            _compute_inherited_metadata(root, results_by_url[root].get('metadata', {}))
 
         return metadata_to_inherit
 
+    def _set_cached_metadata_inheritance_tree(self, location, tree):
+        """
+        Store the metadata inheritance tree for location's course in the caching
+        subsystem (e.g. memcached) and the request cache, if available.
+
+        The tree expires from the caching subsystem
+        METADATA_INHERITANCE_CACHE_TIMEOUT seconds after it was computed in full.
+        """
+        key = metadata_cache_key(location)
+        if self.metadata_inheritance_cache_subsystem is not None:
+            # a timeout of 0 would mean that the tree never expires
+            timeout = max(int(tree.computed_at + METADATA_INHERITANCE_CACHE_TIMEOUT - time.time()), 1)
+            self.metadata_inheritance_cache_subsystem.set(key, tree, timeout)
+
+        if self.request_cache is not None:
+            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
+            # defined
+            self.request_cache.data.setdefault('metadata_inheritance', {})[key] = tree
+
     def get_cached_metadata_inheritance_tree(self, location, force_refresh=False):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
@@ -398,21 +670,13 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         if not tree:
             # if not in subsystem, or we are on force refresh, then we have to compute
+            # it, and write it out to the caching subsystem (e.g. memcached) and the
+            # request cache
             tree = self.compute_metadata_inheritance_tree(location)
-
-            # now write out computed tree to caching subsystem (e.g. memcached), if available
-            if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(key, tree)
-
-        # now populate a request_cache, if available. NOTE, we are outside of the
-        # scope of the above if: statement so that after a memcache hit, it'll get
-        # put into the request_cache
-        if self.request_cache is not None:
-            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
-            # defined
-            if 'metadata_inheritance' not in self.request_cache.data:
-                self.request_cache.data['metadata_inheritance'] = {}
-            self.request_cache.data['metadata_inheritance'][key] = tree
+            self._set_cached_metadata_inheritance_tree(location, tree)
+        elif self.request_cache is not None:
+            # after a memcache hit, put the tree into the request_cache
+            self.request_cache.data.setdefault('metadata_inheritance', {})[key] = tree
 
         return tree
 
@@ -425,6 +689,103 @@ class MongoModuleStore(ModuleStoreWriteBase):
         if pseudo_course_id not in self.ignore_write_events_on_courses:
             self.get_cached_metadata_inheritance_tree(location, force_refresh=True)
 
+    def update_cached_metadata_inheritance_tree(self, location):
+        """
+        Update the cached metadata inheritance tree for location's course after
+        the inheritable metadata or the children of location have changed.
+
+        Only the subtree rooted at location is recomputed, loading its container
+        blocks one level at a time, and the rest of the cached tree is reused.
+        Entries for blocks that were removed from the subtree are left behind,
+        so updating the tree doesn't postpone its expiry (see
+        `_set_cached_metadata_inheritance_tree`).
+
+        Updates to the same course are serialized with a lock in the caching
+        subsystem, so that they don't overwrite each other's changes. If the
+        lock is held, this doesn't wait for it: the cached tree is dropped
+        instead, to be recomputed in full, and so is the lock, so that its
+        holder doesn't store a tree which misses this change.
+        """
+        location = Location(location).replace(revision=None)
+        if get_course_id_no_run(location) in self.ignore_write_events_on_courses:
+            return
+
+        cache_subsystem = self.metadata_inheritance_cache_subsystem
+        if cache_subsystem is None or location.category == 'course':
+            # There is nothing to update in place, so compute the whole tree
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return
+
+        key = metadata_cache_key(location)
+        lock_key = key + u'/update_lock'
+        token = uuid4().hex
+        if not cache_subsystem.add(lock_key, token, METADATA_INHERITANCE_LOCK_TIMEOUT):
+            log.info("The metadata inheritance tree of %s is being updated; dropping it", location)
+            cache_subsystem.delete(key)
+            cache_subsystem.delete(lock_key)
+            return
+        try:
+            tree = self._updated_metadata_inheritance_tree(location, cache_subsystem.get(key))
+            # Don't store the tree if the lock expired while computing it
+            if tree is not None and cache_subsystem.get(lock_key) == token:
+                self._set_cached_metadata_inheritance_tree(location, tree)
+        finally:
+            if cache_subsystem.get(lock_key) == token:
+                cache_subsystem.delete(lock_key)
+
+    def _updated_metadata_inheritance_tree(self, location, cached_tree):
+        """
+        Return a copy of `cached_tree` with the subtree rooted at location
+        recomputed (see `update_cached_metadata_inheritance_tree`). If it
+        can't be updated in place, store the fully recomputed tree and return None.
+        """
+        if not cached_tree:
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return None
+
+        # Find what location inherits from its parent. The cached tree has the
+        # metadata that each container passes on to its children, except for
+        # the course itself, which doesn't inherit anything.
+        query, record_filter = self._inheritance_query(location, **{'definition.children': location.url()})
+        parents = self._collate_inheritance_records(self.collection.find(query, record_filter))
+        if len(parents) != 1:
+            # location is an orphan, or has several parents that it could inherit
+            # different metadata from, so play it safe.
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return None
+        parent_url, parent = parents.items()[0]
+        if parent['_id']['category'] == 'course':
+            inherited_metadata = parent.get('metadata', {})
+        elif parent_url in cached_tree:
+            inherited_metadata = cached_tree[parent_url]
+        else:
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return None
+
+        # Copy the tree (but not its metadata dicts), since other code may be
+        # holding on to the cached tree.
+        tree = cached_tree.copy()
+        to_process = {location.url(): inherited_metadata}
+        while to_process:
+            query, record_filter = self._inheritance_query(
+                location, **{'_id.name': {'$in': [Location(url).name for url in to_process]}}
+            )
+            containers = self._collate_inheritance_records(self.collection.find(query, record_filter))
+            children_to_process = {}
+            for url, metadata in to_process.iteritems():
+                if url not in containers:
+                    # leaf nodes just inherit their parent's metadata
+                    tree[url] = metadata
+                    continue
+
+                new_metadata = self._inherit_from(metadata, containers[url].get('metadata', {}))
+                tree[url] = new_metadata
+                for child in containers[url].get('definition', {}).get('children', []):
+                    children_to_process[child] = new_metadata
+            to_process = children_to_process
+
+        return tree
+
     def _clean_item_data(self, item):
         """
         Renames the '_id' field in item to 'location'
@@ -434,13 +795,44 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
     def _query_children_for_cache_children(self, items):
         """
-        Generate a pymongo in query for finding the items and return the payloads
+        Generate a pymongo in query for finding the items and return the payloads,
+        without their definition data
         """
         # first get non-draft in a round-trip
         query = {
             '_id': {'$in': [namedtuple_to_son(Location(item)) for item in items]}
         }
-        return list(self.collection.find(query))
+        return list(self.collection.find(query, STRUCTURE_ONLY_FIELDS))
+
+    def get_definition_data(self, locations):
+        """
+        Return a dict mapping each of locations to the definition data of the block
+        stored there, for blocks that were loaded structure-only
+        """
+        query = {
+            '_id': {'$in': [namedtuple_to_son(Location(location)) for location in locations]}
+        }
+        return dict(
+            (Location(item['_id']), item.get('definition', {}).get('data', {}))
+            for item in self.collection.find(query, ['definition.data'])
+        )
+
+    def get_content_hashes(self, location):
+        """
+        Return a dict mapping the url of each non-draft block in location's course to the
+        content_hash of its stored fields
+        """
+        query = location_to_query(location.replace(category=None, name=None, revision=None))
+        return dict(
+            (
+                Location(item['_id']).url(),
+                content_hash(
+                    item.get('definition', {}).get('data', {}), item.get('metadata', {}),
+                    item.get('definition', {}).get('children')
+                )
+            )
+            for item in self.collection.find(query, ['definition', 'metadata'])
+        )
 
     def _cache_children(self, items, depth=0):
         """
@@ -449,16 +841,34 @@ class MongoModuleStore(ModuleStoreWriteBase):
         (0 = no descendents, 1 = children, 2 = grandchildren, etc)
         If depth is None, will load all the children.
         This will make a number of queries that is linear in the depth.
+
+        Descendents are loaded structure-only: their definition data is fetched
+        the first time a content field of any of them is read, for all of them at once.
         """
+        data, structure_only_locations = self._fetch_descendents(items, depth)
+        return self._with_lazy_definitions(data, structure_only_locations)
 
+    def _fetch_descendents(self, items, depth=0):
+        """
+        Return the json data of items and their descendents up to the specified
+        depth, as for `_cache_children`, but without anything in place of the
+        definition data of the descendents, as (dict mapping Location -> item data,
+        set of the Locations of the descendents, which were loaded structure-only).
+        """
         data = {}
+        structure_only_locations = set()
+        # the items themselves are loaded in full
+        structure_only = False
         to_process = list(items)
         while to_process and depth is None or depth >= 0:
             children = []
             for item in to_process:
                 self._clean_item_data(item)
                 children.extend(item.get('definition', {}).get('children', []))
-                data[Location(item['location'])] = item
+                location = Location(item['location'])
+                data[location] = item
+                if structure_only:
+                    structure_only_locations.add(location)
 
             if depth == 0:
                 break
@@ -469,11 +879,24 @@ class MongoModuleStore(ModuleStoreWriteBase):
             to_process = []
             if children:
                 to_process = self._query_children_for_cache_children(children)
+            structure_only = True
 
             # If depth is None, then we just recurse until we hit all the descendents
             if depth is not None:
                 depth -= 1
 
+        return data, structure_only_locations
+
+    def _with_lazy_definitions(self, data, structure_only_locations):
+        """
+        Put DefinitionLazyLoaders, which share a single batch, in place of the
+        definition data of the items in data at structure_only_locations, and return data
+        """
+        lazy_batch = {}
+        for location in structure_only_locations:
+            item = data[location]
+            lazy_batch[location] = item
+            item.setdefault('definition', {})['data'] = DefinitionLazyLoader(self, location, lazy_batch)
         return data
 
     def _load_item(self, item, data_cache, apply_cached_metadata=True):
@@ -540,6 +963,64 @@ class MongoModuleStore(ModuleStoreWriteBase):
             )
         ]
 
+    def _course_summaries_query(self, lower_ids=None):
+        """
+        Return the query for the summaries of the courses with the given lower_ids (all the
+        courses if None), other than the templates
+        """
+        query = {'_id': {'$ne': COURSE_SUMMARIES_BUILT_ID}, 'course': {'$ne': 'templates'}}
+        if lower_ids is not None:
+            query['lower_id'] = {'$in': list(lower_ids)}
+        return query
+
+    def get_course_summaries(self, lower_ids=None, start=0, count=None):
+        """
+        Return the summaries (see course_summary) of the courses with the given lower_ids (all
+        the courses if None), sorted by display name, from the start'th up to count of them,
+        without loading the courses.
+        """
+        self._ensure_course_summaries()
+        summaries = self.course_summaries.find(
+            self._course_summaries_query(lower_ids),
+            sort=[('sort_name', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)],
+            skip=start,
+            limit=count or 0,
+        )
+        return list(summaries)
+
+    def count_course_summaries(self, lower_ids=None):
+        """
+        Return how many courses get_course_summaries would return in all
+        """
+        self._ensure_course_summaries()
+        return self.course_summaries.find(self._course_summaries_query(lower_ids)).count()
+
+    def _ensure_course_summaries(self):
+        """
+        Build the course summary index unless it was built already. Since update_item adds the
+        summaries of the courses it writes, a non-empty index may still lack older courses;
+        so, this checks for the marker which rebuild_course_summaries leaves.
+        """
+        if self.course_summaries.find_one({'_id': COURSE_SUMMARIES_BUILT_ID}) is None:
+            self.rebuild_course_summaries()
+
+    def rebuild_course_summaries(self):
+        """
+        Recreate the course summary index from the courses in this store, and mark it as built
+        """
+        for item in self.collection.find({'_id.category': 'course', '_id.revision': None}, ['metadata']):
+            self._update_course_summary(Location(item['_id']), item.get('metadata', {}))
+        self.course_summaries.update(
+            {'_id': COURSE_SUMMARIES_BUILT_ID}, {'_id': COURSE_SUMMARIES_BUILT_ID}, upsert=True
+        )
+
+    def _update_course_summary(self, location, metadata):
+        """
+        Save the summary of the course at location in the course summary index
+        """
+        summary = course_summary(location, metadata)
+        self.course_summaries.update({'_id': summary['_id']}, summary, upsert=True)
+
     def _find_one(self, location):
         '''Look for a given location in the collection.  If revision is not
         specified, returns the latest.  If the item is not present, raise
@@ -596,6 +1077,40 @@ class MongoModuleStore(ModuleStoreWriteBase):
         module = self._load_items([item], depth)[0]
         return module
 
+    def get_item_data(self, location, depth=0):
+        """
+        Return the json data that `load_item_data` loads the item at location
+        from, along with its descendents up to depth (see `get_item`), as
+        (item data, size of the json in bytes).
+
+        The item data isn't bound to any runtime, and `load_item_data` never
+        modifies it, so it can be kept to load new descriptors for the item later.
+        """
+        location = Location.ensure_fully_specified(location)
+        item = self._find_one(location)
+        data, structure_only_locations = self._fetch_descendents([item], depth)
+        size = sum(len(BSON.encode(item_json)) for item_json in data.itervalues())
+        item_data = {
+            'location': Location(item['location']),
+            'depth': depth,
+            'data': data,
+            'structure_only_locations': structure_only_locations,
+        }
+        return item_data, size
+
+    def load_item_data(self, item_data):
+        """
+        Return a new XModuleDescriptor for the item data returned by `get_item_data`
+        """
+        data = self._with_lazy_definitions(
+            copy.deepcopy(item_data['data']), item_data['structure_only_locations']
+        )
+        item = data[item_data['location']]
+        return self._load_item(
+            item, data,
+            apply_cached_metadata=(item['location']['category'] != 'course' or item_data['depth'] != 0)
+        )
+
     def get_instance(self, course_id, location, depth=0):
         """
         TODO (vshnayder): implement policy tracking in mongo.
@@ -794,6 +1309,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
                                    for child in xblock.children]
                 payload.update({'definition.children': xblock.children})
             self._update_single_item(xblock.location, payload)
+            if xblock.category == 'course':
+                self._update_course_summary(xblock.location, payload['metadata'])
             # for static tabs, their containing course also records their display name
             if xblock.category == 'static_tab':
                 course = self._get_course_for_item(xblock.location)
@@ -806,9 +1323,9 @@ class MongoModuleStore(ModuleStoreWriteBase):
                             self.update_item(course, user)
                             break
 
-            # recompute (and update) the metadata inheritance tree which is cached
+            # update the part of the metadata inheritance tree which is cached that is under this block
             # was conditional on children or metadata having changed before dhm made one update to rule them all
-            self.refresh_cached_metadata_inheritance_tree(xblock.location)
+            self.update_cached_metadata_inheritance_tree(xblock.location)
             # fire signal that we've written to DB
             self.fire_updated_modulestore_signal(get_course_id_no_run(xblock.location), xblock.location)
         except ItemNotFoundError:
@@ -823,6 +1340,7 @@ class MongoModuleStore(ModuleStoreWriteBase):
         location: Something that can be passed to Location
         """
         # pylint: enable=unused-argument
+        location = Location(location)
         # VS[compat] cdodge: This is a hack because static_tabs also have references from the course module, so
         # if we add one then we need to also add it to the policy information (i.e. metadata)
         # we should remove this once we can break this reference from the course to static tabs
@@ -835,10 +1353,12 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
         # from overriding our default value set in the init method.
-        self.collection.remove({'_id': Location(location).dict()}, safe=self.collection.safe)
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(Location(location))
-        self.fire_updated_modulestore_signal(get_course_id_no_run(Location(location)), Location(location))
+        self.collection.remove({'_id': location.dict()}, safe=self.collection.safe)
+        if location.category == 'course' and location.revision is None:
+            self.course_summaries.remove({'_id': location.course_id})
+        # update the metadata inheritance tree which is cached
+        self.update_cached_metadata_inheritance_tree(location)
+        self.fire_updated_modulestore_signal(get_course_id_no_run(location), location)
 
     def get_parent_locations(self, location, course_id):
         '''Find all locations that are the parents of this location in this
@@ -0,0 +1,35 @@
+class DefinitionLazyLoader(object):
+    """
+    A placeholder to put into a block's json data in place of its definition
+    data, for blocks that were loaded structure-only, which knows how to get
+    that data when it's first accessed. Only works if the modulestore is a
+    mongo store.
+
+    Blocks loaded together share a batch, and fetching the data for any one
+    of them fetches it for the whole batch in a single query, since callers
+    that need the content of one block usually need its siblings' too.
+    """
+    def __init__(self, modulestore, location, batch):
+        """
+        Simple placeholder for yet-to-be-fetched data
+        :param modulestore: the mongo modulestore the block was loaded from
+        :param location: the Location of the block, which must be in batch
+        :param batch: a dict mapping Location -> json data of the blocks whose data
+            is still to be fetched, shared by the loaders of all the blocks loaded together
+        """
+        self.modulestore = modulestore
+        self.location = location
+        self.batch = batch
+        self.json_data = batch[location]
+
+    def fetch(self):
+        """
+        Fetch the definition data, replacing the lazy loaders in the json data
+        of every block in the batch with the result, and return this block's data.
+        """
+        if self.location in self.batch:
+            data_by_location = self.modulestore.get_definition_data(self.batch.keys())
+            for location, json_data in self.batch.iteritems():
+                json_data['definition']['data'] = data_by_location.get(location, {})
+            self.batch.clear()
+        return self.json_data['definition']['data']
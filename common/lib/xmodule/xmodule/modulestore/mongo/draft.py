@@ -11,7 +11,9 @@ from datetime import datetime
 from xmodule.exceptions import InvalidVersionError
 from xmodule.modulestore import Location
 from xmodule.modulestore.exceptions import ItemNotFoundError, DuplicateItemError
-from xmodule.modulestore.mongo.base import location_to_query, namedtuple_to_son, get_course_id_no_run, MongoModuleStore
+from xmodule.modulestore.mongo.base import (
+    location_to_query, namedtuple_to_son, get_course_id_no_run, MongoModuleStore, STRUCTURE_ONLY_FIELDS
+)
 import pymongo
 from pytz import UTC
 
@@ -151,7 +153,7 @@ class DraftModuleStore(MongoModuleStore):
         except pymongo.errors.DuplicateKeyError:
             raise DuplicateItemError(original['_id'])
 
-        self.refresh_cached_metadata_inheritance_tree(draft_location)
+        self.update_cached_metadata_inheritance_tree(draft_location)
         self.fire_updated_modulestore_signal(get_course_id_no_run(draft_location), draft_location)
 
         return self._load_items([original])[0]
@@ -241,7 +243,7 @@ class DraftModuleStore(MongoModuleStore):
         query = {
             '_id': {'$in': [namedtuple_to_son(as_draft(Location(item))) for item in items]}
         }
-        to_process_drafts = list(self.collection.find(query))
+        to_process_drafts = list(self.collection.find(query, STRUCTURE_ONLY_FIELDS))
 
         # now we have to go through all drafts and replace the non-draft
         # with the draft. This is because the semantics of the DraftStore is to
@@ -54,8 +54,10 @@ class SplitMigrator(object):
             master_branch=new_course_root_locator.branch
         )
 
-        self._copy_published_modules_to_course(new_course, course_location, old_course_id, user)
-        self._add_draft_modules_to_course(new_package_id, old_course_id, course_location, user)
+        # save each branch as one new version rather than one per module
+        with self.split_modulestore.bulk_write_operations(new_package_id):
+            self._copy_published_modules_to_course(new_course, course_location, old_course_id, user)
+            self._add_draft_modules_to_course(new_package_id, old_course_id, course_location, user)
 
         return new_package_id
 
@@ -98,8 +100,8 @@ class SplitMigrator(object):
         """
         update each draft. Create any which don't exist in published and attach to their parents.
         """
-        # each true update below will trigger a new version of the structure. We may want to just have one new version
-        # but that's for a later date.
+        # run in a bulk write (see migrate_mongo_course), so the updates below all go into one new version of the
+        # structure.
         new_draft_course_loc = CourseLocator(package_id=new_package_id, branch='draft')
         # to prevent race conditions of grandchilden being added before their parents and thus having no parent to
         # add to
@@ -35,7 +35,7 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
     A system that has a cache of a course version's json that it will use to load modules
     from, with a backup of calling to the underlying modulestore for more data.
 
-    Computes the settings (nee 'metadata') inheritance upon creation.
+    Gets the settings (nee 'metadata') inheritance upon creation.
     """
     def __init__(self, modulestore, course_entry, default_class, module_data, lazy, **kwargs):
         """
@@ -61,13 +61,8 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
         self.course_entry = course_entry
         self.lazy = lazy
         self.module_data = module_data
-        # Compute inheritance
-        modulestore.inherit_settings(
-            course_entry['structure'].get('blocks', {}),
-            course_entry['structure'].get('blocks', {}).get(
-                LocMapperStore.encode_key_for_mongo(course_entry['structure'].get('root'))
-            )
-        )
+        # Compute inheritance (or reuse what was computed for this structure version)
+        self.inherited_settings = modulestore.get_inherited_settings(course_entry['structure'])
         self.default_class = default_class
         self.local_modules = {}
 
@@ -122,10 +117,15 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
             branch=course_entry_override.get('branch')
         )
 
+        # blocks not yet persisted (see create_xblock) carry their own inherited settings
+        inherited_settings = json_data.get('_inherited_settings')
+        if inherited_settings is None and isinstance(block_id, basestring):
+            inherited_settings = self.inherited_settings.get(LocMapperStore.encode_key_for_mongo(block_id))
+
         kvs = SplitMongoKVS(
             definition,
             json_data.get('fields', {}),
-            json_data.get('_inherited_settings'),
+            inherited_settings,
         )
         field_data = KvsFieldData(kvs)
 
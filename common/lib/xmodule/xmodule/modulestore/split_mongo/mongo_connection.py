@@ -8,11 +8,15 @@ class MongoConnection(object):
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
+        structure_cache=None, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        :param structure_cache: an optional StructureCache to read structures through
         """
+        self.structure_cache = structure_cache
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
                 host=host,
@@ -42,7 +46,38 @@ class MongoConnection(object):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return self.structures.find_one({'_id': key})
+        if self.structure_cache is not None:
+            structure = self.structure_cache.get(key)
+            if structure is not None:
+                return structure
+
+        structure = self.structures.find_one({'_id': key})
+        if structure is not None and self.structure_cache is not None:
+            self.structure_cache.set(structure)
+        return structure
+
+    def get_structures(self, keys):
+        """
+        Get the structures from the persistence mechanism whose ids are the given keys,
+        in no particular order
+        """
+        structures = []
+        missing = list(keys)
+        if self.structure_cache is not None:
+            missing = []
+            for key in keys:
+                structure = self.structure_cache.get(key)
+                if structure is not None:
+                    structures.append(structure)
+                else:
+                    missing.append(key)
+
+        if missing:
+            for structure in self.structures.find({'_id': {'$in': missing}}):
+                if self.structure_cache is not None:
+                    self.structure_cache.set(structure)
+                structures.append(structure)
+        return structures
 
     def find_matching_structures(self, query):
         """
@@ -62,6 +97,8 @@ class MongoConnection(object):
         Update the db record for structure
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        if self.structure_cache is not None:
+            self.structure_cache.delete(structure['_id'])
 
     def get_course_index(self, key):
         """
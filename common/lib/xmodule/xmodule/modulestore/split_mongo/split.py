@@ -46,6 +46,8 @@ Representation:
 """
 import threading
 import datetime
+from collections import OrderedDict
+from contextlib import contextmanager
 import logging
 import re
 from importlib import import_module
@@ -68,6 +70,8 @@ from .caching_descriptor_system import CachingDescriptorSystem
 from xblock.fields import Scope
 from bson.objectid import ObjectId
 from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
+from xmodule.modulestore.split_mongo.structure_cache import StructureCache
+from xmodule.modulestore.split_mongo.structure_index import StructureIndex
 from xblock.core import XBlock
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -93,6 +97,46 @@ log = logging.getLogger(__name__)
 #==============================================================================
 
 
+class CopyOnWriteBlocks(dict):
+    """
+    The blocks of a new version of a structure, which starts out sharing its block dicts with the
+    previous version rather than copying them all. `shared` holds the encoded ids of the blocks
+    which haven't been copied yet; SplitMongoModuleStore._get_block_for_update copies them before
+    they're modified. Stored and pickled like any other dict.
+    """
+    def __init__(self, blocks):
+        super(CopyOnWriteBlocks, self).__init__(blocks)
+        self.shared = set(blocks)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class BulkWriteRecord(object):
+    """
+    The writes to a course which SplitMongoModuleStore.bulk_write_operations holds in memory until it exits.
+    """
+    def __init__(self, index):
+        # the course's index entry, whose versions point at the pending structures
+        self.index = index
+        self.index_dirty = False
+        # version guid -> structure, for the structures which aren't saved yet
+        self.structures = {}
+        # the version guids in structures which already exist in the db (to update rather than insert)
+        self.persisted = set()
+
+    def owns(self, version_guid):
+        """
+        Whether version_guid was created during this bulk write and is the head of at most one branch,
+        so that further writes can revise it rather than create yet another version
+        """
+        return (
+            version_guid in self.structures and
+            version_guid not in self.persisted and
+            self.index['versions'].values().count(version_guid) <= 1
+        )
+
+
 class SplitMongoModuleStore(ModuleStoreWriteBase):
     """
     A Mongodb backed ModuleStore supporting versions, inheritance,
@@ -101,25 +145,45 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
     SCHEMA_VERSION = 1
     reference_type = Locator
+    # how many course versions' CachingDescriptorSystems to keep per thread
+    MAX_CACHED_SYSTEMS = 20
+    # how many structures' StructureIndexes to keep
+    MAX_CACHED_INDEXES = 50
+
     def __init__(self, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
                  i18n_service=None,
+                 structure_cache_subsystem=None,
+                 structure_cache_bytes=32 * 1024 * 1024,
+                 structure_cache_local_timeout=60,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_subsystem: an optional cache shared between processes (e.g. memcached) for structures
+        :param structure_cache_bytes: how many bytes of pickled structures to cache in this process
+        :param structure_cache_local_timeout: how many seconds this process may use its cached copy of a
+            structure before reading it again from structure_cache_subsystem, which bounds how long it can
+            miss an in-place update made by another process
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            structure_cache=StructureCache(
+                structure_cache_bytes, structure_cache_subsystem, structure_cache_local_timeout
+            ),
+            **doc_store_config
+        )
         self.db = self.db_connection.database
 
-        # Code review question: How should I expire entries?
-        # _add_cache could use a lru mechanism to control the cache size?
+        # holds the CachingDescriptorSystems for the most recently used course versions
         self.thread_cache = threading.local()
+        # (version guid, edited_on) -> StructureIndex for the most recently queried structures, shared by all threads
+        self.structure_indexes = OrderedDict()
+        self.structure_indexes_lock = threading.Lock()
 
         if default_class is not None:
             module_path, _, class_name = default_class.rpartition('.')
@@ -149,6 +213,10 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                 depth,
                 new_module_data
             )
+        # the blocks may belong to a structure still being written in a bulk write (see _get_structure);
+        # so, don't put the definitions into them
+        for block_id, block in new_module_data.iteritems():
+            new_module_data[block_id] = dict(block)
 
         if lazy:
             for block in new_module_data.itervalues():
@@ -164,6 +232,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
             for block in new_module_data.itervalues():
                 if block['definition'] in definitions:
+                    block['fields'] = dict(block['fields'])
                     block['fields'].update(definitions[block['definition']].get('fields'))
 
         system.module_data.update(new_module_data)
@@ -204,19 +273,25 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
-        system = self.thread_cache.course_cache
-        return system.get(course_version_guid)
+            self.thread_cache.course_cache = OrderedDict()
+        system = self.thread_cache.course_cache.pop(course_version_guid, None)
+        if system is not None:
+            # keep it as the most recently used
+            self.thread_cache.course_cache[course_version_guid] = system
+        return system
 
     def _add_cache(self, course_version_guid, system):
         """
-        Save this cache for subsequent access
+        Save this cache for subsequent access, dropping the least recently used
+        ones beyond MAX_CACHED_SYSTEMS
         :param course_version_guid:
         :param system:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
         self.thread_cache.course_cache[course_version_guid] = system
+        while len(self.thread_cache.course_cache) > self.MAX_CACHED_SYSTEMS:
+            self.thread_cache.course_cache.popitem(last=False)
         return system
 
     def _clear_cache(self, course_version_guid=None):
@@ -225,9 +300,153 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid: if provided, clear only this entry
         """
         if course_version_guid:
-            del self.thread_cache.course_cache[course_version_guid]
+            if hasattr(self.thread_cache, 'course_cache'):
+                self.thread_cache.course_cache.pop(course_version_guid, None)
         else:
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
+
+    @contextmanager
+    def bulk_write_operations(self, package_id):
+        """
+        A context manager in which all the writes this thread makes to the course package_id (create_item,
+        update_item, delete_item, persist_xblock_dag, xblock_publish, ...) accumulate in memory: each branch
+        gets at most one new structure version no matter how many writes are made to it. On exit, the new
+        structures are saved and the course index updated once. Reads in this thread see the pending
+        writes; other threads and processes only see them once the outermost with block exits.
+
+        If the with block raises an exception, the pending writes are discarded.
+
+        :param package_id: the course to write to, which must already exist
+        """
+        bulk_writes = self._get_bulk_writes()
+        if package_id in bulk_writes:
+            # nested: the outermost one saves the writes
+            yield
+            return
+
+        index_entry = self.db_connection.get_course_index(package_id)
+        if index_entry is None:
+            raise ItemNotFoundError(package_id)
+        record = BulkWriteRecord(index_entry)
+        bulk_writes[package_id] = record
+        try:
+            yield
+            for version_guid, structure in record.structures.iteritems():
+                if version_guid in record.persisted:
+                    self.db_connection.update_structure(structure)
+                else:
+                    self.db_connection.insert_structure(structure)
+            if record.index_dirty:
+                self.db_connection.update_course_index(record.index)
+        finally:
+            del bulk_writes[package_id]
+            for version_guid in record.structures:
+                self._clear_cache(version_guid)
+
+    @staticmethod
+    def _structure_index_key(structure):
+        """
+        The key of structure's StructureIndex: its version guid and edit time. A structure which is
+        updated in place (see _update_structure) gets a new edit time, so processes which still have
+        an index of its previous contents don't use it for the new ones.
+        """
+        return (structure['_id'], structure.get('edited_on'))
+
+    def _get_structure_index(self, structure):
+        """
+        Get the StructureIndex of structure, building it if it isn't cached. Only for structures which
+        are saved and won't be modified: see _invalidate_structure_index.
+        """
+        key = self._structure_index_key(structure)
+        with self.structure_indexes_lock:
+            index = self.structure_indexes.pop(key, None)
+            if index is not None:
+                # keep it as the most recently used
+                self.structure_indexes[key] = index
+                return index
+
+        index = StructureIndex(structure['blocks'])
+        with self.structure_indexes_lock:
+            self.structure_indexes[key] = index
+            while len(self.structure_indexes) > self.MAX_CACHED_INDEXES:
+                self.structure_indexes.popitem(last=False)
+        return index
+
+    def _invalidate_structure_index(self, version_guid):
+        """
+        Drop the StructureIndexes of a structure which is being changed in place
+        """
+        with self.structure_indexes_lock:
+            for key in self.structure_indexes.keys():
+                if key[0] == version_guid:
+                    del self.structure_indexes[key]
+
+    def _get_bulk_writes(self):
+        """
+        Return this thread's in progress bulk writes: a dict of package_id -> BulkWriteRecord
+        """
+        if not hasattr(self.thread_cache, 'bulk_writes'):
+            self.thread_cache.bulk_writes = {}
+        return self.thread_cache.bulk_writes
+
+    def _get_bulk_write_for_version(self, version_guid):
+        """
+        Return the BulkWriteRecord holding the unsaved structure version_guid, if any
+        """
+        for record in self._get_bulk_writes().itervalues():
+            if version_guid in record.structures:
+                return record
+        return None
+
+    def _get_course_index(self, package_id):
+        """
+        Get the index entry for package_id, including any pending bulk writes to it
+        """
+        record = self._get_bulk_writes().get(package_id)
+        if record is not None:
+            return record.index
+        return self.db_connection.get_course_index(package_id)
+
+    def _get_structure(self, version_guid):
+        """
+        Get the structure version_guid, including any pending bulk writes to it.
+
+        A pending structure is returned as is rather than copied, so that many writes in one bulk
+        write don't each copy the whole structure: the writes which change it revise it in place
+        (see _version_structure), and readers must not modify it (see cache_items).
+        """
+        record = self._get_bulk_write_for_version(version_guid)
+        if record is not None:
+            return record.structures[version_guid]
+        return self.db_connection.get_structure(version_guid)
+
+    def _insert_structure(self, structure, package_id):
+        """
+        Save the new structure, or hold it until the end of the bulk write to package_id if there is one
+        """
+        record = self._get_bulk_writes().get(package_id)
+        if record is None:
+            self.db_connection.insert_structure(structure)
+        else:
+            record.structures[structure['_id']] = structure
+            self._clear_cache(structure['_id'])
+            self._invalidate_structure_index(structure['_id'])
+
+    def _update_structure(self, structure, package_id):
+        """
+        Overwrite the structure in place, or hold it until the end of the bulk write to package_id if there is one
+        """
+        # a new edit time tells other processes that their StructureIndexes of it are out of date
+        structure['edited_on'] = datetime.datetime.now(UTC)
+        self._invalidate_structure_index(structure['_id'])
+        record = self._get_bulk_writes().get(package_id)
+        if record is None:
+            self.db_connection.update_structure(structure)
+        else:
+            if structure['_id'] not in record.structures:
+                record.persisted.add(structure['_id'])
+            record.structures[structure['_id']] = structure
+            self._clear_cache(structure['_id'])
 
     def _lookup_course(self, course_locator):
         '''
@@ -242,14 +461,14 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         :param course_locator: any subclass of CourseLocator
         '''
-        # NOTE: if and when this uses cache, the update if changed logic will break if the cache
-        # holds the same objects as the descriptors!
+        # NOTE: the structure cache returns a fresh copy of the structure on every get, as the
+        # update if changed logic would break if the cache held the same objects as the descriptors!
         if not course_locator.is_fully_specified():
             raise InsufficientSpecificationError('Not fully specified: %s' % course_locator)
 
         if course_locator.package_id is not None and course_locator.branch is not None:
             # use the package_id
-            index = self.db_connection.get_course_index(course_locator.package_id)
+            index = self._get_course_index(course_locator.package_id)
             if index is None:
                 raise ItemNotFoundError(course_locator)
             if course_locator.branch not in index['versions']:
@@ -264,7 +483,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         # cast string to ObjectId if necessary
         version_guid = course_locator.as_object_id(version_guid)
-        entry = self.db_connection.get_structure(version_guid)
+        entry = self._get_structure(version_guid)
 
         # b/c more than one course can use same structure, the 'package_id' and 'branch' are not intrinsic to structure
         # and the one assoc'd w/ it by another fetch may not be the one relevant to this fetch; so,
@@ -302,7 +521,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             version_guids.append(version_guid)
             id_version_map[version_guid] = structure['_id']
 
-        course_entries = self.db_connection.find_matching_structures({'_id': {'$in': version_guids}})
+        course_entries = self.db_connection.get_structures(version_guids)
 
         # get the block for the course element (s/b the root)
         result = []
@@ -404,9 +623,15 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         if qualifiers is None:
             qualifiers = {}
         course = self._lookup_course(locator)
+        blocks = course['structure']['blocks']
+        candidates = self._get_structure_index(course['structure']).candidates(qualifiers)
+        if candidates is None:
+            candidates = blocks.iterkeys()
         items = []
-        for block_id, value in course['structure']['blocks'].iteritems():
-            if self._block_matches(value, qualifiers):
+        for block_id in candidates:
+            # another process may have changed the structure in place since its index was built
+            value = blocks.get(block_id)
+            if value is not None and self._block_matches(value, qualifiers):
                 items.append(block_id)
 
         if len(items) > 0:
@@ -479,7 +704,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         if course_locator.package_id is None:
             return None
-        index = self.db_connection.get_course_index(course_locator.package_id)
+        index = self._get_course_index(course_locator.package_id)
         return index
 
     # TODO figure out a way to make this info accessible from the course descriptor
@@ -780,20 +1005,16 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         parent = None
         if isinstance(course_or_parent_locator, BlockUsageLocator) and course_or_parent_locator.block_id is not None:
             encoded_block_id = LocMapperStore.encode_key_for_mongo(course_or_parent_locator.block_id)
-            parent = new_structure['blocks'][encoded_block_id]
+            parent = self._get_block_for_update(new_structure, course_or_parent_locator.block_id)
             parent['fields'].setdefault('children', []).append(new_block_id)
-            if not continue_version or parent['edit_info']['update_version'] != structure['_id']:
-                parent['edit_info']['edited_on'] = datetime.datetime.now(UTC)
-                parent['edit_info']['edited_by'] = user_id
-                parent['edit_info']['previous_version'] = parent['edit_info']['update_version']
-                parent['edit_info']['update_version'] = new_id
+            self._update_edit_info(parent['edit_info'], user_id, new_id)
         if continue_version:
             # db update
-            self.db_connection.update_structure(new_structure)
+            self._update_structure(new_structure, course_or_parent_locator.package_id)
             # clear cache so things get refetched and inheritance recomputed
             self._clear_cache(new_id)
         else:
-            self.db_connection.insert_structure(new_structure)
+            self._insert_structure(new_structure, course_or_parent_locator.package_id)
 
         # update the index entry if appropriate
         if index_entry is not None:
@@ -897,8 +1118,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             if definition_fields or block_fields:
                 draft_structure = self._version_structure(draft_structure, user_id)
                 new_id = draft_structure['_id']
-                encoded_block_id = LocMapperStore.encode_key_for_mongo(draft_structure['root'])
-                root_block = draft_structure['blocks'][encoded_block_id]
+                root_block = self._get_block_for_update(draft_structure, draft_structure['root'])
                 if block_fields is not None:
                     root_block['fields'].update(block_fields)
                 if definition_fields is not None:
@@ -911,10 +1131,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                     definition['schema_version'] = self.SCHEMA_VERSION
                     self.db_connection.insert_definition(definition)
                     root_block['definition'] = definition['_id']
-                    root_block['edit_info']['edited_on'] = datetime.datetime.now(UTC)
-                    root_block['edit_info']['edited_by'] = user_id
-                    root_block['edit_info']['previous_version'] = root_block['edit_info'].get('update_version')
-                    root_block['edit_info']['update_version'] = new_id
+                    self._update_edit_info(root_block['edit_info'], user_id, new_id)
 
                 self.db_connection.insert_structure(draft_structure)
                 versions_dict[master_branch] = new_id
@@ -965,7 +1182,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         # if updated, rev the structure
         if is_updated:
             new_structure = self._version_structure(original_structure, user_id)
-            block_data = self._get_block_from_structure(new_structure, descriptor.location.block_id)
+            block_data = self._get_block_for_update(new_structure, descriptor.location.block_id)
 
             block_data["definition"] = descriptor.definition_locator.definition_id
             block_data["fields"] = descriptor.get_explicitly_set_fields_by_scope(Scope.settings)
@@ -973,13 +1190,8 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                 block_data['fields']["children"] = descriptor.children
 
             new_id = new_structure['_id']
-            block_data['edit_info'] = {
-                'edited_on': datetime.datetime.now(UTC),
-                'edited_by': user_id,
-                'previous_version': block_data['edit_info']['update_version'],
-                'update_version': new_id,
-            }
-            self.db_connection.insert_structure(new_structure)
+            self._update_edit_info(block_data['edit_info'], user_id, new_id)
+            self._insert_structure(new_structure, descriptor.location.package_id)
             # update the index entry if appropriate
             if index_entry is not None:
                 self._update_head(index_entry, descriptor.location.branch, new_id)
@@ -1051,7 +1263,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         is_updated = self._persist_subdag(xblock, user_id, new_structure['blocks'], new_id)
 
         if is_updated:
-            self.db_connection.insert_structure(new_structure)
+            self._insert_structure(new_structure, xblock.location.package_id)
 
             # update the index entry if appropriate
             if index_entry is not None:
@@ -1113,17 +1325,16 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             block_fields['children'] = children
 
         if is_updated:
-            previous_version = None if is_new else structure_blocks[encoded_block_id]['edit_info'].get('update_version')
+            if is_new:
+                edit_info = {'previous_version': None, 'update_version': new_id}
+            else:
+                edit_info = structure_blocks[encoded_block_id]['edit_info'].copy()
+            self._update_edit_info(edit_info, user_id, new_id)
             structure_blocks[encoded_block_id] = {
                 "category": xblock.category,
                 "definition": xblock.definition_locator.definition_id,
                 "fields": block_fields,
-                'edit_info': {
-                    'previous_version': previous_version,
-                    'update_version': new_id,
-                    'edited_by': user_id,
-                    'edited_on': datetime.datetime.now(UTC)
-                }
+                'edit_info': edit_info,
             }
 
         return is_updated
@@ -1179,7 +1390,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         # get the destination's index, and source and destination structures.
         source_structure = self._lookup_course(source_course)['structure']
-        index_entry = self.db_connection.get_course_index(destination_course.package_id)
+        index_entry = self._get_course_index(destination_course.package_id)
         if index_entry is None:
             # brand new course
             raise ItemNotFoundError(destination_course)
@@ -1205,7 +1416,9 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                 orphans.update(
                     self._sync_children(
                         source_structure['blocks'][parent_loc],
-                        destination_blocks[parent_loc],
+                        self._get_block_for_update(
+                            destination_structure, LocMapperStore.decode_key_from_mongo(parent_loc)
+                        ),
                         subtree_root
                 ))
             # update/create the subtree and its children in destination (skipping blacklist)
@@ -1215,12 +1428,13 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                 )
             )
         # remove any remaining orphans
+        destination_index = StructureIndex(destination_blocks)
         for orphan in orphans:
             # orphans will include moved as well as deleted xblocks. Only delete the deleted ones.
-            self._delete_if_true_orphan(orphan, destination_structure)
+            self._delete_if_true_orphan(orphan, destination_structure, destination_index)
 
         # update the db
-        self.db_connection.insert_structure(destination_structure)
+        self._insert_structure(destination_structure, destination_course.package_id)
         self._update_head(index_entry, destination_course.branch, destination_structure['_id'])
 
     def update_course_index(self, updated_index_entry):
@@ -1231,7 +1445,12 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         Does not return anything useful.
         """
-        self.db_connection.update_course_index(updated_index_entry)
+        record = self._get_bulk_writes().get(updated_index_entry['_id'])
+        if record is None:
+            self.db_connection.update_course_index(updated_index_entry)
+        else:
+            record.index = updated_index_entry
+            record.index_dirty = True
 
     # TODO impl delete_all_versions
     def delete_item(self, usage_locator, user_id, delete_all_versions=False, delete_children=False, force=False):
@@ -1259,13 +1478,9 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         new_id = new_structure['_id']
         parents = self.get_parent_locations(usage_locator)
         for parent in parents:
-            encoded_block_id = LocMapperStore.encode_key_for_mongo(parent.block_id)
-            parent_block = new_blocks[encoded_block_id]
+            parent_block = self._get_block_for_update(new_structure, parent.block_id)
             parent_block['fields']['children'].remove(usage_locator.block_id)
-            parent_block['edit_info']['edited_on'] = datetime.datetime.now(UTC)
-            parent_block['edit_info']['edited_by'] = user_id
-            parent_block['edit_info']['previous_version'] = parent_block['edit_info']['update_version']
-            parent_block['edit_info']['update_version'] = new_id
+            self._update_edit_info(parent_block['edit_info'], user_id, new_id)
 
         def remove_subtree(block_id):
             """
@@ -1281,7 +1496,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             del new_blocks[LocMapperStore.encode_key_for_mongo(usage_locator.block_id)]
 
         # update index if appropriate and structures
-        self.db_connection.insert_structure(new_structure)
+        self._insert_structure(new_structure, usage_locator.package_id)
 
         result = CourseLocator(version_guid=new_id)
 
@@ -1317,38 +1532,62 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         return {}
 
-    def inherit_settings(self, block_map, block_json, inheriting_settings=None):
+    def get_inherited_settings(self, structure):
+        """
+        Get the inheritable settings which each block of structure inherits from its ancestors, as a dict
+        of encoded block id -> settings. This is computed once per structure version and edit time (see
+        _structure_index_key) and kept with its StructureIndex, so a structure updated in place gets its
+        inheritance recomputed. The settings dicts are shared between blocks (e.g., siblings get the same
+        dict); so, callers must not modify them.
+        """
+        index = self._get_structure_index(structure)
+        if index.inherited_settings is None:
+            inherited_settings = {}
+            if structure.get('root') is not None:
+                self._inherit_settings(
+                    structure['blocks'], LocMapperStore.encode_key_for_mongo(structure['root']), {},
+                    inherited_settings
+                )
+            index.inherited_settings = inherited_settings
+        return index.inherited_settings
+
+    def _inherit_settings(self, block_map, encoded_block_id, inheriting_settings, inherited_settings):
         """
-        Updates block_json with any inheritable setting set by an ancestor and recurses to children.
+        Record in inherited_settings the inheritable settings set by the ancestors of encoded_block_id and
+        recurse to its children.
         """
+        block_json = block_map.get(encoded_block_id)
         if block_json is None:
+            # here's where we need logic for looking up in other structures when we allow cross pointers
+            # but it's also getting this during course creation if creating top down w/ children set or
+            # migration where the old mongo published had pointers to privates
             return
 
-        if inheriting_settings is None:
-            inheriting_settings = {}
-
-        # the currently passed down values take precedence over any previously cached ones
+        # the currently passed down values take precedence over any from another parent
         # NOTE: this should show the values which all fields would have if inherited: i.e.,
         # not set to the locally defined value but to value set by nearest ancestor who sets it
-        # ALSO NOTE: no xblock should ever define a _inherited_settings field as it will collide w/ this logic.
-        block_json.setdefault('_inherited_settings', {}).update(inheriting_settings)
+        if encoded_block_id in inherited_settings:
+            settings = inherited_settings[encoded_block_id].copy()
+            settings.update(inheriting_settings)
+        else:
+            settings = inheriting_settings
+        inherited_settings[encoded_block_id] = settings
 
-        # update the inheriting w/ what should pass to children
-        inheriting_settings = block_json['_inherited_settings'].copy()
+        # update the inheriting w/ what should pass to children, sharing the dict if this sets none
         block_fields = block_json['fields']
-        for field_name in inheritance.InheritanceMixin.fields:
-            if field_name in block_fields:
-                inheriting_settings[field_name] = block_fields[field_name]
+        local_settings = {
+            field_name: block_fields[field_name]
+            for field_name in inheritance.InheritanceMixin.fields
+            if field_name in block_fields
+        }
+        if local_settings:
+            settings = settings.copy()
+            settings.update(local_settings)
 
         for child in block_fields.get('children', []):
-            try:
-                child = LocMapperStore.encode_key_for_mongo(child)
-                self.inherit_settings(block_map, block_map[child], inheriting_settings)
-            except KeyError:
-                # here's where we need logic for looking up in other structures when we allow cross pointers
-                # but it's also getting this during course creation if creating top down w/ children set or
-                # migration where the old mongo published had pointers to privates
-                pass
+            self._inherit_settings(
+                block_map, LocMapperStore.encode_key_for_mongo(child), settings, inherited_settings
+            )
 
     def descendants(self, block_map, block_id, depth, descendent_map):
         """
@@ -1409,7 +1648,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                     block_id for block_id in block['fields']["children"]
                     if LocMapperStore.encode_key_for_mongo(block_id) in original_structure['blocks']
                 ]
-        self.db_connection.update_structure(original_structure)
+        self._update_structure(original_structure, course_locator.package_id)
         # clear cache again b/c inheritance may be wrong over orphans
         self._clear_cache(original_structure['_id'])
 
@@ -1466,7 +1705,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             else:
                 return None
         else:
-            index_entry = self.db_connection.get_course_index(locator.package_id)
+            index_entry = self._get_course_index(locator.package_id)
             is_head = (
                 locator.version_guid is None or
                 index_entry['versions'][locator.branch] == locator.version_guid
@@ -1482,10 +1721,26 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
     def _version_structure(self, structure, user_id):
         """
         Copy the structure and update the history info (edited_by, edited_on, previous_version)
+
+        The copy has its own blocks dict, but shares the blocks themselves with structure, so
+        adding, replacing, and deleting blocks is safe, but blocks must be gotten via
+        _get_block_for_update before being modified in place.
+        In a bulk write, a structure created by the same bulk write is revised rather than copied.
         :param structure:
         :param user_id:
         """
-        new_structure = copy.deepcopy(structure)
+        record = self._get_bulk_write_for_version(structure['_id'])
+        if record is not None and record.owns(structure['_id']):
+            # structure is the bulk write's own pending version (see _get_structure)
+            structure['edited_by'] = user_id
+            structure['edited_on'] = datetime.datetime.now(UTC)
+            return structure
+
+        if isinstance(structure['blocks'], CopyOnWriteBlocks):
+            # the blocks it already copied are about to be shared with the new version too
+            structure['blocks'].shared = set(structure['blocks'])
+        new_structure = copy.copy(structure)
+        new_structure['blocks'] = CopyOnWriteBlocks(structure['blocks'])
         new_structure['_id'] = ObjectId()
         new_structure['previous_version'] = structure['_id']
         new_structure['edited_by'] = user_id
@@ -1493,6 +1748,20 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         new_structure['schema_version'] = self.SCHEMA_VERSION
         return new_structure
 
+    def _update_edit_info(self, edit_info, user_id, new_id):
+        """
+        Record in a block's edit_info that user_id changed it in the structure version new_id.
+
+        If the block already changed in new_id (a structure revised more than once in a bulk write),
+        previous_version is left pointing at the version before that, as a block's previous_version
+        must never be its own update_version.
+        """
+        edit_info['edited_on'] = datetime.datetime.now(UTC)
+        edit_info['edited_by'] = user_id
+        if edit_info.get('update_version') != new_id:
+            edit_info['previous_version'] = edit_info.get('update_version')
+            edit_info['update_version'] = new_id
+
     def _find_local_root(self, element_to_find, possibility, tree):
         if possibility not in tree:
             return False
@@ -1513,7 +1782,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param new_id:
         """
         index_entry['versions'][branch] = new_id
-        self.db_connection.update_course_index(index_entry)
+        self.update_course_index(index_entry)
 
     def _filter_special_fields(self, fields):
         """
@@ -1560,13 +1829,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         Given a structure, find all of block_id's parents in that structure. Note returns
         the encoded format for parent
         """
-        items = []
-        for parent_id, value in structure['blocks'].iteritems():
-            for child_id in value['fields'].get('children', []):
-                if block_id == child_id:
-                    items.append(parent_id)
-
-        return items
+        return list(self._get_structure_index(structure).get_parents(block_id))
 
     def _sync_children(self, source_parent, destination_parent, new_child):
         """
@@ -1633,15 +1896,20 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         fields['children'] = [child for child in fields.get('children', []) if child not in blacklist]
         return fields
 
-    def _delete_if_true_orphan(self, orphan, structure):
+    def _delete_if_true_orphan(self, orphan, structure, index):
         """
         Delete the orphan and any of its descendants which no longer have parents.
+        :param index: a StructureIndex of the structure, which this keeps up to date with the deletions
         """
-        if not self._get_parents_from_structure(orphan, structure):
+        if not index.get_parents(orphan):
             encoded_block_id = LocMapperStore.encode_key_for_mongo(orphan)
-            for child in structure['blocks'][encoded_block_id]['fields'].get('children', []):
-                self._delete_if_true_orphan(child, structure)
+            children = structure['blocks'][encoded_block_id]['fields'].get('children', [])
+            for child in children:
+                self._delete_if_true_orphan(child, structure, index)
             del structure['blocks'][encoded_block_id]
+            for child in children:
+                if encoded_block_id in index.get_parents(child):
+                    index.get_parents(child).remove(encoded_block_id)
 
     def _new_block(self, user_id, category, block_fields, definition_id, new_id):
         return {
@@ -1670,6 +1938,18 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         structure['blocks'][LocMapperStore.encode_key_for_mongo(block_id)] = content
 
+    def _get_block_for_update(self, structure, block_id):
+        """
+        Get the block from a structure made by _version_structure so that it can be modified in place,
+        copying it first if it's still shared with the previous version.
+        """
+        encoded_block_id = LocMapperStore.encode_key_for_mongo(block_id)
+        blocks = structure['blocks']
+        if isinstance(blocks, CopyOnWriteBlocks) and encoded_block_id in blocks.shared:
+            blocks.shared.remove(encoded_block_id)
+            blocks[encoded_block_id] = copy.deepcopy(blocks[encoded_block_id])
+        return blocks[encoded_block_id]
+
     def get_courses_for_wiki(self, wiki_slug):
         """
         Return the list of courses which use this wiki_slug
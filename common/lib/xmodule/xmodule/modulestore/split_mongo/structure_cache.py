@@ -0,0 +1,105 @@
+"""
+A cache of split structures, keyed by their version guid (the structure's _id).
+"""
+from collections import OrderedDict
+import cPickle as pickle
+import threading
+import time
+
+
+class StructureCache(object):
+    """
+    Caches structures in two tiers: a least recently used cache in this
+    process holding at most `max_bytes` of pickled structures, in front of
+    an optional cache shared between processes (e.g. memcached), which needs
+    `get`, `set` and `delete` methods like django's caches.
+
+    Structures are stored pickled, and every `get` returns a fresh copy, since
+    callers (e.g. inheritance computation) modify the structures they load.
+
+    Structures are not changed once a new version of them is created, so entries
+    rarely need to be invalidated, except by the few operations which
+    update a structure in place (see `delete`). Since those can only clear the
+    shared cache and this process's, entries cached in this process are only
+    used for `local_timeout` seconds before being read again from the shared cache.
+    """
+    def __init__(self, max_bytes, shared_cache=None, local_timeout=60):
+        self.max_bytes = max_bytes
+        self.shared_cache = shared_cache
+        self.local_timeout = local_timeout
+        # version guid -> (expiration time, pickled structure), least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _shared_key(version_guid):
+        """
+        Return the key for version_guid in the shared cache
+        """
+        return u"split_structure.{}".format(version_guid)
+
+    def get(self, version_guid):
+        """
+        Return a copy of the structure with _id `version_guid`, or None if it isn't cached
+        """
+        pickled = None
+        with self._lock:
+            entry = self._entries.pop(version_guid, None)
+            if entry is not None:
+                expires, pickled = entry
+                if expires > time.time():
+                    # move it to the most recently used end
+                    self._entries[version_guid] = entry
+                else:
+                    self._size -= len(pickled)
+                    pickled = None
+
+        if pickled is None and self.shared_cache is not None:
+            pickled = self.shared_cache.get(self._shared_key(version_guid))
+            if pickled is not None:
+                self._set_local(version_guid, pickled)
+
+        if pickled is None:
+            return None
+        return pickle.loads(pickled)
+
+    def set(self, structure):
+        """
+        Cache a copy of `structure`
+        """
+        pickled = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
+        self._set_local(structure['_id'], pickled)
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._shared_key(structure['_id']), pickled)
+
+    def _set_local(self, version_guid, pickled):
+        """
+        Cache the pickled structure in this process, evicting the least recently
+        used structures to stay within max_bytes
+        """
+        if len(pickled) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(version_guid, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[version_guid] = (time.time() + self.local_timeout, pickled)
+            self._size += len(pickled)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def delete(self, version_guid):
+        """
+        Remove the structure with _id `version_guid` after it was updated in place.
+
+        Only this process and the shared cache are cleared, so other processes
+        may keep using their copy for up to `local_timeout` seconds.
+        """
+        with self._lock:
+            previous = self._entries.pop(version_guid, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self._shared_key(version_guid))
@@ -0,0 +1,61 @@
+"""
+In memory indexes of the blocks of a split structure, so that common get_items and parent
+queries don't have to scan every block.
+"""
+from collections import defaultdict
+
+
+class StructureIndex(object):
+    """
+    Maps the blocks of one structure by category, by definition, and by child. All the
+    values are lists of the encoded block ids which are the keys of structure['blocks'].
+
+    An index is only valid for the blocks it was built from; so, it must not be kept for a
+    structure which is then modified.
+    """
+    def __init__(self, blocks):
+        """
+        :param blocks: the structure's blocks dict
+        """
+        self.by_category = defaultdict(list)
+        self.by_definition = defaultdict(list)
+        # child block_id (as it appears in the children field) -> its parents
+        self.parents = defaultdict(list)
+        # encoded block id -> inherited settings, computed on demand by SplitMongoModuleStore.get_inherited_settings
+        self.inherited_settings = None
+        for encoded_block_id, block in blocks.iteritems():
+            self.by_category[block['category']].append(encoded_block_id)
+            self.by_definition[block['definition']].append(encoded_block_id)
+            for child in block['fields'].get('children', []):
+                self.parents[child].append(encoded_block_id)
+
+    def get_parents(self, block_id):
+        """
+        Return the encoded ids of the parents of block_id
+        """
+        return self.parents.get(block_id, [])
+
+    def candidates(self, qualifiers):
+        """
+        Return the encoded ids of the blocks which may match the get_items qualifiers, narrowed
+        down by the category, definition, and fields.children qualifiers if they have plain
+        values, or None if none of them do. The candidates still need to be checked against
+        all the qualifiers.
+        """
+        lookups = [
+            (self.by_category, qualifiers.get('category')),
+            (self.by_definition, qualifiers.get('definition')),
+        ]
+        fields = qualifiers.get('fields')
+        if isinstance(fields, dict):
+            lookups.append((self.parents, fields.get('children')))
+
+        candidates = None
+        for index, value in lookups:
+            if value is None or isinstance(value, (dict, list)):
+                continue
+            if candidates is None:
+                candidates = set(index.get(value, []))
+            else:
+                candidates.intersection_update(index.get(value, []))
+        return candidates
@@ -220,6 +220,7 @@ class ModuleStoreTestCase(TestCase):
         if hasattr(store, 'collection'):
             connection = store.collection.database.connection
             store.collection.drop()
+            store.course_summaries.drop()
             connection.close()
         elif hasattr(store, 'close_all_connections'):
             store.close_all_connections()
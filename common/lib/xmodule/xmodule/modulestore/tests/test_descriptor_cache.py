@@ -0,0 +1,51 @@
+"""
+Tests for the process-local descriptor cache
+"""
+from mock import patch
+from unittest import TestCase
+
+from xmodule.modulestore.descriptor_cache import DescriptorCache
+
+
+class TestDescriptorCache(TestCase):
+    """
+    Tests for DescriptorCache
+    """
+    def setUp(self):
+        self.cache = DescriptorCache(max_bytes=20, timeout=60)
+
+    def test_version_mismatch(self):
+        self.cache.set('org/course/run', 'key', 'v1', 'descriptor', 10)
+        self.assertEqual(self.cache.get('org/course/run', 'key', 'v1'), 'descriptor')
+        self.assertIsNone(self.cache.get('org/course/run', 'key', 'v2'))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('org/course/run', 'a', 'v1', 'a', 8)
+        self.cache.set('org/course/run', 'b', 'v1', 'b', 8)
+        self.cache.get('org/course/run', 'a', 'v1')
+        self.cache.set('org/course/run', 'c', 'v1', 'c', 8)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.size, 16)
+        self.assertIsNone(self.cache.get('org/course/run', 'b', 'v1'))
+        self.assertEqual(self.cache.get('org/course/run', 'a', 'v1'), 'a')
+
+    def test_too_large(self):
+        self.cache.set('org/course/run', 'a', 'v1', 'a', 8)
+        self.cache.set('org/course/run', 'b', 'v1', 'b', 21)
+        self.assertIsNone(self.cache.get('org/course/run', 'b', 'v1'))
+        self.assertEqual(self.cache.get('org/course/run', 'a', 'v1'), 'a')
+        self.assertEqual(self.cache.size, 8)
+
+    def test_timeout(self):
+        with patch('xmodule.modulestore.descriptor_cache.time.time', return_value=1000):
+            self.cache.set('org/course/run', 'key', 'v1', 'descriptor', 10)
+        with patch('xmodule.modulestore.descriptor_cache.time.time', return_value=1061):
+            self.assertIsNone(self.cache.get('org/course/run', 'key', 'v1'))
+
+    def test_invalidate_course(self):
+        self.cache.set('org/course/run', 'key', 'v1', 'descriptor', 10)
+        self.cache.set('org/other/run', 'key', 'v1', 'other', 5)
+        self.cache.invalidate_course('org/course')
+        self.assertIsNone(self.cache.get('org/course/run', 'key', 'v1'))
+        self.assertEqual(self.cache.get('org/other/run', 'key', 'v1'), 'other')
+        self.assertEqual(self.cache.size, 5)
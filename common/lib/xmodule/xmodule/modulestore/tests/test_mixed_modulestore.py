@@ -17,6 +17,7 @@ from django.conf import settings
 if not settings.configured:
     settings.configure()
 from xmodule.modulestore.mixed import MixedModuleStore
+from xmodule.modulestore.django import modulestore_update_signal
 
 
 @ddt.ddt
@@ -205,6 +206,37 @@ class TestMixedModuleStore(LocMapperSetupSansDjango):
         with self.assertRaises(ItemNotFoundError):
             self.store.get_instance(self.MONGO_COURSEID, self.fake_location)
 
+    def test_descriptor_cache(self):
+        """
+        The data of published mongo courses should be reused until they're written to, but
+        every call should get its own descriptor. xml courses aren't cached.
+        """
+        self.options = dict(self.OPTIONS, descriptor_cache_bytes=1024 * 1024)
+        self.initdb('direct')
+        course = self.store.get_course(self.MONGO_COURSEID)
+        mongo_store = self.store._get_modulestore_for_courseid(self.MONGO_COURSEID)  # pylint: disable=protected-access
+        with patch.object(mongo_store, 'collection') as mock_collection:
+            cached_course = self.store.get_course(self.MONGO_COURSEID)
+            self.assertFalse(mock_collection.find_one.called)
+        self.assertIsNot(course, cached_course)
+        self.assertEqual(course.location, cached_course.location)
+        self.assertEqual(course.display_name, cached_course.display_name)
+
+        chapter = self.store.get_instance(self.MONGO_COURSEID, self.import_chapter_location)
+        cached_chapter = self.store.get_instance(self.MONGO_COURSEID, self.import_chapter_location)
+        self.assertIsNot(chapter, cached_chapter)
+        self.assertEqual(chapter.location, cached_chapter.location)
+        self.assertTrue(0 < self.store.descriptor_cache.size <= 1024 * 1024)
+
+        self.store.get_course(self.XML_COURSEID1)
+        self.assertEqual(len(self.store.descriptor_cache), 2)
+
+        modulestore_update_signal.send(
+            self, modulestore=None, course_id='MITx/999', location=self.import_chapter_location
+        )
+        self.assertEqual(len(self.store.descriptor_cache), 0)
+        self.assertIsNot(course, self.store.get_course(self.MONGO_COURSEID))
+
     @ddt.data('direct', 'split')
     def test_get_items(self, default_ms):
         self.initdb(default_ms)
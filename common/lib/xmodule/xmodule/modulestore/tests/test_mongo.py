@@ -1,11 +1,15 @@
 from pprint import pprint
 # pylint: disable=E0611
 from nose.tools import assert_equals, assert_raises, \
-    assert_not_equals, assert_false
+    assert_not_equals, assert_false, assert_true
 from itertools import ifilter
 # pylint: enable=E0611
+import pickle
 import pymongo
 import logging
+from mock import patch
+from path import path
+from tempfile import mkdtemp
 from uuid import uuid4
 
 from xblock.fields import Scope
@@ -15,6 +19,8 @@ from xblock.exceptions import InvalidScopeError
 from xmodule.tests import DATA_DIR
 from xmodule.modulestore import Location, MONGO_MODULESTORE_TYPE
 from xmodule.modulestore.mongo import MongoModuleStore, MongoKeyValueStore
+from xmodule.modulestore.mongo.base import metadata_cache_key, InheritanceTree
+from xmodule.modulestore.mongo.definition_lazy_loader import DefinitionLazyLoader
 from xmodule.modulestore.draft import DraftModuleStore
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
 from xmodule.contentstore.mongo import MongoContentStore
@@ -35,6 +41,26 @@ DEFAULT_CLASS = 'xmodule.raw_module.RawDescriptor'
 RENDER_TEMPLATE = lambda t_n, d, ctx = None, nsp = 'main': ''
 
 
+class DictCache(dict):
+    """A minimal stand-in for a django cache, backed by a dict, which records timeouts."""
+    def __init__(self, *args, **kwargs):
+        super(DictCache, self).__init__(*args, **kwargs)
+        self.timeouts = {}
+
+    def set(self, key, value, timeout=None):
+        self[key] = value
+        self.timeouts[key] = timeout
+
+    def add(self, key, value, timeout=None):
+        if key in self:
+            return False
+        self.set(key, value, timeout)
+        return True
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
 class TestMongoModuleStore(object):
     '''Tests!'''
     # Explicitly list the courses to load (don't want the big one)
@@ -274,6 +300,180 @@ class TestMongoModuleStore(object):
             {'displayname': 'hello'}
         )
 
+    def test_update_cached_metadata_inheritance_tree(self):
+        """
+        Updating the subtree of one block in the cached metadata inheritance
+        tree should give the same tree as recomputing all of it.
+        """
+        course_location = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        full_tree = self.store.compute_metadata_inheritance_tree(course_location)
+
+        # Start from a cached tree that is out of date for the Overview chapter
+        # and everything below it.
+        chapter_location = Location('i4x', 'edX', 'toy', 'chapter', 'Overview')
+        stale_tree = InheritanceTree({url: {} for url in full_tree})
+        cache_subsystem = DictCache({metadata_cache_key(course_location): stale_tree})
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=cache_subsystem,
+        )
+        store.update_cached_metadata_inheritance_tree(chapter_location)
+
+        updated_tree = cache_subsystem.get(metadata_cache_key(course_location))
+        to_visit = [self.store.get_item(chapter_location, depth=None)]
+        while to_visit:
+            descriptor = to_visit.pop()
+            assert_equals(full_tree[descriptor.location.url()], updated_tree[descriptor.location.url()])
+            to_visit.extend(descriptor.get_children())
+        # The stale tree in the cache shouldn't have been modified in place
+        assert_equals({}, stale_tree[chapter_location.url()])
+        # Updating the tree doesn't postpone its expiry, and releases the lock
+        assert_true(0 < cache_subsystem.timeouts[metadata_cache_key(course_location)] <= 60 * 60)
+        assert_equals([metadata_cache_key(course_location)], cache_subsystem.keys())
+
+    def test_update_locked_metadata_inheritance_tree(self):
+        """
+        If another process is updating the cached metadata inheritance tree,
+        the tree should be dropped, without waiting, rather than lose either update.
+        """
+        course_location = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        key = metadata_cache_key(course_location)
+        cache_subsystem = DictCache({
+            key: self.store.compute_metadata_inheritance_tree(course_location),
+            key + u'/update_lock': 'another process',
+        })
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=cache_subsystem,
+        )
+        store.update_cached_metadata_inheritance_tree(Location('i4x', 'edX', 'toy', 'chapter', 'Overview'))
+        assert_false(key in cache_subsystem)
+        # nor should the other process store its tree
+        assert_false(key + u'/update_lock' in cache_subsystem)
+
+    def test_inheritance_tree_is_compact(self):
+        """
+        Identical inherited metadata should be stored only once, and survive pickling
+        """
+        course_location = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        tree = self.store.compute_metadata_inheritance_tree(course_location)
+        distinct = []
+        for _, metadata in tree.iteritems():
+            if metadata not in distinct:
+                distinct.append(metadata)
+        assert_equals(len(distinct), len(tree._metadata))  # pylint: disable=protected-access
+        assert_true(len(distinct) < len(tree))
+
+        unpickled = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        assert_equals(tree, unpickled)
+        # new entries are still interned after unpickling
+        _, metadata = next(unpickled.iteritems())
+        unpickled['i4x://edX/toy/html/new_block'] = dict(metadata)
+        assert_equals(len(distinct), len(unpickled._metadata))  # pylint: disable=protected-access
+
+    def test_inheritance_tree_drops_replaced_metadata(self):
+        """
+        Metadata dicts that no block inherits any more shouldn't be pickled
+        """
+        tree = InheritanceTree({'i4x://edX/toy/html/block': {'graded': True}})
+        tree['i4x://edX/toy/html/block'] = {'graded': False}
+        assert_equals(2, len(tree._metadata))  # pylint: disable=protected-access
+
+        unpickled = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        assert_equals(tree, unpickled)
+        assert_equals([{'graded': False}], unpickled._metadata)  # pylint: disable=protected-access
+
+    def test_descendents_load_definitions_lazily(self):
+        """
+        Prefetched descendents should be loaded without their definition data,
+        which is fetched for all of them the first time it's needed.
+        """
+        course = self.store.get_item(Location('i4x', 'edX', 'toy', 'course', '2012_Fall'), depth=None)
+        module_data = course.runtime.module_data
+        html_location = Location('i4x', 'edX', 'toy', 'html', 'toyhtml')
+        descendent_locations = [loc for loc in module_data if loc != course.location]
+        for location in descendent_locations:
+            assert_true(isinstance(module_data[location]['definition']['data'], DefinitionLazyLoader))
+
+        html = course.runtime.load_item(html_location)
+        assert_equals(self.store.get_item(html_location).data, html.data)
+        for location in descendent_locations:
+            assert_false(isinstance(module_data[location]['definition']['data'], DefinitionLazyLoader))
+
+    def test_incremental_import(self):
+        """
+        Re-importing an unchanged course incrementally shouldn't write anything
+        """
+        with patch.object(self.store, 'update_item') as update_item:
+            with patch.object(self.store, 'delete_item') as delete_item:
+                import_from_xml(
+                    self.store, DATA_DIR, ['test_import_course'], static_content_store=self.content_store,
+                    do_import_static=False, incremental=True
+                )
+        assert_false(update_item.called)
+        assert_false(delete_item.called)
+
+    def _import_changed_course(self, changes):
+        """
+        Incrementally import a copy of test_import_course with `changes`, a dict of path within
+        the course -> (old text, new text), without writing to the store. Return the mocked
+        update_item and delete_item.
+        """
+        data_dir = path(mkdtemp())
+        try:
+            (DATA_DIR / 'test_import_course').copytree(data_dir / 'test_import_course')
+            for filename, (old, new) in changes.iteritems():
+                changed_file = data_dir / 'test_import_course' / filename
+                changed_file.write_text(changed_file.text().replace(old, new))
+            with patch.object(self.store, 'update_item') as update_item:
+                with patch.object(self.store, 'delete_item') as delete_item:
+                    import_from_xml(
+                        self.store, data_dir, ['test_import_course'], static_content_store=self.content_store,
+                        do_import_static=False, incremental=True
+                    )
+        finally:
+            data_dir.rmtree()
+        return update_item, delete_item
+
+    def test_incremental_import_changed_module(self):
+        """
+        Only a changed module is written
+        """
+        update_item, delete_item = self._import_changed_course({
+            'video/separate_file_video.xml': ('display_name="default"', 'display_name="changed"'),
+        })
+        assert_equals(
+            [call[0][0].location.name for call in update_item.call_args_list],
+            ['separate_file_video']
+        )
+        assert_false(delete_item.called)
+
+    def test_incremental_import_removed_module(self):
+        """
+        A module which was removed from the course is deleted, and its parent written
+        """
+        update_item, delete_item = self._import_changed_course({
+            'vertical/vertical_test.xml': ('<video url_name="separate_file_video"/>', ''),
+        })
+        assert_equals(
+            [call[0][0].location.name for call in update_item.call_args_list],
+            ['vertical_test']
+        )
+        delete_item.assert_called_once_with(
+            Location('i4x', 'edX', 'test_import_course', 'video', 'separate_file_video')
+        )
+
+    def test_incremental_import_load_error(self):
+        """
+        Nothing is deleted when a module fails to load
+        """
+        _, delete_item = self._import_changed_course({
+            'video/separate_file_video.xml': ('<video', '<video <'),
+        })
+        assert_false(delete_item.called)
+
     def test_get_courses_for_wiki(self):
         """
         Test the get_courses_for_wiki method
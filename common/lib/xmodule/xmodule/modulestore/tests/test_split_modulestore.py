@@ -1,10 +1,12 @@
 """
     Test split modulestore w/o using any django stuff.
 """
+import copy
 import datetime
 import unittest
 import uuid
 from importlib import import_module
+from mock import patch
 from path import path
 import re
 import random
@@ -18,7 +20,9 @@ from xmodule.modulestore.inheritance import InheritanceMixin
 from xmodule.x_module import XModuleMixin
 from xmodule.fields import Date, Timedelta
 from bson.objectid import ObjectId
+from pytz import UTC
 from xmodule.modulestore.split_mongo.split import SplitMongoModuleStore
+from xmodule.modulestore.split_mongo.structure_cache import StructureCache
 
 
 class SplitModuleTest(unittest.TestCase):
@@ -863,6 +867,68 @@ class SplitModuleItemTests(SplitModuleTest):
         parents = modulestore().get_parent_locations(locator)
         self.assertEqual(len(parents), 0)
 
+    def test_structure_index(self):
+        """
+        Test the indexes get_items and get_parent_locations use
+        """
+        locator = CourseLocator(package_id="testx.GreekHero", branch='draft')
+        structure = modulestore()._lookup_course(locator)['structure']
+        index = modulestore()._get_structure_index(structure)
+        self.assertIs(modulestore()._get_structure_index(modulestore()._lookup_course(locator)['structure']), index)
+        self.assertEqual(len(index.candidates({'category': 'chapter'})), 3)
+        self.assertEqual(index.candidates({'fields': {'children': 'chapter2'}}), {'head12345'})
+        self.assertEqual(index.candidates({'category': 'problem', 'fields': {'children': 'chapter2'}}), set())
+        self.assertIsNone(index.candidates({'fields': {'display_name': {'$regex': 'Hera'}}}))
+        self.assertEqual(index.get_parents('chapter1'), ['head12345'])
+
+    def test_structure_index_after_update_in_place(self):
+        """
+        Test that an index isn't used for a structure which another process changed in place
+        """
+        locator = CourseLocator(package_id="testx.GreekHero", branch='draft')
+        structure = modulestore()._lookup_course(locator)['structure']
+        self.assertEqual(len(modulestore()._get_structure_index(structure).candidates({'category': 'chapter'})), 3)
+
+        # another process adds a chapter in place, which doesn't drop this process's index
+        structure['blocks']['chapter4'] = copy.deepcopy(structure['blocks']['chapter1'])
+        structure['blocks']['head12345']['fields']['children'].append('chapter4')
+        structure['edited_on'] = datetime.datetime.now(UTC)
+        modulestore().db_connection.update_structure(structure)
+
+        structure = modulestore()._lookup_course(locator)['structure']
+        index = modulestore()._get_structure_index(structure)
+        self.assertEqual(len(index.candidates({'category': 'chapter'})), 4)
+        self.assertEqual(index.get_parents('chapter4'), ['head12345'])
+
+    def test_inherited_settings(self):
+        """
+        Test that inheritance is computed once per structure version and shared between siblings
+        """
+        locator = CourseLocator(package_id="testx.GreekHero", branch='draft')
+        inherited_settings = modulestore().get_inherited_settings(modulestore()._lookup_course(locator)['structure'])
+        self.assertIs(
+            modulestore().get_inherited_settings(modulestore()._lookup_course(locator)['structure']),
+            inherited_settings
+        )
+        self.assertEqual(inherited_settings['head12345'], {})
+        self.assertIs(inherited_settings['chapter1'], inherited_settings['chapter2'])
+
+    def test_inherited_settings_after_update_in_place(self):
+        """
+        Test that blocks which another process added to a structure in place get inherited settings
+        """
+        locator = CourseLocator(package_id="testx.GreekHero", branch='draft')
+        structure = modulestore()._lookup_course(locator)['structure']
+        self.assertNotIn('chapter4', modulestore().get_inherited_settings(structure))
+
+        structure['blocks']['chapter4'] = copy.deepcopy(structure['blocks']['chapter1'])
+        structure['blocks']['head12345']['fields']['children'].append('chapter4')
+        structure['edited_on'] = datetime.datetime.now(UTC)
+        modulestore().db_connection.update_structure(structure)
+
+        inherited_settings = modulestore().get_inherited_settings(modulestore()._lookup_course(locator)['structure'])
+        self.assertIs(inherited_settings['chapter4'], inherited_settings['chapter1'])
+
     def test_get_children(self):
         """
         Test the existing get_children method on xdescriptors
@@ -1111,6 +1177,92 @@ class TestItemCrud(SplitModuleTest):
         self.assertEqual(refetch_course.previous_version, course_block_update_version)
         self.assertEqual(refetch_course.update_version, transaction_guid)
 
+    def test_bulk_write_operations(self):
+        """
+        Test that writes in a bulk write make one new version, saved when it exits
+        """
+        user = random.getrandbits(32)
+        new_course = modulestore().create_course('test_org.test_bulk', 'test_org', user)
+        original_version = new_course.location.version_guid
+        versionless_course_locator = CourseLocator(package_id='test_org.test_bulk', branch='draft')
+
+        with modulestore().bulk_write_operations('test_org.test_bulk'):
+            chapter = modulestore().create_item(
+                versionless_course_locator, 'chapter', user, fields={'display_name': 'chapter 1'}
+            )
+            chapter_locator = BlockUsageLocator(versionless_course_locator, block_id=chapter.location.block_id)
+            problem = modulestore().create_item(chapter_locator, 'problem', user)
+            chapter.display_name = 'chapter one'
+            chapter.save()
+            chapter = modulestore().update_item(chapter, user)
+            self.assertEqual(problem.location.version_guid, chapter.location.version_guid)
+            # visible in this thread but not saved
+            self.assertIn(problem.location.block_id, modulestore().get_item(chapter_locator).children)
+            self.assertEqual(
+                modulestore().db_connection.get_course_index('test_org.test_bulk')['versions']['draft'],
+                original_version
+            )
+            self.assertIsNone(modulestore().db_connection.get_structure(chapter.location.version_guid))
+
+        index = modulestore().db_connection.get_course_index('test_org.test_bulk')
+        self.assertEqual(index['versions']['draft'], chapter.location.version_guid)
+        history_info = modulestore().get_course_history_info(versionless_course_locator)
+        self.assertEqual(history_info['previous_version'], original_version)
+        self.assertEqual(modulestore().get_item(chapter_locator).display_name, 'chapter one')
+
+    def test_bulk_write_without_copying_structures(self):
+        """
+        Test that the writes in a bulk write revise the pending structure rather than copying it each time
+        """
+        user = random.getrandbits(32)
+        modulestore().create_course('test_org.test_bulk_copies', 'test_org', user)
+        course_locator = CourseLocator(package_id='test_org.test_bulk_copies', branch='draft')
+
+        with patch('xmodule.modulestore.split_mongo.split.copy.deepcopy', wraps=copy.deepcopy) as mock_deepcopy:
+            with modulestore().bulk_write_operations('test_org.test_bulk_copies'):
+                for number in range(10):
+                    chapter = modulestore().create_item(
+                        course_locator, 'chapter', user, fields={'display_name': 'chapter {}'.format(number)}
+                    )
+                    chapter.display_name = 'chapter {} changed'.format(number)
+                    chapter.save()
+                    modulestore().update_item(chapter, user)
+        structure_copies = [
+            call for call in mock_deepcopy.call_args_list
+            if isinstance(call[0][0], dict) and 'blocks' in call[0][0]
+        ]
+        self.assertEqual(structure_copies, [])
+        self.assertEqual(len(modulestore().get_course(course_locator).children), 10)
+
+    def test_bulk_write_same_block_twice(self):
+        """
+        Test that a block changed twice in a bulk write points back to the version before the bulk write
+        """
+        user = random.getrandbits(32)
+        new_course = modulestore().create_course('test_org.test_bulk_twice', 'test_org', user)
+        original_version = new_course.location.version_guid
+        course_locator = BlockUsageLocator(
+            package_id='test_org.test_bulk_twice', block_id=new_course.location.block_id, branch='draft'
+        )
+
+        with modulestore().bulk_write_operations('test_org.test_bulk_twice'):
+            for display_name in ['first', 'second']:
+                course = modulestore().get_item(course_locator)
+                course.display_name = display_name
+                course.save()
+                course = modulestore().update_item(course, user)
+
+        new_version = course.location.version_guid
+        self.assertNotEqual(new_version, original_version)
+        structure = modulestore().db_connection.get_structure(new_version)
+        edit_info = structure['blocks'][course_locator.block_id]['edit_info']
+        self.assertEqual(edit_info['update_version'], new_version)
+        self.assertEqual(edit_info['previous_version'], original_version)
+
+        generations = modulestore().get_block_generations(course.location)
+        self.assertEqual(generations.locator.version_guid, original_version)
+        self.assertEqual([child.locator.version_guid for child in generations.children], [new_version])
+
     def test_update_metadata(self):
         """
         test updating an items metadata ensuring the definition doesn't version but the course does if it should
@@ -1145,6 +1297,26 @@ class TestItemCrud(SplitModuleTest):
         self.assertEqual(history_info['previous_version'], pre_version_guid)
         self.assertEqual(history_info['edited_by'], "**replace_user**")
 
+    def test_version_structure_copy_on_write(self):
+        """
+        test that versioning a structure only copies the blocks which get modified
+        """
+        locator = CourseLocator(package_id="testx.GreekHero", branch='draft')
+        structure = modulestore()._lookup_course(locator)['structure']
+        new_structure = modulestore()._version_structure(structure, '**replace_user**')
+        self.assertEqual(new_structure['previous_version'], structure['_id'])
+        self.assertNotEqual(new_structure['_id'], structure['_id'])
+
+        block = modulestore()._get_block_for_update(new_structure, 'problem3_2')
+        block['fields']['max_attempts'] = 4
+        original_block = modulestore()._get_block_from_structure(structure, 'problem3_2')
+        self.assertNotEqual(original_block['fields'].get('max_attempts'), 4)
+        self.assertIs(modulestore()._get_block_for_update(new_structure, 'problem3_2'), block)
+        self.assertIs(
+            modulestore()._get_block_from_structure(new_structure, 'chapter1'),
+            modulestore()._get_block_from_structure(structure, 'chapter1')
+        )
+
     def test_update_children(self):
         """
         test updating an item's children ensuring the definition doesn't version but the course does if it should
@@ -1647,6 +1819,66 @@ class TestSchema(SplitModuleTest):
                 "{0.name} has records with wrong schema_version".format(collection)
             )
 
+
+class TestStructureCache(unittest.TestCase):
+    """
+    Test the cache of structures by version guid
+    """
+    def test_get_returns_copies(self):
+        cache = StructureCache(1024 * 1024)
+        structure = {'_id': ObjectId(), 'blocks': {'head': {'fields': {}}}}
+        cache.set(structure)
+        cached = cache.get(structure['_id'])
+        self.assertEqual(cached, structure)
+        cached['blocks']['head']['fields']['changed'] = True
+        self.assertEqual(cache.get(structure['_id']), structure)
+
+    def test_size_bounded(self):
+        structures = [{'_id': ObjectId(), 'data': 'x' * 1000} for _ in range(3)]
+        cache = StructureCache(2500)
+        for structure in structures:
+            cache.set(structure)
+        self.assertIsNone(cache.get(structures[0]['_id']))
+        self.assertEqual(cache.get(structures[2]['_id']), structures[2])
+
+    def test_shared_cache(self):
+        shared = DictCache()
+        structure = {'_id': ObjectId(), 'blocks': {}}
+        StructureCache(1024 * 1024, shared).set(structure)
+        # another process finds it in the shared cache
+        self.assertEqual(StructureCache(1024 * 1024, shared).get(structure['_id']), structure)
+
+        StructureCache(1024 * 1024, shared).delete(structure['_id'])
+        self.assertIsNone(StructureCache(1024 * 1024, shared).get(structure['_id']))
+
+    def test_local_timeout(self):
+        shared = DictCache()
+        structure = {'_id': ObjectId(), 'blocks': {}}
+        cache = StructureCache(1024 * 1024, shared, local_timeout=0)
+        cache.set(structure)
+        # another process updates the structure in place
+        StructureCache(1024 * 1024, shared).delete(structure['_id'])
+        # so once this process's copy expires, it isn't used anymore
+        self.assertIsNone(cache.get(structure['_id']))
+
+
+class DictCache(object):
+    """
+    A django-like cache over a dict, for testing
+    """
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache[key] = value
+
+    def delete(self, key):
+        self.cache.pop(key, None)
+
+
 #===========================================
 def modulestore():
     """
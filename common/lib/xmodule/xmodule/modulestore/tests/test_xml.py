@@ -3,6 +3,8 @@ Tests around our XML modulestore, including importing
 well-formed and not-well-formed XML.
 """
 import os.path
+import shutil
+import tempfile
 import unittest
 from glob import glob
 from mock import patch
@@ -101,3 +103,28 @@ class TestXMLModuleStore(unittest.TestCase):
         self.assertEqual(len(course_locations), 2)
         for course_number in ['toy', 'simple']:
             self.assertIn(Location('i4x', 'edX', course_number, 'course', '2012_Fall'), course_locations)
+
+    def test_parallel_load_and_parse_cache(self):
+        """
+        Loading courses in worker processes, or from the parse cache, gives the same courses
+        """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        serial_store = XMLModuleStore(DATA_DIR, course_dirs=['toy', 'simple'])
+
+        for _ in range(2):
+            # the first pass fills the parse cache and the second one loads from it
+            store = XMLModuleStore(DATA_DIR, course_dirs=['toy', 'simple'], load_workers=2, parse_cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertEqual(
+                sorted(course.id for course in store.get_courses()),
+                sorted(course.id for course in serial_store.get_courses())
+            )
+            for course_id, modules in serial_store.modules.iteritems():
+                self.assertEqual(set(store.modules[course_id]), set(modules))
+            toy_course = store.get_course('edX/toy/2012_Fall')
+            self.assertEqual(toy_course.display_name, serial_store.get_course('edX/toy/2012_Fall').display_name)
+            self.assertEqual(
+                [child.location for child in toy_course.get_children()],
+                [child.location for child in serial_store.get_course('edX/toy/2012_Fall').get_children()]
+            )
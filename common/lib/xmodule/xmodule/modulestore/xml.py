@@ -1,7 +1,9 @@
+import cPickle as pickle
 import hashlib
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
 import sys
@@ -347,13 +349,25 @@ class ParentTracker(object):
         return list(self._parents[child])
 
 
+def _load_course_state(store_kwargs, course_dir, course_ids):
+    """
+    Load course_dir in a new XMLModuleStore and return its XMLModuleStore.get_course_state.
+    A function, rather than a method, so that a multiprocessing pool can run it.
+    """
+    store = XMLModuleStore(course_dirs=[course_dir], course_ids=course_ids, **store_kwargs)
+    return store.get_course_state(course_dir)
+
+
 class XMLModuleStore(ModuleStoreReadBase):
     """
     An XML backed ModuleStore
     """
+    # change this whenever the course state format changes, to ignore older parse caches
+    COURSE_STATE_VERSION = 1
+
     def __init__(
         self, data_dir, default_class=None, course_dirs=None, course_ids=None,
-        load_error_modules=True, i18n_service=None, **kwargs
+        load_error_modules=True, i18n_service=None, load_workers=None, parse_cache_dir=None, **kwargs
     ):
         """
         Initialize an XMLModuleStore from data_dir
@@ -365,6 +379,12 @@ class XMLModuleStore(ModuleStoreReadBase):
 
         course_dirs or course_ids: If specified, the list of course_dirs or course_ids to load. Otherwise,
             load all courses. Note, providing both
+
+        load_workers: If specified, load the courses in a pool of this many processes rather
+            than one after another in this one
+
+        parse_cache_dir: If specified, a directory in which to keep the result of loading
+            each course, which is reused until any file in the course's directory changes
         """
         super(XMLModuleStore, self).__init__(**kwargs)
 
@@ -374,6 +394,15 @@ class XMLModuleStore(ModuleStoreReadBase):
         self.errored_courses = {}  # course_dir -> errorlog, for dirs that failed to load
 
         self.load_error_modules = load_error_modules
+        self.parse_cache_dir = path(parse_cache_dir) if parse_cache_dir else None
+        # what a worker process needs to load a course the same way as this store
+        self._worker_store_kwargs = {
+            'data_dir': data_dir,
+            'default_class': default_class,
+            'load_error_modules': load_error_modules,
+            'xblock_mixins': self.xblock_mixins,
+            'xblock_select': self.xblock_select,
+        }
 
         if default_class is None:
             self.default_class = None
@@ -386,7 +415,9 @@ class XMLModuleStore(ModuleStoreReadBase):
         self.reference_type = Location
 
         # All field data will be stored in an inheriting field data.
-        self.field_data = inheriting_field_data(kvs=DictKeyValueStore())
+        # KeyValueStore.Key -> value, for every field of every block
+        self.field_values = {}
+        self.field_data = inheriting_field_data(kvs=DictKeyValueStore(self.field_values))
 
         self.i18n_service = i18n_service
 
@@ -398,8 +429,173 @@ class XMLModuleStore(ModuleStoreReadBase):
         if course_dirs is None:
             course_dirs = sorted([d for d in os.listdir(self.data_dir) if
                                   os.path.exists(self.data_dir / d / "course.xml")])
+        if load_workers or self.parse_cache_dir:
+            self._load_course_states(course_dirs, course_ids, load_workers)
+        else:
+            for course_dir in course_dirs:
+                self.try_load_course(course_dir, course_ids)
+
+    def _load_course_states(self, course_dirs, course_ids, load_workers):
+        """
+        Load course_dirs from the parse cache if they're in it, and otherwise in a pool of load_workers
+        processes (or in this process if load_workers is None), saving them to the parse cache.
+        """
+        states = {}
+        to_load = []
+        for course_dir in course_dirs:
+            state = self._get_cached_course_state(course_dir, course_ids)
+            if state is None:
+                to_load.append(course_dir)
+            else:
+                states[course_dir] = state
+
+        if load_workers and len(to_load) > 1:
+            pool = multiprocessing.Pool(min(load_workers, len(to_load)))
+            try:
+                results = [
+                    (
+                        course_dir,
+                        pool.apply_async(_load_course_state, (self._worker_store_kwargs, course_dir, course_ids))
+                    )
+                    for course_dir in to_load
+                ]
+                for course_dir, result in results:
+                    try:
+                        states[course_dir] = result.get()
+                    except Exception:  # pylint: disable=broad-except
+                        # e.g., the course has a field value which can't be pickled
+                        log.warning("Failed to load course %s in a worker; loading it here", course_dir, exc_info=True)
+            finally:
+                pool.close()
+                pool.join()
+
         for course_dir in course_dirs:
-            self.try_load_course(course_dir, course_ids)
+            if course_dir in states:
+                self.add_course_state(states[course_dir])
+            else:
+                self.try_load_course(course_dir, course_ids)
+                states[course_dir] = self.get_course_state(course_dir)
+            if course_dir in to_load:
+                self._set_cached_course_state(course_dir, course_ids, states[course_dir])
+
+    def _course_state_cache_path(self, course_dir, course_ids):
+        """
+        Return the path of the parse cache file for course_dir, which is named after a hash of the
+        names, sizes, and modification times of all the files in course_dir, and of this store's
+        loading options; so, any change gets a new file.
+        """
+        fingerprint = hashlib.md5()
+        fingerprint.update(repr((
+            self.COURSE_STATE_VERSION, sorted(course_ids) if course_ids is not None else None,
+            sorted(
+                (key, value if key != 'xblock_mixins' else [repr(mixin) for mixin in value])
+                for key, value in self._worker_store_kwargs.iteritems()
+                if key not in ('data_dir', 'xblock_select')
+            ),
+            repr(self.xblock_select),
+        )))
+        for dirpath, dirnames, filenames in os.walk(self.data_dir / course_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_stat = os.stat(os.path.join(dirpath, filename))
+                fingerprint.update(repr((dirpath, filename, file_stat.st_size, file_stat.st_mtime)))
+        return self.parse_cache_dir / u'{}.{}.pickle'.format(course_dir, fingerprint.hexdigest())
+
+    def _get_cached_course_state(self, course_dir, course_ids):
+        """
+        Return the course state for course_dir from the parse cache, or None
+        """
+        if self.parse_cache_dir is None:
+            return None
+        try:
+            with open(self._course_state_cache_path(course_dir, course_ids), 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except IOError:
+            return None
+        except Exception:  # pylint: disable=broad-except
+            # e.g., a class the cache refers to is gone
+            log.warning("Ignoring the parse cache of course %s", course_dir, exc_info=True)
+            return None
+
+    def _set_cached_course_state(self, course_dir, course_ids, state):
+        """
+        Save the course state for course_dir in the parse cache, unless it failed to load
+        """
+        if self.parse_cache_dir is None or state['errors'] is not None and state['course_id'] is None:
+            return
+        try:
+            if not os.path.isdir(self.parse_cache_dir):
+                os.makedirs(self.parse_cache_dir)
+            cache_path = self._course_state_cache_path(course_dir, course_ids)
+            temp_path = u'{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(temp_path, 'wb') as cache_file:
+                pickle.dump(state, cache_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, cache_path)
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Failed to save the parse cache of course %s", course_dir, exc_info=True)
+
+    def get_course_state(self, course_dir):
+        """
+        Return everything loading course_dir added to this store, in a picklable form which
+        add_course_state can add to another store: a dict with
+            course_dir,
+            course_id: None if the course didn't load or wasn't one of the requested course_ids,
+            errors: the course's error log entries (or those of the failed load),
+        and, if it loaded, the course's usage_id, its parent tracker, the ScopeIds and class
+        of each of its blocks, and the values of all their fields.
+        """
+        state = {'course_dir': course_dir, 'course_id': None, 'errors': None}
+        if course_dir in self.errored_courses:
+            state['errors'] = self.errored_courses[course_dir].errors
+            return state
+        course = self.courses.get(course_dir)
+        if course is None:
+            return state
+
+        course_id = course.id
+        block_scope_ids = set()
+        for block in self.modules[course_id].itervalues():
+            block_scope_ids.update((block.scope_ids.def_id, block.scope_ids.usage_id))
+        state.update({
+            'course_id': course_id,
+            'errors': self._location_errors[course.scope_ids.usage_id].errors,
+            'course_usage_id': course.scope_ids.usage_id,
+            'parent_tracker': self.parent_trackers[course_id],
+            'blocks': [
+                (block.scope_ids, getattr(block, 'unmixed_class', block.__class__))
+                for block in self.modules[course_id].itervalues()
+            ],
+            'field_values': dict(
+                (key, value) for key, value in self.field_values.iteritems()
+                if key.block_scope_id in block_scope_ids
+            ),
+        })
+        return state
+
+    def add_course_state(self, state):
+        """
+        Add a course loaded by another store (see get_course_state) to this one
+        """
+        course_dir = state['course_dir']
+        errorlog = make_error_tracker()
+        if state['errors'] is not None:
+            errorlog.errors.extend(state['errors'])
+        if state['course_id'] is None:
+            if state['errors'] is not None:
+                self.errored_courses[course_dir] = errorlog
+            return
+
+        course_id = state['course_id']
+        self.field_values.update(state['field_values'])
+        self.parent_trackers[course_id] = state['parent_tracker']
+        system = self._make_import_system(course_id, course_dir, errorlog.tracker)
+        for scope_ids, block_class in state['blocks']:
+            self.modules[course_id][scope_ids.usage_id] = system.construct_xblock_from_class(block_class, scope_ids)
+
+        course_descriptor = self.modules[course_id][state['course_usage_id']]
+        self.courses[course_dir] = course_descriptor
+        self._location_errors[course_descriptor.scope_ids.usage_id] = errorlog
+        self.parent_trackers[course_id].make_known(course_descriptor.scope_ids.usage_id)
 
     def try_load_course(self, course_dir, course_ids=None):
         '''
@@ -530,24 +726,7 @@ class XMLModuleStore(ModuleStoreReadBase):
                 """
                 return policy.get(policy_key(usage_id), {})
 
-            services = {}
-            if self.i18n_service:
-                services['i18n'] = self.i18n_service
-
-            system = ImportSystem(
-                xmlstore=self,
-                course_id=course_id,
-                course_dir=course_dir,
-                error_tracker=tracker,
-                parent_tracker=self.parent_trackers[course_id],
-                load_error_modules=self.load_error_modules,
-                get_policy=get_policy,
-                mixins=self.xblock_mixins,
-                default_class=self.default_class,
-                select=self.xblock_select,
-                field_data=self.field_data,
-                services=services,
-            )
+            system = self._make_import_system(course_id, course_dir, tracker, get_policy)
 
             course_descriptor = system.process_xml(etree.tostring(course_data, encoding='unicode'))
 
@@ -576,6 +755,29 @@ class XMLModuleStore(ModuleStoreReadBase):
             log.debug('========> Done with course import from {0}'.format(course_dir))
             return course_descriptor
 
+    def _make_import_system(self, course_id, course_dir, tracker, get_policy=None):
+        """
+        Return an ImportSystem for loading the blocks of course_id into this store
+        """
+        services = {}
+        if self.i18n_service:
+            services['i18n'] = self.i18n_service
+
+        return ImportSystem(
+            xmlstore=self,
+            course_id=course_id,
+            course_dir=course_dir,
+            error_tracker=tracker,
+            parent_tracker=self.parent_trackers[course_id],
+            load_error_modules=self.load_error_modules,
+            get_policy=get_policy,
+            mixins=self.xblock_mixins,
+            default_class=self.default_class,
+            select=self.xblock_select,
+            field_data=self.field_data,
+            services=services,
+        )
+
     def load_extra_content(self, system, course_descriptor, category, base_dir, course_dir, url_name):
         self._load_extra_content(system, course_descriptor, category, base_dir, course_dir)
 
@@ -1,14 +1,17 @@
+import hashlib
 import logging
 import os
 import mimetypes
+from multiprocessing.pool import ThreadPool
 from path import path
 import json
 
 from .xml import XMLModuleStore, ImportSystem, ParentTracker
 from xmodule.modulestore import Location
 from xblock.fields import Scope, Reference, ReferenceList, ReferenceValueDict
-from xmodule.contentstore.content import StaticContent
+from xmodule.contentstore.content import StaticContent, StaticContentStream
 from .inheritance import own_metadata
+from .mongo.base import content_hash
 from xmodule.errortracker import make_error_tracker
 from .store_utilities import rewrite_nonportable_content_links
 import xblock
@@ -16,11 +19,39 @@ import xblock
 log = logging.getLogger(__name__)
 
 
+def _read_in_chunks(content_path, chunk_size=StaticContentStream.STREAM_DATA_CHUNK_SIZE):
+    """
+    Generate the contents of the file at content_path, chunk_size bytes at a time
+    """
+    with open(content_path, 'rb') as asset_file:
+        while True:
+            chunk = asset_file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _file_md5(content_path):
+    """
+    Return the md5 hex digest of the file at content_path, as the contentstore computes it
+    """
+    md5 = hashlib.md5()
+    for chunk in _read_in_chunks(content_path):
+        md5.update(chunk)
+    return md5.hexdigest()
+
+
 def import_static_content(
         modules, course_loc, course_data_path, static_content_store,
-        target_location_namespace, subpath='static', verbose=False):
+        target_location_namespace, subpath='static', verbose=False, max_workers=4):
+    """
+    Import the files under course_data_path/subpath into static_content_store and return a dict
+    mapping each file's path (relative to subpath) to its asset name.
 
-    remap_dict = {}
+    Files are streamed into the store, max_workers at a time. Files which are already stored
+    with the same content and attributes are skipped; so, re-importing a course only uploads
+    the assets which changed.
+    """
 
     # now import all static assets
     static_dir = course_data_path / subpath
@@ -35,6 +66,81 @@ def import_static_content(
     verbose = True
     mimetypes_list = mimetypes.types_map.values()
 
+    def import_static_file(content_path):
+        """
+        Save the file at content_path and its thumbnail unless they're already stored.
+        Return (path relative to static_dir, asset name), or None if the file was skipped.
+        """
+        filename = os.path.basename(content_path)
+        if verbose:
+            log.debug('importing static content %s...', content_path)
+
+        try:
+            content_digest = _file_md5(content_path)
+        except IOError:
+            if filename.startswith('._'):
+                # OS X "companion files". See
+                # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
+                return None
+            # Not a 'hidden file', then re-raise exception
+            raise
+
+        # strip away leading path from the name
+        fullname_with_subpath = content_path.replace(static_dir, '')
+        if fullname_with_subpath.startswith('/'):
+            fullname_with_subpath = fullname_with_subpath[1:]
+        content_loc = StaticContent.compute_location(
+            target_location_namespace.org, target_location_namespace.course,
+            fullname_with_subpath
+        )
+
+        policy_ele = policy.get(content_loc.name, {})
+        displayname = policy_ele.get('displayname', filename)
+        locked = policy_ele.get('locked', False)
+        mime_type = policy_ele.get('contentType')
+
+        # Check extracted contentType in list of all valid mimetypes
+        if not mime_type or mime_type not in mimetypes_list:
+            mime_type = mimetypes.guess_type(filename)[0]   # Assign guessed mimetype
+
+        # skip the upload if this exact file was imported before
+        existing = static_content_store.find(content_loc, throw_on_not_found=False, as_stream=True)
+        if existing is not None:
+            existing.close()
+            existing_attrs = (
+                existing.content_digest, existing.name, existing.content_type, existing.locked, existing.import_path
+            )
+            if existing_attrs == (content_digest, displayname, mime_type, locked, fullname_with_subpath):
+                if verbose:
+                    log.debug('static content %s is unchanged', content_path)
+                return fullname_with_subpath, content_loc.name
+
+        content = StaticContent(
+            content_loc, displayname, mime_type, _read_in_chunks(content_path),
+            import_path=fullname_with_subpath, locked=locked, length=os.path.getsize(content_path)
+        )
+
+        # first let's save a thumbnail so we can get back a thumbnail location
+        thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(
+            content, tempfile_path=content_path
+        )
+
+        if thumbnail_content is not None:
+            content.thumbnail_location = thumbnail_location
+
+        # then commit the content
+        try:
+            static_content_store.save(content)
+        except Exception as err:
+            log.exception('Error importing {0}, error={1}'.format(
+                fullname_with_subpath, err
+            ))
+
+        # the remapping information which will be needed
+        # to subsitute in the module data
+        return fullname_with_subpath, content_loc.name
+
+    content_paths = []
     for dirname, _, filenames in os.walk(static_dir):
         for filename in filenames:
 
@@ -45,61 +151,16 @@ def import_static_content(
                     log.debug('skipping static content %s...', content_path)
                 continue
 
-            if verbose:
-                log.debug('importing static content %s...', content_path)
-
-            try:
-                with open(content_path, 'rb') as f:
-                    data = f.read()
-            except IOError:
-                if filename.startswith('._'):
-                    # OS X "companion files". See
-                    # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
-                    continue
-                # Not a 'hidden file', then re-raise exception
-                raise
-
-            # strip away leading path from the name
-            fullname_with_subpath = content_path.replace(static_dir, '')
-            if fullname_with_subpath.startswith('/'):
-                fullname_with_subpath = fullname_with_subpath[1:]
-            content_loc = StaticContent.compute_location(
-                target_location_namespace.org, target_location_namespace.course,
-                fullname_with_subpath
-            )
-
-            policy_ele = policy.get(content_loc.name, {})
-            displayname = policy_ele.get('displayname', filename)
-            locked = policy_ele.get('locked', False)
-            mime_type = policy_ele.get('contentType')
-
-            # Check extracted contentType in list of all valid mimetypes
-            if not mime_type or mime_type not in mimetypes_list:
-                mime_type = mimetypes.guess_type(filename)[0]   # Assign guessed mimetype
-            content = StaticContent(
-                content_loc, displayname, mime_type, data,
-                import_path=fullname_with_subpath, locked=locked
-            )
-
-            # first let's save a thumbnail so we can get back a thumbnail location
-            thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(content)
-
-            if thumbnail_content is not None:
-                content.thumbnail_location = thumbnail_location
+            content_paths.append(content_path)
 
-            # then commit the content
-            try:
-                static_content_store.save(content)
-            except Exception as err:
-                log.exception('Error importing {0}, error={1}'.format(
-                    fullname_with_subpath, err
-                ))
-
-            # store the remapping information which will be needed
-            # to subsitute in the module data
-            remap_dict[fullname_with_subpath] = content_loc.name
+    pool = ThreadPool(max_workers)
+    try:
+        imported = pool.map(import_static_file, content_paths)
+    finally:
+        pool.close()
+        pool.join()
 
-    return remap_dict
+    return dict(remap for remap in imported if remap is not None)
 
 
 def import_from_xml(
@@ -107,7 +168,7 @@ def import_from_xml(
         default_class='xmodule.raw_module.RawDescriptor',
         load_error_modules=True, static_content_store=None,
         target_location_namespace=None, verbose=False, draft_store=None,
-        do_import_static=True):
+        do_import_static=True, incremental=False):
     """
     Import the specified xml data_dir into the "store" modulestore,
     using org and course as the location org and course.
@@ -130,6 +191,14 @@ def import_from_xml(
         time the course is loaded. Static content for some courses may also be
         served directly by nginx, instead of going through django.
 
+    :param incremental:
+        if True, and the store can tell what it has for the course (see
+        MongoModuleStore.get_content_hashes), then only the modules whose
+        fields differ from the stored ones are written, and the stored
+        modules which are no longer in the course are deleted (unless
+        errors occurred loading the course, as a module which failed to
+        load can't be told from one which was removed).
+
     """
 
     xml_module_store = XMLModuleStore(
@@ -163,6 +232,8 @@ def import_from_xml(
 
             course_data_path = None
             course_location = None
+            # url -> hash of the stored fields, for the modules not yet imported
+            content_hashes = None
 
             if verbose:
                 log.debug("Scanning {0} for course module...".format(course_id))
@@ -179,6 +250,9 @@ def import_from_xml(
                         loc=course_location
                     ))
 
+                    if incremental and hasattr(store, 'get_content_hashes'):
+                        content_hashes = store.get_content_hashes(target_location_namespace or course_location)
+
                     module = remap_namespace(module, target_location_namespace)
 
                     if not do_import_static:
@@ -212,7 +286,8 @@ def import_from_xml(
                         module, store, course_data_path, static_content_store,
                         course_location,
                         target_location_namespace or course_location,
-                        do_import_static=do_import_static
+                        do_import_static=do_import_static,
+                        content_hashes=content_hashes
                     )
 
                     course_items.append(module)
@@ -280,9 +355,25 @@ def import_from_xml(
                     module, store, course_data_path, static_content_store,
                     course_location,
                     target_location_namespace if target_location_namespace else course_location,
-                    do_import_static=do_import_static
+                    do_import_static=do_import_static,
+                    content_hashes=content_hashes
                 )
 
+            # the modules which weren't imported have been removed from the course, unless they
+            # just failed to load
+            if content_hashes:
+                load_errors = xml_module_store.get_item_errors(course_location)
+                if load_errors:
+                    log.warning(
+                        'Not deleting the %d modules missing from %s, as %d errors occurred loading it',
+                        len(content_hashes), course_id, len(load_errors)
+                    )
+                else:
+                    for url in content_hashes:
+                        if verbose:
+                            log.debug('deleting module location {loc}'.format(loc=url))
+                        store.delete_item(Location(url))
+
             # now import any 'draft' items
             if draft_store is not None:
                 import_course_draft(
@@ -310,7 +401,13 @@ def import_from_xml(
 def import_module(
         module, store, course_data_path, static_content_store,
         source_course_location, dest_course_location, allow_not_found=False,
-        do_import_static=True):
+        do_import_static=True, content_hashes=None):
+    """
+    Write module to store.
+
+    content_hashes: if given, a dict of url -> content_hash of the fields stored for each module.
+    The module is only written if its fields' hash differs, and is removed from content_hashes.
+    """
 
     logging.debug('processing import of module {}...'.format(module.location.url()))
 
@@ -329,6 +426,15 @@ def import_module(
     if 'index_in_children_list' in getattr(module, 'xml_attributes', []):
         del module.xml_attributes['index_in_children_list']
 
+    if content_hashes is not None:
+        stored_hash = content_hashes.pop(module.location.url(), None)
+        children = None
+        if module.has_children:
+            children = [child.url() if isinstance(child, Location) else child for child in module.children]
+        if stored_hash == content_hash(module.get_explicitly_set_fields_by_scope(), own_metadata(module), children):
+            logging.debug('module {} is unchanged'.format(module.location.url()))
+            return
+
     store.update_item(module, '**replace_user**', allow_not_found=allow_not_found)
 
 
@@ -1,6 +1,7 @@
 """
 Tests that check that we ignore the appropriate files when importing courses.
 """
+import hashlib
 import unittest
 from mock import Mock
 from xmodule.modulestore import Location
@@ -17,7 +18,23 @@ class IgnoredFilesTestCase(unittest.TestCase):
         content_store.generate_thumbnail.return_value = ("content", "location")
         import_static_content(Mock(), Mock(), course_dir, content_store, loc)
         saved_static_content = [call[0][0] for call in content_store.save.call_args_list]
-        name_val = {sc.name: sc.data for sc in saved_static_content}
+        name_val = {sc.name: ''.join(sc.data) for sc in saved_static_content}
         self.assertIn("example.txt", name_val)
         self.assertNotIn("example.txt~", name_val)
         self.assertIn("GREEN", name_val["example.txt"])
+
+    def test_skip_unchanged_static_files(self):
+        course_dir = DATA_DIR / "tilde"
+        loc = Location("edX", "tilde", "Fall_2012")
+        content_store = Mock()
+        content_store.generate_thumbnail.return_value = ("content", "location")
+        # the store already has the same file
+        existing = content_store.find.return_value
+        existing.content_digest = hashlib.md5(open(course_dir / "static" / "example.txt", 'rb').read()).hexdigest()
+        existing.name = "example.txt"
+        existing.content_type = "text/plain"
+        existing.locked = False
+        existing.import_path = "example.txt"
+        remap = import_static_content(Mock(), Mock(), course_dir, content_store, loc)
+        self.assertFalse(content_store.save.called)
+        self.assertEqual(remap, {"example.txt": "example.txt"})
@@ -0,0 +1,86 @@
+"""
+Cache of the course grade summaries computed by `courseware.grades.grade`.
+
+A cached grade summary is only valid while both the content of its course and
+the student's StudentModules in that course are unchanged. Rather than finding
+and deleting stale entries, each summary is stored along with the version
+markers of both, and is treated as missing once either marker has changed:
+
+- the course content version is changed by any write to the course in the
+  Mongo modulestores (see `xmodule.modulestore.django.course_content_version`).
+  The other modulestores don't signal their writes, so grades in courses stored
+  in them aren't cached (see `is_course_cacheable`).
+- the student version is changed whenever one of the student's StudentModules
+  in the course is saved or deleted (see `invalidate_student_grade`)
+
+Grades also depend on dates, such as when sections are released, which don't
+change either marker. So, cached summaries expire after
+settings.GRADE_CACHE_TIMEOUT seconds, which should be kept short.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from xmodule.modulestore import MONGO_MODULESTORE_TYPE
+from xmodule.modulestore.django import course_content_version, modulestore
+
+
+def is_course_cacheable(course_id):
+    """
+    Return whether grade summaries of `course_id` can be cached, i.e. whether
+    its course content version changes when the course does.
+    """
+    return modulestore().get_modulestore_type(course_id) == MONGO_MODULESTORE_TYPE
+
+
+def _cache_key(prefix, student_id, course_id):
+    """Return a memcached-safe cache key for `student_id` in `course_id`."""
+    return "{}.{}.{}".format(prefix, student_id, hashlib.md5(course_id.encode('utf-8')).hexdigest())
+
+
+def _student_version(student_id, course_id):
+    """Return the version marker of the student's StudentModules in the course."""
+    key = _cache_key('grades.student_version', student_id, course_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        # If another process won the race to set the marker, use theirs.
+        if not cache.add(key, version, settings.GRADE_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def grade_versions(student_id, course_id):
+    """
+    Return the version markers that a grade summary for `student_id` in
+    `course_id` depends on. These should be read *before* computing the grade,
+    so that changes made while it is being computed invalidate it.
+    """
+    return (course_content_version(course_id), _student_version(student_id, course_id))
+
+
+def get_cached_grade(student_id, course_id, versions):
+    """
+    Return the cached grade summary of `student_id` in `course_id`, or None if
+    there is none that was computed at the given `versions`.
+    """
+    entry = cache.get(_cache_key('grades.summary', student_id, course_id))
+    if entry is not None and entry['versions'] == versions:
+        return entry['grade_summary']
+    return None
+
+
+def set_cached_grade(student_id, course_id, versions, grade_summary):
+    """
+    Cache `grade_summary` for `student_id` in `course_id`, as computed at the
+    given `versions` (see `grade_versions`).
+    """
+    entry = {'versions': versions, 'grade_summary': grade_summary}
+    cache.set(_cache_key('grades.summary', student_id, course_id), entry, settings.GRADE_CACHE_TIMEOUT)
+
+
+def invalidate_student_grade(student_id, course_id):
+    """Invalidate any cached grade summary of `student_id` in `course_id`."""
+    cache.delete(_cache_key('grades.student_version', student_id, course_id))
@@ -1,22 +1,26 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 from collections import defaultdict
+from itertools import islice
+import hashlib
 import json
 import random
 import logging
 
 from contextlib import contextmanager
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.test.client import RequestFactory
 
 from dogapi import dog_stats_api
 
-from courseware import courses
+from courseware import courses, grade_cache
 from courseware.model_data import FieldDataCache
 from xmodule import graders
 from xmodule.graders import Score
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore import Location
+from xmodule.modulestore.django import modulestore, course_content_version
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
 from .models import StudentModule
@@ -145,16 +149,63 @@ def answer_distributions(course_id):
     return answer_counts
 
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, grading_context=None, student_modules=None,
+          versions=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
+
+    If the ENABLE_GRADE_CACHE feature is on, grade summaries without raw
+    scores are cached (see courseware.grade_cache), and are only recomputed
+    once the course content or the student's state in the course changes.
+    Callers that pass in `student_modules` should also pass in the grade cache
+    `versions` of the student, read before the StudentModules were loaded.
     """
+    use_grade_cache = _use_grade_cache(student, course, keep_raw_scores)
+    if use_grade_cache:
+        if versions is None:
+            versions = grade_cache.grade_versions(student.id, course.id)
+        grade_summary = grade_cache.get_cached_grade(student.id, course.id, versions)
+        if grade_summary is not None:
+            return grade_summary
+
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        if grading_context is None:
+            grading_context = compact_grading_context(course)
+        grade_summary = _grade(student, request, course, keep_raw_scores, grading_context, student_modules)
+
+    if use_grade_cache and not _has_always_recalculated_grades(grading_context):
+        grade_cache.set_cached_grade(student.id, course.id, versions, grade_summary)
+
+    return grade_summary
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _use_grade_cache(student, course, keep_raw_scores):
+    """Return whether the grade of `student` in `course` can come from the grade cache."""
+    return (
+        settings.FEATURES.get('ENABLE_GRADE_CACHE') and
+        not keep_raw_scores and
+        not settings.GENERATE_PROFILE_SCORES and
+        student.is_authenticated() and
+        grade_cache.is_course_cacheable(course.id)
+    )
+
+
+def _has_always_recalculated_grades(grading_context):
+    """
+    Return whether any graded problem in `grading_context` always recalculates
+    its grade. Such problems have state that is updated independently of
+    interaction with the LMS, so grades that include them can't be cached.
+    """
+    return any(
+        problem['always_recalculate_grades']
+        for sections in grading_context['graded_sections'].itervalues()
+        for section in sections
+        for problem in section['problems']
+    )
+
+
+def _grade(student, request, course, keep_raw_scores, grading_context=None, student_modules=None):
     """
     Unwrapped version of "grade"
 
@@ -173,51 +224,59 @@ def _grade(student, request, course, keep_raw_scores):
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
 
+    When grading many students of the same course, callers can pass in a
+    precomputed `grading_context` (see `compact_grading_context`) and the student's
+    `student_modules` (see `student_modules_by_state_key`) to avoid recomputing
+    them for every student.
+
     More information on the format is in the docstring for CourseGrader.
     """
-    grading_context = course.grading_context
+    # section url -> the descriptors loaded while computing the grading context, if it is
+    section_descriptors = {}
+    if grading_context is None:
+        grading_context = compact_grading_context(course, section_descriptors)
     raw_scores = []
 
+    # Load every StudentModule this student has in the course with a single
+    # query, so that neither the section skip check below nor get_score have
+    # to go back to the database once per problem.
+    if student_modules is None:
+        with manual_transaction():
+            student_modules = student_modules_by_state_key(student, course.id)
+
+    def create_module(descriptor):
+        '''creates an XModule instance given a descriptor'''
+        # TODO: We need the request to pass into here. If we could forego that, our arguments
+        # would be simpler
+        with manual_transaction():
+            field_data_cache = FieldDataCache([descriptor], course.id, student)
+        return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
     for section_format, sections in grading_context['graded_sections'].iteritems():
         format_scores = []
         for section in sections:
-            section_descriptor = section['section_descriptor']
-            section_name = section_descriptor.display_name_with_default
+            section_name = section['display_name']
+            scored_problems = [problem for problem in section['problems'] if problem['has_score']]
 
             # some problems have state that is updated independently of interaction
             # with the LMS, so they need to always be scored. (E.g. foldit.,
             # combinedopenended)
-            should_grade_section = any(
-                descriptor.always_recalculate_grades for descriptor in section['xmoduledescriptors']
-            )
+            should_grade_section = any(problem['always_recalculate_grades'] for problem in scored_problems)
 
             # If we haven't seen a single problem in the section, we don't have to grade it at all! We can assume 0%
             if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+                should_grade_section = any(problem['location'] in student_modules for problem in scored_problems)
 
             if should_grade_section:
                 scores = []
 
-                def create_module(descriptor):
-                    '''creates an XModule instance given a descriptor'''
-                    # TODO: We need the request to pass into here. If we could forego that, our arguments
-                    # would be simpler
-                    with manual_transaction():
-                        field_data_cache = FieldDataCache([descriptor], course.id, student)
-                    return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
-
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
-
-                    (correct, total) = get_score(course.id, student, module_descriptor, create_module)
+                for (correct, total, graded, display_name) in _section_scores(
+                        course, student, section, student_modules, create_module,
+                        section_descriptors.get(section['location'])
+                ):
                     if correct is None and total is None:
                         continue
 
@@ -227,12 +286,11 @@ def _grade(student, request, course, keep_raw_scores):
                         else:
                             correct = total
 
-                    graded = module_descriptor.graded
                     if not total > 0:
                         #We simply cannot grade a problem that is 12/0, because we might need it as a percentage
                         graded = False
 
-                    scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                    scores.append(Score(correct, total, graded, display_name))
 
                 _, graded_total = graders.aggregate_scores(scores, section_name)
                 if keep_raw_scores:
@@ -245,7 +303,7 @@ def _grade(student, request, course, keep_raw_scores):
                 format_scores.append(graded_total)
             else:
                 log.exception("Unable to grade a section with a total possible score of zero. " +
-                              str(section_descriptor.location))
+                              section['location'])
 
         totaled_scores[section_format] = format_scores
 
@@ -264,6 +322,142 @@ def _grade(student, request, course, keep_raw_scores):
     return grade_summary
 
 
+def _section_scores(course, student, section, student_modules, create_module, descriptors=None):
+    """
+    Yield (correct, total, graded, display_name) for every problem in `section`,
+    an entry of a compact grading context (see `compact_grading_context`).
+
+    Problems whose StudentModule already has a max_grade are scored without
+    loading their descriptors. Other problems are scored with `get_score`,
+    after loading the whole section from the modulestore at once, the first
+    time that one of them is found, unless its `descriptors` are given (as
+    `_section_descriptors` returns them). Sections with dynamic children can
+    only be walked through their descriptors, so they are always loaded in full.
+    """
+    if section['has_dynamic_children']:
+        if descriptors is not None:
+            section_descriptor = descriptors[section['location']]
+        else:
+            section_descriptor = modulestore().get_instance(course.id, Location(section['location']), depth=None)
+        for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
+            (correct, total) = get_score(
+                course.id, student, module_descriptor, create_module, student_modules=student_modules
+            )
+            yield (correct, total, module_descriptor.graded, module_descriptor.display_name_with_default)
+        return
+
+    for problem in section['problems']:
+        student_module = student_modules.get(problem['location'])
+        if (
+                student.is_authenticated() and
+                problem['has_score'] and
+                not problem['always_recalculate_grades'] and
+                student_module is not None and
+                student_module.max_grade is not None
+        ):
+            correct = student_module.grade if student_module.grade is not None else 0
+            (correct, total) = _weighted_score(correct, student_module.max_grade, problem['weight'], student_module)
+        else:
+            if descriptors is None:
+                descriptors = _section_descriptors(course.id, section['location'])
+            problem_descriptor = descriptors.get(problem['location'])
+            if problem_descriptor is None:
+                # The grading context is older than the section's content
+                problem_descriptor = modulestore().get_instance(course.id, Location(problem['location']))
+            (correct, total) = get_score(
+                course.id, student, problem_descriptor, create_module, student_modules=student_modules
+            )
+        yield (correct, total, problem['graded'], problem['display_name'])
+
+
+def _section_descriptors(course_id, section_location):
+    """
+    Load the section at `section_location` along with all of its descendants,
+    and return a dict mapping the location url of each of them to its descriptor.
+    """
+    section_descriptor = modulestore().get_instance(course_id, Location(section_location), depth=None)
+    return {
+        descriptor.location.url(): descriptor
+        for descriptor in yield_dynamic_descriptor_descendents(section_descriptor, lambda descriptor: None)
+    }
+
+
+def compact_grading_context(course, section_descriptors=None):
+    """
+    Return a compact, cacheable version of `course.grading_context`, which
+    doesn't hold on to any descriptors. It is a dictionary with the key:
+
+    graded_sections - A dictionary keyed by section format. The values are
+        lists of dictionaries describing each graded section, with the keys
+            "location" : The url of the section's location
+            "display_name" : The section's display name
+            "has_dynamic_children" : Whether the section or any of its
+                descendants has dynamic children. If so, the problems a student
+                sees can only be found by walking their instantiated modules.
+            "problems" : The section and its descendants that have a score or
+                always recalculate their grades, in the order in which they
+                are graded. Each one is a dictionary with the keys "location",
+                "display_name", "graded", "weight", "has_score" and
+                "always_recalculate_grades".
+
+    Walking the descriptor tree to build this is expensive, so it is kept in
+    the shared cache, keyed by the course's id and its content version. Only
+    courses whose content version changes with their content are cached (see
+    `grade_cache.is_course_cacheable`).
+
+    If the context has to be computed, the descriptors of each section are put
+    in the `section_descriptors` dict, if given, keyed by the section's url, as
+    `_section_descriptors` would return them.
+    """
+    if not grade_cache.is_course_cacheable(course.id):
+        return _compute_compact_grading_context(course, section_descriptors)
+
+    key = "grades.grading_context.{}.{}".format(
+        hashlib.md5(course.id.encode('utf-8')).hexdigest(),
+        course_content_version(course.id)
+    )
+    grading_context = cache.get(key)
+    if grading_context is None:
+        grading_context = _compute_compact_grading_context(course, section_descriptors)
+        cache.set(key, grading_context)
+    return grading_context
+
+
+def _compute_compact_grading_context(course, section_descriptors=None):
+    """Compute the grading context returned by `compact_grading_context`."""
+    graded_sections = {}
+    for section_format, sections in course.grading_context['graded_sections'].iteritems():
+        graded_sections[section_format] = []
+        for section in sections:
+            section_descriptor = section['section_descriptor']
+            # Walk the section in the same order as _grade would. Dynamic
+            # children can't be found without a student, so we don't follow
+            # them here, and just record that the section has them.
+            descriptors = list(yield_dynamic_descriptor_descendents(section_descriptor, lambda descriptor: None))
+            if section_descriptors is not None:
+                section_descriptors[section_descriptor.location.url()] = {
+                    descriptor.location.url(): descriptor for descriptor in descriptors
+                }
+            graded_sections[section_format].append({
+                'location': section_descriptor.location.url(),
+                'display_name': section_descriptor.display_name_with_default,
+                'has_dynamic_children': any(descriptor.has_dynamic_children() for descriptor in descriptors),
+                'problems': [
+                    {
+                        'location': descriptor.location.url(),
+                        'display_name': descriptor.display_name_with_default,
+                        'graded': descriptor.graded,
+                        'weight': descriptor.weight,
+                        'has_score': descriptor.has_score,
+                        'always_recalculate_grades': descriptor.always_recalculate_grades,
+                    }
+                    for descriptor in descriptors
+                    if descriptor.has_score or descriptor.always_recalculate_grades
+                ],
+            })
+    return {'graded_sections': graded_sections}
+
+
 def grade_for_percentage(grade_cutoffs, percentage):
     """
     Returns a letter grade as defined in grading_policy (e.g. 'A' 'B' 'C' for 6.002x) or None.
@@ -331,6 +525,8 @@ def _progress_summary(student, request, course):
             # This student must not have access to the course.
             return None
 
+        student_modules = student_modules_by_state_key(student, course.id)
+
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
     for chapter_module in course_module.get_display_items():
@@ -353,7 +549,9 @@ def _progress_summary(student, request, course):
 
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
                     course_id = course.id
-                    (correct, total) = get_score(course_id, student, module_descriptor, module_creator)
+                    (correct, total) = get_score(
+                        course_id, student, module_descriptor, module_creator, student_modules=student_modules
+                    )
                     if correct is None and total is None:
                         continue
 
@@ -383,7 +581,45 @@ def _progress_summary(student, request, course):
 
     return chapters
 
-def get_score(course_id, user, problem_descriptor, module_creator):
+def student_modules_by_state_key(user, course_id):
+    """
+    Return a dict mapping module_state_key -> StudentModule for every
+    StudentModule that `user` has in the course identified by `course_id`.
+
+    This is fetched with a single query, and is meant to be passed to
+    `get_score` as `student_modules` so that grading a whole course doesn't
+    cost one query per problem. Grading only needs the grades, so the state
+    of the StudentModules isn't loaded.
+    """
+    if not user.is_authenticated():
+        return {}
+
+    return {
+        student_module.module_state_key: student_module
+        for student_module in StudentModule.objects.filter(student=user, course_id=course_id).defer('state')
+    }
+
+
+def student_modules_by_student(students, course_id):
+    """
+    Return a dict mapping student id -> {module_state_key: StudentModule} for
+    every StudentModule that any of `students` has in the course identified by
+    `course_id`, fetched with a single query.
+
+    Students without any StudentModules in the course map to an empty dict.
+    As in `student_modules_by_state_key`, the state of the StudentModules
+    isn't loaded.
+    """
+    student_modules = {student.id: {} for student in students}
+    student_module_query = StudentModule.objects.filter(
+        course_id=course_id, student__in=student_modules.keys()
+    ).defer('state')
+    for student_module in student_module_query:
+        student_modules[student_module.student_id][student_module.module_state_key] = student_module
+    return student_modules
+
+
+def get_score(course_id, user, problem_descriptor, module_creator, student_modules=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -395,7 +631,9 @@ def get_score(course_id, user, problem_descriptor, module_creator):
     problem_descriptor: an XModuleDescriptor
     module_creator: a function that takes a descriptor, and returns the corresponding XModule for this user.
            Can return None if user doesn't have access, or if something else went wrong.
-    cache: A FieldDataCache
+    student_modules: optional dict of module_state_key -> StudentModule for this user
+           and course, as returned by `student_modules_by_state_key`. When given, it is
+           used instead of querying for this problem's StudentModule.
     """
     if not user.is_authenticated():
         return (None, None)
@@ -416,14 +654,17 @@ def get_score(course_id, user, problem_descriptor, module_creator):
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if student_modules is not None:
+        student_module = student_modules.get(problem_descriptor.location.url())
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+        except StudentModule.DoesNotExist:
+            student_module = None
 
     if student_module is not None and student_module.max_grade is not None:
         correct = student_module.grade if student_module.grade is not None else 0
@@ -445,7 +686,14 @@ def get_score(course_id, user, problem_descriptor, module_creator):
             return (None, None)
 
     # Now we re-weight the problem, if specified
-    weight = problem_descriptor.weight
+    return _weighted_score(correct, total, problem_descriptor.weight, student_module)
+
+
+def _weighted_score(correct, total, weight, student_module):
+    """
+    Return (correct, total) re-weighted so that the total is `weight`, if the
+    problem specifies one.
+    """
     if weight is not None:
         if total == 0:
             log.exception("Cannot reweight a problem with zero total points. Problem: " + str(student_module))
@@ -469,11 +717,25 @@ def manual_transaction():
         transaction.commit()
 
 
-def iterate_grades_for(course_id, students):
+def _batches(iterable, batch_size):
+    """Yield successive lists of at most `batch_size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iterate_grades_for(course_id, students, batch_size=100):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
     (student, gradeset, err_msg) for every student enrolled in the course.
 
+    Students are graded `batch_size` at a time: the StudentModules of every
+    student in a batch are loaded with a single query, and the course's grading
+    context is only computed once for all students.
+
     If an error occurred, gradeset will be an empty dict and err_msg will be an
     exception message. If there was no error, err_msg is an empty string.
 
@@ -494,25 +756,53 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
-        with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
-            try:
-                request.user = student
-                # Grading calls problem rendering, which calls masquerading,
-                # which checks session vars -- thus the empty session dict below.
-                # It's not pretty, but untangling that is currently beyond the
-                # scope of this feature.
-                request.session = {}
-                gradeset = grade(student, request, course)
-                yield student, gradeset, ""
-            except Exception as exc:  # pylint: disable=broad-except
-                # Keep marching on even if this student couldn't be graded for
-                # some reason, but log it for future reference.
-                log.exception(
-                    'Cannot grade student %s (%s) in course %s because of exception: %s',
-                    student.username,
-                    student.id,
-                    course_id,
-                    exc.message
-                )
-                yield student, {}, exc.message
+    # The grading context only depends on the course, so share it between
+    # all of the students we grade.
+    grading_context = compact_grading_context(course)
+
+    for student_batch in _batches(students, batch_size):
+        # Read the grade cache versions before loading the StudentModules, so
+        # that StudentModules saved in between invalidate the cached grades.
+        versions = {
+            student.id: grade_cache.grade_versions(student.id, course_id)
+            for student in student_batch
+            if _use_grade_cache(student, course, keep_raw_scores=False)
+        }
+        try:
+            student_modules = student_modules_by_student(student_batch, course_id)
+        except Exception:  # pylint: disable=broad-except
+            # Fall back to loading each student's StudentModules while grading
+            # them, so that every student still gets a grade or an error message.
+            log.exception(
+                'Cannot load the StudentModules of a batch of %d students in course %s',
+                len(student_batch),
+                course_id
+            )
+            student_modules = {}
+        for student in student_batch:
+            with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
+                try:
+                    request.user = student
+                    # Grading calls problem rendering, which calls masquerading,
+                    # which checks session vars -- thus the empty session dict below.
+                    # It's not pretty, but untangling that is currently beyond the
+                    # scope of this feature.
+                    request.session = {}
+                    gradeset = grade(
+                        student, request, course,
+                        grading_context=grading_context,
+                        student_modules=student_modules.get(student.id),
+                        versions=versions.get(student.id)
+                    )
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Keep marching on even if this student couldn't be graded for
+                    # some reason, but log it for future reference.
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        course_id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
@@ -0,0 +1,191 @@
+"""
+Writes StudentModuleHistory entries in batches outside of the requests which saved their
+StudentModules, if settings.STUDENT_MODULE_HISTORY_WRITER asks for it.
+
+The entries are queued in each process and written by a background thread, either directly
+('thread') or by sending them to the `save_student_module_history` celery task ('celery').
+Entries which are queued when a process dies are lost; so, at most
+STUDENT_MODULE_HISTORY_MAX_QUEUED entries per process can be lost. When the queue is full,
+new entries are written in the request unless STUDENT_MODULE_HISTORY_DROP_WHEN_FULL is set,
+in which case they are dropped.
+
+Entries are only queued once their StudentModules are committed: those saved in a request are
+held until courseware.middleware.HistoryWriterMiddleware sees its transaction commit, and those
+saved in a transaction outside a request are written in it. Other work which must wait for the
+request's commit, such as invalidating cached grades, can be deferred the same way
+(see `defer_until_commit`).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+# the callbacks of each thread's current request, to call once its transaction commits
+_REQUEST_CALLBACKS = threading.local()
+
+
+def write_entries(entries):
+    """
+    Create the unsaved StudentModuleHistory entries with one query, or one per entry if that
+    fails (e.g. because the StudentModule of one of them was rolled back)
+    """
+    from courseware.models import StudentModuleHistory
+    try:
+        StudentModuleHistory.objects.bulk_create(entries)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Failed to write %d StudentModuleHistory entries at once", len(entries))
+        for entry in entries:
+            try:
+                entry.save()
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Failed to write the StudentModuleHistory entry of %s", entry.student_module_id)
+
+
+def send_entries(entries):
+    """
+    Send the unsaved StudentModuleHistory entries to the celery task which writes them
+    """
+    from courseware.tasks import save_student_module_history
+    save_student_module_history.delay([
+        {
+            'student_module_id': entry.student_module_id,
+            'version': entry.version,
+            'created': entry.created.isoformat(),
+            'state': entry.state,
+            'grade': entry.grade,
+            'max_grade': entry.max_grade,
+        }
+        for entry in entries
+    ])
+
+
+def start_request():
+    """
+    Hold the callbacks which defer_until_commit is given from now on, until end_request
+    """
+    _REQUEST_CALLBACKS.pending = []
+
+
+def end_request(committed):
+    """
+    Call the callbacks held since start_request if the request's transaction committed, else
+    drop them
+    """
+    pending = getattr(_REQUEST_CALLBACKS, 'pending', None)
+    _REQUEST_CALLBACKS.pending = None
+    if pending and committed:
+        for callback in pending:
+            callback()
+
+
+def defer_until_commit(callback):
+    """
+    Call callback (with no arguments) once the current request's transaction commits. Returns
+    False if there is no current request, in which case nothing tells when to call it.
+    """
+    pending = getattr(_REQUEST_CALLBACKS, 'pending', None)
+    if pending is None:
+        return False
+    pending.append(callback)
+    return True
+
+
+class HistoryWriter(object):
+    """
+    Queues StudentModuleHistory entries, and passes them to `write_batch` in batches of at
+    most `batch_size` from a background thread, at least every `flush_interval` seconds.
+    """
+    def __init__(self, write_batch, batch_size, flush_interval, max_queued, drop_when_full):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.drop_when_full = drop_when_full
+        self._entries = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # the process which started the thread; a forked process needs its own
+        self._pid = None
+
+    def add(self, entries):
+        """
+        Queue entries to be written, or write them now (or drop them) if the queue is full
+        """
+        with self._lock:
+            self._start()
+            room = max(self.max_queued - len(self._entries), 0)
+            overflow = entries[room:]
+            self._entries.extend(entries[:room])
+            if len(self._entries) >= self.batch_size:
+                self._wakeup.set()
+
+        if overflow:
+            if self.drop_when_full:
+                log.warning("Dropped %d StudentModuleHistory entries as the queue is full", len(overflow))
+            else:
+                self.write_batch(overflow)
+
+    def flush(self):
+        """
+        Write all the queued entries
+        """
+        while True:
+            with self._lock:
+                batch = [self._entries.popleft() for _ in xrange(min(self.batch_size, len(self._entries)))]
+            if not batch:
+                return
+            try:
+                self.write_batch(batch)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Lost %d StudentModuleHistory entries", len(batch))
+
+    def _start(self):
+        """
+        Start the background thread in this process unless it's running. Must hold the lock.
+        """
+        if self._pid == os.getpid():
+            return
+        # entries inherited from the parent process are the parent's to write
+        self._entries.clear()
+        self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='StudentModuleHistoryWriter')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        """
+        Write the queued entries whenever there are enough of them, or flush_interval passed
+        """
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+_WRITERS = {}
+
+
+def history_writer():
+    """
+    Return the HistoryWriter configured by settings.STUDENT_MODULE_HISTORY_WRITER, or None if
+    entries are written when their StudentModules are saved
+    """
+    mode = getattr(settings, 'STUDENT_MODULE_HISTORY_WRITER', 'sync')
+    if mode == 'sync':
+        return None
+    if mode not in _WRITERS:
+        writer = HistoryWriter(
+            {'thread': write_entries, 'celery': send_entries}[mode],
+            batch_size=settings.STUDENT_MODULE_HISTORY_BATCH_SIZE,
+            flush_interval=settings.STUDENT_MODULE_HISTORY_FLUSH_INTERVAL,
+            max_queued=settings.STUDENT_MODULE_HISTORY_MAX_QUEUED,
+            drop_when_full=settings.STUDENT_MODULE_HISTORY_DROP_WHEN_FULL,
+        )
+        atexit.register(writer.flush)
+        _WRITERS[mode] = writer
+    return _WRITERS[mode]
@@ -0,0 +1,23 @@
+"""
+Middleware of the courseware app
+"""
+from courseware.history_writer import end_request, start_request
+
+
+class HistoryWriterMiddleware(object):
+    """
+    Hands the StudentModuleHistory entries saved during a request to the history writer, and
+    runs the other work deferred until commit, once the request's transaction commits, or drops
+    them if it's rolled back (see courseware.history_writer). Must come before TransactionMiddleware, so that its
+    process_response runs after the commit.
+    """
+    def process_request(self, request):  # pylint: disable=unused-argument
+        start_request()
+
+    def process_exception(self, request, exception):  # pylint: disable=unused-argument
+        # TransactionMiddleware has rolled the transaction back
+        end_request(committed=False)
+
+    def process_response(self, request, response):  # pylint: disable=unused-argument
+        end_request(committed=True)
+        return response
@@ -5,15 +5,17 @@ Classes to provide the LMS runtime data storage to XBlocks
 import json
 from collections import defaultdict
 from itertools import chain
+from .grade_cache import invalidate_student_grade
 from .models import (
     StudentModule,
+    StudentModuleHistory,
     XModuleUserStateSummaryField,
     XModuleStudentPrefsField,
     XModuleStudentInfoField
 )
 import logging
 
-from django.db import DatabaseError
+from django.db import DatabaseError, IntegrityError, transaction
 from django.contrib.auth.models import User
 
 from xblock.runtime import KeyValueStore
@@ -57,6 +59,9 @@ class FieldDataCache(object):
         select_for_update: True if rows should be locked until end of transaction
         '''
         self.cache = {}
+        # StudentModule cache key -> (the state json, the state decoded from it,
+        #                             field name -> json of the field's value if it's a list or dict)
+        self.decoded_states = {}
         self.descriptors = descriptors
         self.select_for_update = select_for_update
         self.course_id = course_id
@@ -235,7 +240,7 @@ class FieldDataCache(object):
         if key.scope == Scope.user_state:
             field_object, _ = StudentModule.objects.get_or_create(
                 course_id=self.course_id,
-                student=User.objects.get(id=key.user_id),
+                student=self._user(key.user_id),
                 module_state_key=key.block_scope_id.url(),
                 defaults={
                     'state': json.dumps({}),
@@ -251,18 +256,210 @@ class FieldDataCache(object):
             field_object, _ = XModuleStudentPrefsField.objects.get_or_create(
                 field_name=key.field_name,
                 module_type=key.block_scope_id,
-                student=User.objects.get(id=key.user_id),
+                student=self._user(key.user_id),
             )
         elif key.scope == Scope.user_info:
             field_object, _ = XModuleStudentInfoField.objects.get_or_create(
                 field_name=key.field_name,
-                student=User.objects.get(id=key.user_id),
+                student=self._user(key.user_id),
             )
 
         cache_key = self._cache_key_from_kvs_key(key)
         self.cache[cache_key] = field_object
         return field_object
 
+    def _user(self, user_id):
+        """
+        Return the User with id user_id, which is usually the user of this cache
+        """
+        if user_id == self.user.id:
+            return self.user
+        return User.objects.get(id=user_id)
+
+    def create_many(self, kv_dict):
+        """
+        Create the model objects, with their values, for the keys of kv_dict which aren't in
+        this cache, with one query per model class to create them and one to read them back.
+
+        Returns the set of the keys whose values were saved, which is empty if any of the objects
+        were created meanwhile (by another request), so that they're left to `find_or_create`.
+        """
+        new_keys = [key for key in kv_dict if self.find(key) is None]
+        if not new_keys or not self.user.is_authenticated():
+            return set()
+
+        # cache key -> the new object for it; the user_state fields of a block share its StudentModule
+        new_objects = {}
+        new_states = defaultdict(dict)
+        for key in new_keys:
+            cache_key = self._cache_key_from_kvs_key(key)
+            if key.scope == Scope.user_state:
+                new_states[cache_key][key.field_name] = kv_dict[key]
+                if cache_key not in new_objects:
+                    new_objects[cache_key] = StudentModule(
+                        course_id=self.course_id,
+                        student=self._user(key.user_id),
+                        module_state_key=key.block_scope_id.url(),
+                        module_type=key.block_scope_id.category,
+                    )
+            elif key.scope == Scope.user_state_summary:
+                new_objects[cache_key] = XModuleUserStateSummaryField(
+                    field_name=key.field_name,
+                    usage_id=key.block_scope_id.url(),
+                    value=json.dumps(kv_dict[key]),
+                )
+            elif key.scope == Scope.preferences:
+                new_objects[cache_key] = XModuleStudentPrefsField(
+                    field_name=key.field_name,
+                    module_type=key.block_scope_id,
+                    student=self._user(key.user_id),
+                    value=json.dumps(kv_dict[key]),
+                )
+            elif key.scope == Scope.user_info:
+                new_objects[cache_key] = XModuleStudentInfoField(
+                    field_name=key.field_name,
+                    student=self._user(key.user_id),
+                    value=json.dumps(kv_dict[key]),
+                )
+
+        objects_by_scope = defaultdict(list)
+        for cache_key, field_object in new_objects.iteritems():
+            if cache_key in new_states:
+                field_object.state = json.dumps(new_states[cache_key])
+            objects_by_scope[cache_key[0]].append(field_object)
+
+        sid = transaction.savepoint()
+        try:
+            for scope, field_objects in objects_by_scope.iteritems():
+                field_objects[0].__class__.objects.bulk_create(field_objects)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            return set()
+
+        # the new objects have no ids; so, read them back to be able to update them
+        for scope, field_objects in objects_by_scope.iteritems():
+            created = self._retrieve_created(scope, field_objects)
+            for field_object in created:
+                cache_key = self._cache_key_from_field_object(scope, field_object)
+                if cache_key in new_objects:
+                    self.cache[cache_key] = field_object
+
+        student_modules = [
+            self.cache[cache_key] for cache_key in new_objects if cache_key[0] == Scope.user_state
+        ]
+        if student_modules:
+            # bulk_create doesn't send the post_save signals which these follow
+            StudentModuleHistory.save_entries([
+                StudentModuleHistory.for_student_module(student_module)
+                for student_module in student_modules
+                if student_module.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES
+            ])
+            invalidate_student_grade(self.user.id, self.course_id)
+        return set(new_keys)
+
+    def _retrieve_created(self, scope, field_objects):
+        """
+        Query the database for the objects just created from field_objects, along with possibly
+        some others in the same scope
+        """
+        if scope == Scope.user_state:
+            return self._chunked_query(
+                StudentModule,
+                'module_state_key__in',
+                set(field_object.module_state_key for field_object in field_objects),
+                course_id=self.course_id,
+                student=self.user.pk,
+            )
+        elif scope == Scope.user_state_summary:
+            return self._chunked_query(
+                XModuleUserStateSummaryField,
+                'usage_id__in',
+                set(field_object.usage_id for field_object in field_objects),
+                field_name__in=set(field_object.field_name for field_object in field_objects),
+            )
+        elif scope == Scope.preferences:
+            return self._chunked_query(
+                XModuleStudentPrefsField,
+                'module_type__in',
+                set(field_object.module_type for field_object in field_objects),
+                student=self.user.pk,
+                field_name__in=set(field_object.field_name for field_object in field_objects),
+            )
+        elif scope == Scope.user_info:
+            return self._query(
+                XModuleStudentInfoField,
+                student=self.user.pk,
+                field_name__in=set(field_object.field_name for field_object in field_objects),
+            )
+
+    def get_state(self, student_module):
+        """
+        Return the decoded state of student_module, a StudentModule from this cache. The state is only
+        decoded again if student_module.state was changed other than by `encode_state`, so changes to
+        the returned dict are kept until they're encoded (or discarded by such a change).
+        """
+        return self._decoded_state(student_module)[1]
+
+    def get_state_field(self, student_module, field_name):
+        """
+        Return the value of field_name in the decoded state of student_module. Lists and dicts are
+        decoded afresh from the json of the value, so that changing them doesn't change the state.
+        """
+        __, decoded, fragments = self._decoded_state(student_module)
+        value = decoded[field_name]
+        if not isinstance(value, (dict, list)):
+            return value
+        if field_name not in fragments:
+            fragments[field_name] = json.dumps(value)
+        return json.loads(fragments[field_name])
+
+    def set_state_field(self, student_module, field_name, value):
+        """
+        Set field_name to value in the decoded state of student_module. Lists and dicts are stored
+        as copies decoded from their json, so that changing value afterwards doesn't change the state.
+        """
+        __, decoded, fragments = self._decoded_state(student_module)
+        if isinstance(value, (dict, list)):
+            fragments[field_name] = json.dumps(value)
+            value = json.loads(fragments[field_name])
+        else:
+            fragments.pop(field_name, None)
+        decoded[field_name] = value
+
+    def delete_state_field(self, student_module, field_name):
+        """
+        Delete field_name from the decoded state of student_module.
+        """
+        __, decoded, fragments = self._decoded_state(student_module)
+        del decoded[field_name]
+        fragments.pop(field_name, None)
+
+    def _decoded_state(self, student_module):
+        """
+        Return the entry of student_module in `decoded_states`, decoding its state if it's not current.
+        """
+        cache_key = self._cache_key_from_field_object(Scope.user_state, student_module)
+        entry = self.decoded_states.get(cache_key)
+        if entry is None or entry[0] is not student_module.state:
+            entry = (student_module.state, json.loads(student_module.state), {})
+            self.decoded_states[cache_key] = entry
+        return entry
+
+    def encode_state(self, student_module):
+        """
+        Encode the state of student_module returned by `get_state` into student_module.state.
+
+        Returns whether the state changed, i.e., whether student_module needs saving.
+        """
+        cache_key = self._cache_key_from_field_object(Scope.user_state, student_module)
+        encoded = json.dumps(self.get_state(student_module))
+        if encoded == student_module.state:
+            return False
+        student_module.state = encoded
+        self.decoded_states[cache_key] = (encoded,) + self.decoded_states[cache_key][1:]
+        return True
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -302,7 +499,7 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            return json.loads(field_object.state)[key.field_name]
+            return self._field_data_cache.get_state_field(field_object, key.field_name)
         else:
             return json.loads(field_object.value)
 
@@ -320,41 +517,62 @@ class DjangoKeyValueStore(KeyValueStore):
           xblock.KvsFieldData._key : value
 
         """
-        saved_fields = []
-        # field_objects maps a field_object to a list of associated fields
-        field_objects = dict()
         for field in kv_dict:
             # Check field for validity
             if field.scope not in self._allowed_scopes:
                 raise InvalidScopeError(field)
 
+        # Create the objects for all the new fields at once, with their values
+        try:
+            created_fields = self._field_data_cache.create_many(kv_dict)
+        except DatabaseError:
+            log.exception('Error creating fields %r', kv_dict.keys())
+            raise KeyValueMultiSaveError([])
+        saved_fields = [field.field_name for field in created_fields]
+        # field_objects maps a field_object to a list of associated fields
+        field_objects = dict()
+        for field in kv_dict:
+            if field in created_fields:
+                continue
+
             # If the field is valid and isn't already in the dictionary, add it.
             field_object = self._field_data_cache.find_or_create(field)
-            if field_object not in field_objects.keys():
+            if field_object not in field_objects:
                 field_objects[field_object] = []
             # Update the list of associated fields
             field_objects[field_object].append(field)
 
-            # Special case when scope is for the user state, because this scope saves fields in a single row
+            # Special case when scope is for the user state, because this scope saves fields in a single row,
+            # whose state is encoded once all its fields are set
             if field.scope == Scope.user_state:
-                state = json.loads(field_object.state)
-                state[field.field_name] = kv_dict[field]
-                field_object.state = json.dumps(state)
+                self._field_data_cache.set_state_field(field_object, field.field_name, kv_dict[field])
             else:
             # The remaining scopes save fields on different rows, so
             # we don't have to worry about conflicts
                 field_object.value = json.dumps(kv_dict[field])
 
-        for field_object in field_objects:
-            try:
-                # Save the field object that we made above
-                field_object.save()
-                # If save is successful on this scope, add the saved fields to
-                # the list of successful saves
-                saved_fields.extend([field.field_name for field in field_objects[field_object]])
-            except DatabaseError:
-                log.exception('Error saving fields %r', field_objects[field_object])
-                raise KeyValueMultiSaveError(saved_fields)
+        # write the history of the saved StudentModules all at once
+        with StudentModuleHistory.batched():
+            for field_object, fields in field_objects.iteritems():
+                is_student_module = fields[0].scope == Scope.user_state
+                if is_student_module:
+                    previous_state = field_object.state
+                    if not self._field_data_cache.encode_state(field_object):
+                        # the state didn't change, so don't write it (nor its history)
+                        saved_fields.extend([field.field_name for field in fields])
+                        continue
+                try:
+                    # Save the field object that we made above
+                    field_object.save()
+                    # If save is successful on this scope, add the saved fields to
+                    # the list of successful saves
+                    saved_fields.extend([field.field_name for field in fields])
+                except DatabaseError:
+                    if is_student_module:
+                        # so that the state is written again by the next set_many, and decoded again until then
+                        field_object.state = previous_state
+                    log.exception('Error saving fields %r', fields)
+                    raise KeyValueMultiSaveError(saved_fields)
 
     def delete(self, key):
         if key.scope not in self._allowed_scopes:
@@ -365,9 +583,8 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            state = json.loads(field_object.state)
-            del state[key.field_name]
-            field_object.state = json.dumps(state)
+            self._field_data_cache.delete_state_field(field_object, key.field_name)
+            self._field_data_cache.encode_state(field_object)
             field_object.save()
         else:
             field_object.delete()
@@ -381,6 +598,6 @@ class DjangoKeyValueStore(KeyValueStore):
             return False
 
         if key.scope == Scope.user_state:
-            return key.field_name in json.loads(field_object.state)
+            return key.field_name in self._field_data_cache.get_state(field_object)
         else:
             return True
@@ -12,12 +12,19 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
+import threading
+from contextlib import contextmanager
+from functools import partial
+
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from courseware.grade_cache import invalidate_student_grade
+from courseware.history_writer import defer_until_commit, history_writer
+
 
 class StudentModule(models.Model):
     """
@@ -88,6 +95,21 @@ class StudentModule(models.Model):
         return unicode(repr(self))
 
 
+@receiver(post_save, sender=StudentModule)
+@receiver(post_delete, sender=StudentModule)
+def invalidate_grade_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Any change to a StudentModule can change the student's course grade."""
+    invalidate_student_grade(instance.student_id, instance.course_id)
+    if transaction.is_managed():
+        # Until the change commits, other processes can still grade (and cache) the old state;
+        # so, invalidate again once it does.
+        defer_until_commit(partial(invalidate_student_grade, instance.student_id, instance.course_id))
+
+
+# the StudentModuleHistory entries collected by StudentModuleHistory.batched in each thread
+_HISTORY_BATCHES = threading.local()
+
+
 class StudentModuleHistory(models.Model):
     """Keeps a complete history of state changes for a given XModule for a given
     Student. Right now, we restrict this to problems so that the table doesn't
@@ -107,16 +129,69 @@ class StudentModuleHistory(models.Model):
     grade = models.FloatField(null=True, blank=True)
     max_grade = models.FloatField(null=True, blank=True)
 
+    @classmethod
+    def for_student_module(cls, student_module):
+        """
+        Return an unsaved history entry recording the current state of student_module
+        """
+        return cls(student_module=student_module,
+                   version=None,
+                   created=student_module.modified,
+                   state=student_module.state,
+                   grade=student_module.grade,
+                   max_grade=student_module.max_grade)
+
+    @classmethod
+    @contextmanager
+    def batched(cls):
+        """
+        Within this context, the history entries of the StudentModules saved in this thread are
+        collected, and created together when it ends. Nested contexts share the outermost batch.
+        """
+        outermost = getattr(_HISTORY_BATCHES, 'entries', None) is None
+        if outermost:
+            _HISTORY_BATCHES.entries = []
+        try:
+            yield
+        finally:
+            if outermost:
+                entries = _HISTORY_BATCHES.entries
+                _HISTORY_BATCHES.entries = None
+                cls._write_entries(entries)
+
+    @classmethod
+    def save_entries(cls, entries):
+        """
+        Create entries now, or at the end of the current batch if there is one
+        """
+        batch = getattr(_HISTORY_BATCHES, 'entries', None)
+        if batch is not None:
+            batch.extend(entries)
+        else:
+            cls._write_entries(entries)
+
+    @classmethod
+    def _write_entries(cls, entries):
+        """
+        Create entries now, or queue them for the history writer (see courseware.history_writer)
+        once their StudentModules are committed
+        """
+        if not entries:
+            return
+        writer = history_writer()
+        if writer is None:
+            cls.objects.bulk_create(entries)
+        elif not transaction.is_managed():
+            # the StudentModules are already committed
+            writer.add(entries)
+        elif not defer_until_commit(partial(writer.add, entries)):
+            # outside a request nothing tells when the transaction commits; so, write them in it
+            cls.objects.bulk_create(entries)
+
     @receiver(post_save, sender=StudentModule)
     def save_history(sender, instance, **kwargs):
         if instance.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES:
-            history_entry = StudentModuleHistory(student_module=instance,
-                                                 version=None,
-                                                 created=instance.modified,
-                                                 state=instance.state,
-                                                 grade=instance.grade,
-                                                 max_grade=instance.max_grade)
-            history_entry.save()
+            StudentModuleHistory.save_entries([StudentModuleHistory.for_student_module(instance)])
 
 
 class XModuleUserStateSummaryField(models.Model):
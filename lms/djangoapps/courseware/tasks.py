@@ -0,0 +1,26 @@
+"""
+Celery tasks of the courseware app
+"""
+import dateutil.parser
+from celery import task
+
+from courseware.history_writer import write_entries
+from courseware.models import StudentModuleHistory
+
+
+@task  # pylint: disable=E1102
+def save_student_module_history(entries):
+    """
+    Write the StudentModuleHistory entries sent by courseware.history_writer.send_entries
+    """
+    write_entries([
+        StudentModuleHistory(
+            student_module_id=entry['student_module_id'],
+            version=entry['version'],
+            created=dateutil.parser.parse(entry['created']),
+            state=entry['state'],
+            grade=entry['grade'],
+            max_grade=entry['max_grade'],
+        )
+        for entry in entries
+    ])
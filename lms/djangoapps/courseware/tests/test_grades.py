@@ -1,19 +1,27 @@
 """
 Test grade calculation.
 """
+from django.core.cache import cache
 from django.http import Http404
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
-from mock import patch
+from mock import Mock, patch
 
+from courseware.middleware import HistoryWriterMiddleware
+from courseware.tests.factories import StudentModuleFactory
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from student.tests.factories import UserFactory
-from xmodule.modulestore.tests.factories import CourseFactory
+from xmodule.modulestore import XML_MODULESTORE_TYPE
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from xmodule.modulestore.django import modulestore, modulestore_update_signal
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
-from courseware.grades import grade, iterate_grades_for
+from courseware.grades import (
+    compact_grading_context, grade, iterate_grades_for, get_score, student_modules_by_state_key
+)
 
 
-def _grade_with_errors(student, request, course, keep_raw_scores=False):
+def _grade_with_errors(student, request, course, keep_raw_scores=False, **kwargs):
     """This fake grade method will throw exceptions for student3 and
     student4, but allow any other students to go through normal grading.
 
@@ -24,7 +32,7 @@ def _grade_with_errors(student, request, course, keep_raw_scores=False):
     if student.username in ['student3', 'student4']:
         raise Exception("I don't like {}".format(student.username))
 
-    return grade(student, request, course, keep_raw_scores=keep_raw_scores)
+    return grade(student, request, course, keep_raw_scores=keep_raw_scores, **kwargs)
 
 
 @override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
@@ -73,6 +81,25 @@ class TestGradeIteration(ModuleStoreTestCase):
             self.assertIsNone(gradeset['grade'])
             self.assertEqual(gradeset['percent'], 0.0)
 
+    def test_batched_grading(self):
+        """Grading in batches smaller than the number of students should still
+        grade every student exactly once, in order."""
+        gradeset_results = list(iterate_grades_for(self.course.id, self.students, batch_size=2))
+        self.assertEqual([student for student, _, _ in gradeset_results], self.students)
+        for _, gradeset, err_msg in gradeset_results:
+            self.assertEqual(err_msg, "")
+            self.assertEqual(gradeset['percent'], 0.0)
+
+    @patch('courseware.grades.student_modules_by_student', Mock(side_effect=Exception("No StudentModules")))
+    def test_batch_query_exception(self):
+        """If the StudentModules of a batch can't be loaded at once, every
+        student should still be graded on their own."""
+        all_gradesets, all_errors = self._gradesets_and_errors_for(self.course.id, self.students)
+        self.assertEqual(len(all_errors), 0)
+        self.assertEqual(len(all_gradesets), 5)
+        for gradeset in all_gradesets.values():
+            self.assertEqual(gradeset['percent'], 0.0)
+
     @patch('courseware.grades.grade', _grade_with_errors)
     def test_grading_exception(self):
         """Test that we correctly capture exception messages that bubble up from
@@ -120,3 +147,224 @@ class TestGradeIteration(ModuleStoreTestCase):
                 students_to_errors[student] = err_msg
 
         return students_to_gradesets, students_to_errors
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestPrefetchedScores(ModuleStoreTestCase):
+    """
+    Test scoring from a prefetched map of StudentModules.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.problem = ItemFactory.create(parent_location=self.course.location, category='problem')
+        self.other_problem = ItemFactory.create(parent_location=self.course.location, category='problem')
+        self.student = UserFactory.create()
+        StudentModuleFactory.create(
+            student=self.student,
+            course_id=self.course.id,
+            module_state_key=self.problem.location.url(),
+            grade=1,
+            max_grade=2,
+        )
+
+    def _fail_module_creator(self, descriptor):
+        """Module creator that must not be called when the score is cached."""
+        self.fail("Unexpected module instantiation for {}".format(descriptor.location))
+
+    def test_student_modules_by_state_key(self):
+        with self.assertNumQueries(1):
+            student_modules = student_modules_by_state_key(self.student, self.course.id)
+        self.assertEqual(student_modules.keys(), [self.problem.location.url()])
+
+    def test_get_score_uses_prefetched_modules(self):
+        student_modules = student_modules_by_state_key(self.student, self.course.id)
+        with self.assertNumQueries(0):
+            score = get_score(
+                self.course.id, self.student, self.problem, self._fail_module_creator,
+                student_modules=student_modules
+            )
+        self.assertEqual(score, (1, 2))
+
+    def test_get_score_falls_back_to_module_creator(self):
+        student_modules = student_modules_by_state_key(self.student, self.course.id)
+        module_creator = Mock(return_value=Mock(max_score=Mock(return_value=3)))
+        with self.assertNumQueries(0):
+            score = get_score(
+                self.course.id, self.student, self.other_problem, module_creator,
+                student_modules=student_modules
+            )
+        self.assertEqual(score, (0.0, 3))
+        module_creator.assert_called_once_with(self.other_problem)
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+@patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_CACHE': True})
+class TestGradeCache(ModuleStoreTestCase):
+    """
+    Test caching of grade summaries.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        self.section = ItemFactory.create(
+            parent_location=chapter.location,
+            category='sequential',
+            metadata={'graded': True, 'format': 'Homework'}
+        )
+        self.problem = ItemFactory.create(parent_location=self.section.location, category='problem')
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+        cache.clear()
+
+    def _grade(self):
+        """Grade our student, reloading the course like a new request would."""
+        course = modulestore().get_course(self.course.id)
+        return grade(self.student, self.request, course)
+
+    def test_cached_grade(self):
+        self.assertEqual(self._grade()['percent'], 0.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._grade()['percent'], 0.0)
+
+    def test_student_module_save_invalidates(self):
+        self.assertEqual(self._grade()['percent'], 0.0)
+        StudentModuleFactory.create(
+            student=self.student,
+            course_id=self.course.id,
+            module_state_key=self.problem.location.url(),
+            grade=1,
+            max_grade=1,
+        )
+        grade_summary = self._grade()
+        [section_score] = grade_summary['totaled_scores']['Homework']
+        self.assertEqual(section_score.earned, 1)
+        self.assertGreater(grade_summary['percent'], 0.0)
+
+    def test_course_update_invalidates(self):
+        self.assertEqual(self._grade()['percent'], 0.0)
+        with patch('courseware.grades._grade') as mock_grade:
+            mock_grade.return_value = {'percent': 0.5}
+            self.assertEqual(self._grade()['percent'], 0.0)
+            modulestore_update_signal.send(None, modulestore=None, course_id=self.course.id, location=None)
+            self.assertEqual(self._grade()['percent'], 0.5)
+
+    def test_not_cached_outside_mongo(self):
+        self.assertEqual(self._grade()['percent'], 0.0)
+        with patch.object(modulestore(), 'get_modulestore_type', return_value=XML_MODULESTORE_TYPE):
+            with patch('courseware.grades._grade') as mock_grade:
+                mock_grade.return_value = {'percent': 0.5}
+                self.assertEqual(self._grade()['percent'], 0.5)
+
+    def test_grade_cached_before_save_commits(self):
+        middleware = HistoryWriterMiddleware()
+        middleware.process_request(self.request)
+        StudentModuleFactory.create(
+            student=self.student,
+            course_id=self.course.id,
+            module_state_key=self.problem.location.url(),
+            grade=1,
+            max_grade=1,
+        )
+        # Another process grades (and caches) the committed state before the save commits
+        with patch('courseware.grades._grade') as mock_grade:
+            mock_grade.return_value = {'percent': 0.0}
+            self.assertEqual(self._grade()['percent'], 0.0)
+        middleware.process_response(self.request, Mock())
+
+        self.assertGreater(self._grade()['percent'], 0.0)
+
+    def test_student_module_saved_while_grading_batch(self):
+        with patch('courseware.grades.student_modules_by_student') as mock_student_modules:
+            def _save_while_loading(students, course_id):
+                """Save a StudentModule right after the batch's StudentModules were loaded."""
+                student_modules = {student.id: {} for student in students}
+                StudentModuleFactory.create(
+                    student=self.student,
+                    course_id=course_id,
+                    module_state_key=self.problem.location.url(),
+                    grade=1,
+                    max_grade=1,
+                )
+                return student_modules
+            mock_student_modules.side_effect = _save_while_loading
+            [(_, gradeset, _)] = list(iterate_grades_for(self.course.id, [self.student]))
+        self.assertEqual(gradeset['percent'], 0.0)
+
+        # The grade computed from the stale StudentModules must not be cached
+        [section_score] = self._grade()['totaled_scores']['Homework']
+        self.assertEqual(section_score.earned, 1)
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestCompactGradingContext(ModuleStoreTestCase):
+    """
+    Test grading from the compact, cached grading context.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        self.section = ItemFactory.create(
+            parent_location=chapter.location,
+            category='sequential',
+            metadata={'graded': True, 'format': 'Homework'}
+        )
+        self.problem = ItemFactory.create(parent_location=self.section.location, category='problem')
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+        cache.clear()
+
+    def test_compact_grading_context(self):
+        course = modulestore().get_course(self.course.id)
+        grading_context = compact_grading_context(course)
+        self.assertEqual(grading_context.keys(), ['graded_sections'])
+        [section] = grading_context['graded_sections']['Homework']
+        self.assertEqual(section['location'], self.section.location.url())
+        self.assertFalse(section['has_dynamic_children'])
+        self.assertEqual(
+            [problem['location'] for problem in section['problems']],
+            [self.problem.location.url()]
+        )
+
+        # The second time around, it should come from the cache
+        with patch.object(type(course), 'grading_context') as mock_grading_context:
+            self.assertEqual(compact_grading_context(course), grading_context)
+            self.assertFalse(mock_grading_context.called)
+
+    def test_grade_without_loading_problems(self):
+        StudentModuleFactory.create(
+            student=self.student,
+            course_id=self.course.id,
+            module_state_key=self.problem.location.url(),
+            grade=1,
+            max_grade=2,
+        )
+        course = modulestore().get_course(self.course.id)
+        grading_context = compact_grading_context(course)
+        with patch('courseware.grades.modulestore') as mock_modulestore:
+            grade_summary = grade(self.student, self.request, course, grading_context=grading_context)
+            self.assertFalse(mock_modulestore.called)
+        [section_score] = grade_summary['totaled_scores']['Homework']
+        self.assertEqual((section_score.earned, section_score.possible), (1, 2))
+
+    def test_load_section_once(self):
+        ItemFactory.create(parent_location=self.section.location, category='problem')
+        course = modulestore().get_course(self.course.id)
+        grading_context = compact_grading_context(course)
+        with patch('courseware.grades.modulestore', return_value=Mock(wraps=modulestore())) as mock_modulestore:
+            grade(self.student, self.request, course, grading_context=grading_context)
+            self.assertEqual(mock_modulestore.return_value.get_instance.call_count, 1)
+
+    def test_reuse_sections_loaded_for_grading_context(self):
+        StudentModuleFactory.create(
+            student=self.student,
+            course_id=self.course.id,
+            module_state_key=self.problem.location.url(),
+        )
+        course = modulestore().get_course(self.course.id)
+        with patch('courseware.grades.modulestore', return_value=Mock(wraps=modulestore())) as mock_modulestore:
+            grade(self.student, self.request, course)
+            self.assertFalse(mock_modulestore.return_value.get_instance.called)
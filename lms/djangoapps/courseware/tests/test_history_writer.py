@@ -0,0 +1,84 @@
+"""
+Tests for the batched StudentModuleHistory writer
+"""
+from django.test import TestCase
+from mock import Mock, patch
+
+from courseware.history_writer import HistoryWriter
+from courseware.middleware import HistoryWriterMiddleware
+from courseware.models import StudentModuleHistory
+from courseware.tests.factories import StudentModuleFactory
+
+
+@patch.object(HistoryWriter, '_start', Mock())
+class TestHistoryWriter(TestCase):
+    """
+    Tests of HistoryWriter, without its background thread
+    """
+    def make_writer(self, drop_when_full):
+        """
+        Return a HistoryWriter which writes batches of 2 from a queue of at most 3 entries
+        """
+        return HistoryWriter(
+            Mock(), batch_size=2, flush_interval=1, max_queued=3, drop_when_full=drop_when_full
+        )
+
+    def test_flush_in_batches(self):
+        writer = self.make_writer(drop_when_full=False)
+        writer.add(['entry1', 'entry2'])
+        writer.add(['entry3'])
+        self.assertFalse(writer.write_batch.called)
+
+        writer.flush()
+        self.assertEqual(
+            [call[0][0] for call in writer.write_batch.call_args_list],
+            [['entry1', 'entry2'], ['entry3']]
+        )
+
+    def test_write_when_full(self):
+        writer = self.make_writer(drop_when_full=False)
+        writer.add(['entry1', 'entry2', 'entry3', 'entry4', 'entry5'])
+        writer.write_batch.assert_called_once_with(['entry4', 'entry5'])
+
+    def test_drop_when_full(self):
+        writer = self.make_writer(drop_when_full=True)
+        writer.add(['entry1', 'entry2', 'entry3', 'entry4', 'entry5'])
+        self.assertFalse(writer.write_batch.called)
+
+        writer.flush()
+        self.assertEqual(
+            [call[0][0] for call in writer.write_batch.call_args_list],
+            [['entry1', 'entry2'], ['entry3']]
+        )
+
+    def test_queued_history(self):
+        writer = Mock()
+        middleware = HistoryWriterMiddleware()
+        with patch('courseware.models.history_writer', return_value=writer):
+            middleware.process_request(Mock())
+            student_module = StudentModuleFactory(module_type='problem', state='{"a_field": "a_value"}')
+            # not until the request's transaction commits
+            self.assertFalse(writer.add.called)
+            middleware.process_response(Mock(), Mock())
+
+        self.assertFalse(StudentModuleHistory.objects.filter(student_module=student_module).exists())
+        (entries,), _ = writer.add.call_args
+        self.assertEqual([entry.state for entry in entries], ['{"a_field": "a_value"}'])
+
+    def test_rolled_back_history(self):
+        writer = Mock()
+        middleware = HistoryWriterMiddleware()
+        with patch('courseware.models.history_writer', return_value=writer):
+            middleware.process_request(Mock())
+            StudentModuleFactory(module_type='problem')
+            middleware.process_exception(Mock(), Exception())
+            middleware.process_response(Mock(), Mock())
+        self.assertFalse(writer.add.called)
+
+    def test_history_outside_request(self):
+        writer = Mock()
+        with patch('courseware.models.history_writer', return_value=writer):
+            student_module = StudentModuleFactory(module_type='problem')
+        # written in the transaction, as nothing would tell when it commits
+        self.assertFalse(writer.add.called)
+        self.assertTrue(StudentModuleHistory.objects.filter(student_module=student_module).exists())
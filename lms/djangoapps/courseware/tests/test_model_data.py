@@ -7,7 +7,7 @@ from functools import partial
 
 from courseware.model_data import DjangoKeyValueStore
 from courseware.model_data import InvalidScopeError, FieldDataCache
-from courseware.models import StudentModule, XModuleUserStateSummaryField
+from courseware.models import StudentModule, StudentModuleHistory, XModuleUserStateSummaryField
 from courseware.models import XModuleStudentInfoField, XModuleStudentPrefsField
 
 from student.tests.factories import UserFactory
@@ -150,6 +150,45 @@ class TestStudentModuleStorage(OtherUserFailureTestMixin, TestCase):
         "Test that `has` returns False for missing fields in StudentModule"
         self.assertFalse(self.kvs.has(user_state_key('not_a_field')))
 
+    def test_state_decoded_once(self):
+        "Test that the state of a StudentModule is only decoded once for many reads and writes"
+        with patch('courseware.model_data.json.loads', wraps=json.loads) as mock_loads:
+            self.assertEquals('a_value', self.kvs.get(user_state_key('a_field')))
+            self.assertTrue(self.kvs.has(user_state_key('b_field')))
+            self.kvs.set(user_state_key('a_field'), 'new_value')
+            self.assertEquals('new_value', self.kvs.get(user_state_key('a_field')))
+        self.assertEquals(mock_loads.call_count, 1)
+        self.assertEquals(
+            {'b_field': 'b_value', 'a_field': 'new_value'},
+            json.loads(StudentModule.objects.all()[0].state)
+        )
+
+    def test_get_and_set_copies(self):
+        "Test that changing a value got from or set in the kvs doesn't change the StudentModule's state"
+        value = {'list': [1, 2]}
+        self.kvs.set(user_state_key('a_field'), value)
+        value['list'].append(3)
+        got_value = self.kvs.get(user_state_key('a_field'))
+        self.assertEquals({'list': [1, 2]}, got_value)
+        got_value['list'].append(4)
+        self.assertEquals({'list': [1, 2]}, self.kvs.get(user_state_key('a_field')))
+
+    def test_get_doesnt_deepcopy(self):
+        "Test that reading a list or dict field decodes its json instead of deep-copying the state"
+        self.kvs.set(user_state_key('a_field'), {'list': [1, 2]})
+        with patch('copy.deepcopy') as mock_deepcopy:
+            with patch('courseware.model_data.json.dumps', wraps=json.dumps) as mock_dumps:
+                for __ in range(3):
+                    self.assertEquals({'list': [1, 2]}, self.kvs.get(user_state_key('a_field')))
+        self.assertFalse(mock_deepcopy.called)
+        self.assertFalse(mock_dumps.called)
+
+    def test_set_unchanged_field(self):
+        "Test that setting user_state fields to their current values doesn't save the StudentModule"
+        with patch.object(StudentModule, 'save') as mock_save:
+            self.kvs.set_many({user_state_key('a_field'): 'a_value', user_state_key('b_field'): 'b_value'})
+        self.assertFalse(mock_save.called)
+
     def construct_kv_dict(self):
         """Construct a kv_dict that can be passed to set_many"""
         key1 = user_state_key('field_a')
@@ -207,6 +246,33 @@ class TestMissingStudentModule(TestCase):
         self.assertEquals(location('usage_id').url(), student_module.module_state_key)
         self.assertEquals(course_id, student_module.course_id)
 
+    def test_set_many_in_missing_student_modules(self):
+        "Test that setting fields of several missing StudentModules creates them all, with their history"
+        other_user_state_key = partial(DjangoKeyValueStore.Key, Scope.user_state, 1, location('other_usage_id'))
+        self.kvs.set_many({
+            user_state_key('a_field'): 'a_value',
+            user_state_key('b_field'): 'b_value',
+            other_user_state_key('a_field'): 'other_value',
+            prefs_key('a_pref'): 'pref_value',
+        })
+
+        self.assertEquals(3, len(self.field_data_cache.cache))
+        self.assertEquals(
+            {'a_field': 'a_value', 'b_field': 'b_value'},
+            json.loads(StudentModule.objects.get(module_state_key=location('usage_id').url()).state)
+        )
+        self.assertEquals(
+            {'a_field': 'other_value'},
+            json.loads(StudentModule.objects.get(module_state_key=location('other_usage_id').url()).state)
+        )
+        self.assertEquals('pref_value', json.loads(XModuleStudentPrefsField.objects.get(field_name='a_pref').value))
+        self.assertEquals(2, StudentModuleHistory.objects.all().count())
+
+        # the created objects are cached, and so are updated rather than created again
+        self.kvs.set(other_user_state_key('a_field'), 'new_value')
+        self.assertEquals(2, StudentModule.objects.all().count())
+        self.assertEquals('new_value', self.kvs.get(other_user_state_key('a_field')))
+
     def test_delete_field_from_missing_student_module(self):
         "Test that deleting a field from a missing StudentModule raises a KeyError"
         self.assertRaises(KeyError, self.kvs.delete, user_state_key('a_field'))
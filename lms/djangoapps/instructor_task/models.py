@@ -14,6 +14,7 @@ ASSUMPTIONS: modules have unique IDs, even across different module_types
 """
 from cStringIO import StringIO
 from gzip import GzipFile
+from tempfile import TemporaryFile
 from uuid import uuid4
 import csv
 import json
@@ -196,6 +197,11 @@ class ReportStore(object):
     can simply be appended to for the sake of memory efficiency, rather than
     passing in the whole dataset. Doing that for now just because it's simpler.
     """
+    # Filename suffix for intermediate files, such as the partial CSVs written
+    # by each subtask of a sharded grade report. They are never listed by
+    # `links_for()`, since they are merged into a final report and deleted.
+    PARTIAL_SUFFIX = ".partial"
+
     @classmethod
     def from_config(cls):
         """
@@ -275,21 +281,30 @@ class S3ReportStore(ReportStore):
         transparent via the browser). Filenames should end in whatever
         suffix makes sense for the original file, so `.txt` instead of `.gz`
         """
+        self.store_file(course_id, filename, StringIO(buff.getvalue()))
+
+    def store_file(self, course_id, filename, data_file):
+        """
+        Like `store()`, but reads the gzip-encoded contents from the start of
+        the file object `data_file`, so that they don't have to fit in memory.
+        """
         key = self.key_for(course_id, filename)
 
-        data = buff.getvalue()
-        key.size = len(data)
+        data_file.seek(0, os.SEEK_END)
+        size = data_file.tell()
+        data_file.seek(0)
+        key.size = size
         key.content_encoding = "gzip"
         key.content_type = "text/csv"
 
         # Just setting the content encoding and type above should work
         # according to the docs, but when experimenting, this was necessary for
         # it to actually take.
-        key.set_contents_from_string(
-            data,
+        key.set_contents_from_file(
+            data_file,
             headers={
                 "Content-Encoding": "gzip",
-                "Content-Length": len(data),
+                "Content-Length": size,
                 "Content-Type": "text/csv",
             }
         )
@@ -297,18 +312,39 @@ class S3ReportStore(ReportStore):
     def store_rows(self, course_id, filename, rows):
         """
         Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        strings), write a gzip'd csv file to a temporary file, and then
+        `store_file()` it. `rows` can be any iterable, including a generator,
+        so that large reports don't have to be built in memory.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
+        with TemporaryFile() as temp_file:
+            gzip_file = GzipFile(fileobj=temp_file, mode="wb")
+            csv.writer(gzip_file).writerows(rows)
+            gzip_file.close()
+
+            self.store_file(course_id, filename, temp_file)
 
-        self.store(course_id, filename, output_buffer)
+    def exists(self, course_id, filename):
+        """Return whether a file named `filename` is stored for `course_id`."""
+        return self.bucket.get_key(self.key_for(course_id, filename).key) is not None
+
+    def read_rows(self, course_id, filename):
+        """
+        Yield the rows stored by `store_rows()` in `filename` for `course_id`.
+        Each row is a list of strings. The file is downloaded to a temporary
+        file first, rather than into memory.
+        """
+        with TemporaryFile() as temp_file:
+            self.key_for(course_id, filename).get_contents_to_file(temp_file)
+            temp_file.seek(0)
+            for row in csv.reader(GzipFile(fileobj=temp_file, mode="rb")):
+                yield row
+
+    def delete(self, course_id, filename):
+        """Delete the file named `filename` for `course_id`."""
+        self.key_for(course_id, filename).delete()
 
     def links_for(self, course_id):
         """
@@ -320,6 +356,7 @@ class S3ReportStore(ReportStore):
             [
                 (key.key.split("/")[-1], key.generate_url(expires_in=300))
                 for key in self.bucket.list(prefix=course_dir.key)
+                if not key.key.endswith(self.PARTIAL_SUFFIX)
             ],
             reverse=True
         )
@@ -369,22 +406,45 @@ class LocalFSReportStore(ReportStore):
         assumed to be a StringIO objecd (or anything that can flush its contents
         to string using `.getvalue()`).
         """
+        with self._open_for_write(course_id, filename) as f:
+            f.write(buff.getvalue())
+
+    def store_rows(self, course_id, filename, rows):
+        """
+        Given a course_id, filename, and rows (each row is an iterable of strings),
+        write this data out. `rows` can be any iterable, including a generator;
+        the rows are written as they are produced.
+        """
+        with self._open_for_write(course_id, filename) as f:
+            csv.writer(f).writerows(rows)
+
+    def _open_for_write(self, course_id, filename):
+        """
+        Open the file for `filename` in `course_id` for writing, creating the
+        course directory if needed.
+        """
         full_path = self.path_to(course_id, filename)
         directory = os.path.dirname(full_path)
         if not os.path.exists(directory):
             os.mkdir(directory)
+        return open(full_path, "wb")
 
-        with open(full_path, "wb") as f:
-            f.write(buff.getvalue())
+    def exists(self, course_id, filename):
+        """Return whether a file named `filename` is stored for `course_id`."""
+        return os.path.exists(self.path_to(course_id, filename))
 
-    def store_rows(self, course_id, filename, rows):
+    def read_rows(self, course_id, filename):
         """
-        Given a course_id, filename, and rows (each row is an iterable of strings),
-        write this data out.
+        Yield the rows stored by `store_rows()` in `filename` for `course_id`.
+        Each row is a list of strings.
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        with open(self.path_to(course_id, filename), "rb") as f:
+            for row in csv.reader(f):
+                yield row
+
+    def delete(self, course_id, filename):
+        """Delete the file named `filename` for `course_id`."""
+        os.remove(self.path_to(course_id, filename))
 
     def links_for(self, course_id):
         """
@@ -401,6 +461,7 @@ class LocalFSReportStore(ReportStore):
             [
                 (filename, ("file://" + urllib.quote(os.path.join(course_dir, filename))))
                 for filename in os.listdir(course_dir)
+                if not filename.endswith(self.PARTIAL_SUFFIX)
             ],
             reverse=True
         )
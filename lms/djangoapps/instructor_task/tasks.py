@@ -31,6 +31,8 @@ from instructor_task.tasks_helper import (
     reset_attempts_module_state,
     delete_problem_module_state,
     push_grades_to_s3,
+    perform_delegate_grade_batches,
+    grade_students_for_report,
 )
 from bulk_email.tasks import perform_delegate_email_batches
 
@@ -135,7 +137,25 @@ def send_bulk_course_email(entry_id, _xmodule_instance_args):
 def calculate_grades_csv(entry_id, xmodule_instance_args):
     """
     Grade a course and push the results to an S3 bucket for download.
+
+    If settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK is set, the enrolled students
+    are instead split up between `calculate_grades_csv_subtask` subtasks, which
+    grade them in parallel.
     """
     action_name = ugettext_noop('graded')
-    task_fn = partial(push_grades_to_s3, xmodule_instance_args)
+    if settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK:
+        task_fn = partial(perform_delegate_grade_batches, calculate_grades_csv_subtask)
+    else:
+        task_fn = partial(push_grades_to_s3, xmodule_instance_args)
     return run_main_task(entry_id, task_fn, action_name)
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def calculate_grades_csv_subtask(entry_id, course_id, student_ids, report_name, part_number, subtask_status_dict):
+    """
+    Grade a slice of the students of a course for a grade report queued by
+    `calculate_grades_csv`.
+    """
+    return grade_students_for_report(
+        entry_id, course_id, student_ids, report_name, part_number, subtask_status_dict
+    )
@@ -6,12 +6,15 @@ running state of a course.
 import json
 import urllib
 from datetime import datetime
+from itertools import chain, count
 from time import time
 
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction, reset_queries
 from dogapi import dog_stats_api
 from pytz import UTC
@@ -24,6 +27,13 @@ from courseware.models import StudentModule
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module_for_descriptor_internal
 from instructor_task.models import ReportStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    SUBTASK_LOCK_EXPIRE,
+    queue_subtasks_for_query,
+    check_subtask_is_valid,
+    update_subtask_status,
+)
 from student.models import CourseEnrollment
 
 # define different loggers for use within tasks and on client side
@@ -513,7 +523,8 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
     header = None
     rows = []
     err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
+    batch_size = settings.GRADES_DOWNLOAD_STUDENTS_PER_QUERY
+    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students, batch_size=batch_size):
         # Periodically update task status (this is a cache write)
         if num_attempted % status_interval == 0:
             update_task_progress()
@@ -523,24 +534,9 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
             # We were able to successfully grade this student for this course.
             num_succeeded += 1
             if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
+                header = _grade_report_header(gradeset)
                 rows.append(["id", "email", "username", "grade"] + header)
-
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
-
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
+            rows.append(_grade_report_row(student, gradeset, header))
         else:
             # An empty gradeset means we failed to grade a student.
             num_failed += 1
@@ -550,25 +546,242 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
     curr_step = "Uploading CSVs"
     update_task_progress()
 
-    # Generate parts of the file name
+    # Perform the actual upload
+    report_name = _grade_report_name(course_id, start_time)
+    report_store = ReportStore.from_config()
+    report_store.store_rows(course_id, u"{}.csv".format(report_name), rows)
+
+    # If there are any error rows (don't count the header), write them out as well
+    if len(err_rows) > 1:
+        report_store.store_rows(course_id, u"{}_err.csv".format(report_name), err_rows)
+
+    # One last update before we close out...
+    return update_task_progress()
+
+
+def _grade_report_name(course_id, start_time):
+    """
+    Return the base file name (without extension) of the grade report for
+    `course_id` that was started at `start_time`.
+    """
     timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
     course_id_prefix = urllib.quote(course_id.replace("/", "_"))
+    return u"{}_grade_report_{}".format(course_id_prefix, timestamp_str)
 
-    # Perform the actual upload
+
+def _grade_report_header(gradeset):
+    """Return the section labels of `gradeset`, used as grade report columns."""
+    # Encode the header row in utf-8 encoding in case there are unicode characters
+    return [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
+
+
+def _grade_report_row(student, gradeset, header):
+    """Return the grade report row for `student`, given their `gradeset`."""
+    percents = {
+        section['label']: section.get('percent', 0.0)
+        for section in gradeset[u'section_breakdown']
+        if 'label' in section
+    }
+
+    # Not everybody has the same gradable items. If the item is not
+    # found in the user's gradeset, just assume it's a 0. The aggregated
+    # grades for their sections and overall course will be calculated
+    # without regard for the item they didn't have access to, so it's
+    # possible for a student to have a 0.0 show up in their row but
+    # still have 100% for the course.
+    row_percents = [percents.get(label, 0.0) for label in header]
+    return [student.id, student.email, student.username, gradeset['percent']] + row_percents
+
+
+def _grade_report_part_names(report_name, part_number):
+    """
+    Return the names of the partial grade and error CSVs written by subtask
+    number `part_number` of a sharded grade report.
+    """
+    return (
+        u"{}_{:05d}.csv{}".format(report_name, part_number, ReportStore.PARTIAL_SUFFIX),
+        u"{}_{:05d}_err.csv{}".format(report_name, part_number, ReportStore.PARTIAL_SUFFIX),
+    )
+
+
+def perform_delegate_grade_batches(grade_subtask, entry_id, course_id, _task_input, action_name):
+    """
+    Delegates grade report generation for `course_id` by chopping up the
+    enrolled students into slices of no more than
+    settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK students, and queueing up a
+    `grade_subtask` for each of them.
+
+    Each subtask grades its slice of students and writes partial CSVs to the
+    `ReportStore` (see `grade_students_for_report`). Once the last subtask
+    has completed, the partial CSVs are merged into the final report.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+
+    # If the task gets requeued after its subtasks have already been defined,
+    # don't queue up a second set of them (see perform_delegate_email_batches).
+    if len(entry.subtasks) > 0 and len(entry.task_output) > 0:
+        TASK_LOG.warning("Task %s has already been processed for grades!  InstructorTask = %s", entry.task_id, entry)
+        return json.loads(entry.task_output)
+
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
+    if not enrolled_students.exists():
+        # There is nobody to split up between subtasks, so just write out the
+        # (empty) report directly.
+        return push_grades_to_s3(None, entry_id, course_id, _task_input, action_name)
+
+    report_name = _grade_report_name(course_id, datetime.now(UTC))
+    part_numbers = count()
+
+    def _create_grade_subtask(to_list, initial_subtask_status):
+        """Creates a subtask to grade a given list of students."""
+        return grade_subtask.subtask(
+            (
+                entry_id,
+                course_id,
+                [item['pk'] for item in to_list],
+                report_name,
+                next(part_numbers),
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+        )
+
+    TASK_LOG.info(u"Task %s: Preparing to queue subtasks for grading course %s", entry.task_id, course_id)
+
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_grade_subtask,
+        enrolled_students,
+        [],
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK,
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK,
+    )
+
+
+def grade_students_for_report(entry_id, course_id, student_ids, report_name, part_number, subtask_status_dict):
+    """
+    Grades the students with ids `student_ids` in `course_id`, as one subtask
+    of a grade report queued by `perform_delegate_grade_batches`.
+
+    The rows for these students are stored as partial CSVs in the
+    `ReportStore`, and progress is recorded on the InstructorTask with id
+    `entry_id`. The subtask that completes last merges all partial CSVs
+    into the final `report_name` report.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    TASK_LOG.info("Preparing to grade %d students as subtask %s for instructor task %d",
+                  len(student_ids), current_task_id, entry_id)
+
+    # Reject duplicate or already-completed subtasks, as send_course_email does.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    try:
+        rows = []
+        err_rows = []
+        header = None
+        students = User.objects.filter(id__in=student_ids).order_by('id')
+        batch_size = settings.GRADES_DOWNLOAD_STUDENTS_PER_QUERY
+        for student, gradeset, err_msg in iterate_grades_for(course_id, students, batch_size=batch_size):
+            if gradeset:
+                if not header:
+                    header = _grade_report_header(gradeset)
+                    rows.append(["id", "email", "username", "grade"] + header)
+                rows.append(_grade_report_row(student, gradeset, header))
+            else:
+                err_rows.append([student.id, student.username, err_msg])
+
+        report_store = ReportStore.from_config()
+        grade_part_name, err_part_name = _grade_report_part_names(report_name, part_number)
+        report_store.store_rows(course_id, grade_part_name, rows)
+        report_store.store_rows(course_id, err_part_name, err_rows)
+    except Exception:
+        # Since we don't know how far we got, count all students as having failed.
+        TASK_LOG.exception("Grade report subtask %s for instructor task %d: failed unexpectedly!",
+                           current_task_id, entry_id)
+        subtask_status.increment(failed=len(student_ids), state=FAILURE)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        raise
+    else:
+        num_succeeded = len(rows) - 1 if rows else 0
+        subtask_status.increment(succeeded=num_succeeded, failed=len(err_rows), state=SUCCESS)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+    finally:
+        # The last subtask to finish merges the report, even if it failed itself.
+        _merge_grade_report_if_complete(entry_id, course_id, report_name)
+
+    return subtask_status.to_dict()
+
+
+def _merge_grade_report_if_complete(entry_id, course_id, report_name):
+    """
+    If every subtask of the grade report for InstructorTask `entry_id` has
+    finished, merge their partial CSVs into the final report, in the order
+    the subtasks were queued, and delete the partial CSVs.
+
+    The partial CSVs are streamed into the final report one row at a time,
+    so the whole report never has to fit in memory.
+
+    A cache lock makes sure that only one subtask performs the merge, even
+    if several of them see the task as complete.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    subtask_dict = json.loads(entry.subtasks)
+    if subtask_dict['succeeded'] + subtask_dict['failed'] < subtask_dict['total']:
+        return
+
+    if not cache.add("grade-report-merge-{}".format(entry.task_id), 'true', SUBTASK_LOCK_EXPIRE):
+        return
+
+    TASK_LOG.info("Merging %d partial grade reports for instructor task %d", subtask_dict['total'], entry_id)
     report_store = ReportStore.from_config()
+    part_names = []
+    for part_number in xrange(subtask_dict['total']):
+        grade_part_name, err_part_name = _grade_report_part_names(report_name, part_number)
+        if report_store.exists(course_id, grade_part_name):
+            part_names.append((grade_part_name, err_part_name))
+        else:
+            # The subtask failed before it could store its rows.
+            TASK_LOG.warning("Missing partial grade report %s for instructor task %d", grade_part_name, entry_id)
+
     report_store.store_rows(
         course_id,
-        u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
+        u"{}.csv".format(report_name),
+        _merged_grade_rows(report_store, course_id, [grade_part_name for grade_part_name, _ in part_names])
     )
 
-    # If there are any error rows (don't count the header), write them out as well
-    if len(err_rows) > 1:
+    err_rows = chain.from_iterable(
+        report_store.read_rows(course_id, err_part_name) for _, err_part_name in part_names
+    )
+    first_err_row = next(err_rows, None)
+    if first_err_row is not None:
         report_store.store_rows(
             course_id,
-            u"{}_grade_report_{}_err.csv".format(course_id_prefix, timestamp_str),
-            err_rows
+            u"{}_err.csv".format(report_name),
+            chain([["id", "username", "error_msg"], first_err_row], err_rows)
         )
 
-    # One last update before we close out...
-    return update_task_progress()
+    for grade_part_name, err_part_name in part_names:
+        report_store.delete(course_id, grade_part_name)
+        report_store.delete(course_id, err_part_name)
+
+
+def _merged_grade_rows(report_store, course_id, grade_part_names):
+    """
+    Yield the rows of the partial grade CSVs named `grade_part_names`, in
+    order. Every partial that graded anybody starts with the header row,
+    which is only yielded once.
+    """
+    header = None
+    for grade_part_name in grade_part_names:
+        part_rows = report_store.read_rows(course_id, grade_part_name)
+        part_header = next(part_rows, None)
+        if part_header is None:
+            continue
+        if header is None:
+            header = part_header
+            yield header
+        for row in part_rows:
+            yield row
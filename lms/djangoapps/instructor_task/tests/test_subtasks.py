@@ -1,13 +1,22 @@
 """
 Unit tests for instructor_task subtasks.
 """
+import json
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
 from uuid import uuid4
 
+from celery.states import SUCCESS
+from django.test.utils import override_settings
 from mock import Mock, patch
 
+from courseware.grades import iterate_grades_for
 from student.models import CourseEnrollment
 
+from instructor_task.models import InstructorTask, ReportStore
 from instructor_task.subtasks import queue_subtasks_for_query
+from instructor_task.tasks_helper import perform_delegate_grade_batches, grade_students_for_report
 from instructor_task.tests.factories import InstructorTaskFactory
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase
 
@@ -93,3 +102,77 @@ class TestSubtasks(InstructorTaskCourseTestCase):
         self.assertEqual(len(mock_create_subtask_fcn_args[1][0][0]), 3)
         self.assertEqual(len(mock_create_subtask_fcn_args[2][0][0]), 4)
         self.assertEqual(len(mock_create_subtask_fcn_args[3][0][0]), 4)
+
+
+class TestGradeReportSubtasks(InstructorTaskCourseTestCase):
+    """Tests for grade reports generated by subtasks."""
+
+    def setUp(self):
+        super(TestGradeReportSubtasks, self).setUp()
+        self.initialize_course()
+        self.report_dir = mkdtemp()
+        self.addCleanup(rmtree, self.report_dir)
+        self.students = [self.create_student('student{}'.format(index)) for index in range(5)]
+
+    def _create_entry(self):
+        """Create the InstructorTask of a grade report."""
+        return InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='grade_course',
+        )
+
+    def _grade_subtask(self):
+        """Return a mock celery task whose subtasks run right away instead of being queued."""
+        def _run_subtask(args, task_id, routing_key):  # pylint: disable=unused-argument
+            """Instead of queueing the subtask, return one that runs it right away."""
+            return Mock(apply_async=lambda: grade_students_for_report(*args))
+
+        return Mock(subtask=Mock(side_effect=_run_subtask))
+
+    def test_grade_report_subtasks(self):
+        """Each subtask grades a slice of students, and the last one merges their rows."""
+        entry = self._create_entry()
+        grade_subtask = self._grade_subtask()
+        grades_download = {'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.report_dir}
+        with override_settings(GRADES_DOWNLOAD=grades_download, GRADES_DOWNLOAD_STUDENTS_PER_TASK=2):
+            perform_delegate_grade_batches(grade_subtask, entry.id, self.course.id, {}, 'graded')
+
+            self.assertEqual(grade_subtask.subtask.call_count, 3)
+            report_store = ReportStore.from_config()
+            links = report_store.links_for(self.course.id)
+            self.assertEqual(len(links), 1)
+            rows = list(report_store.read_rows(self.course.id, links[0][0]))
+
+        self.assertEqual(rows[0][:4], ["id", "email", "username", "grade"])
+        self.assertEqual([row[2] for row in rows[1:]], [student.username for student in self.students])
+
+        entry = InstructorTask.objects.get(id=entry.id)
+        self.assertEqual(entry.task_state, SUCCESS)
+        self.assertEqual(json.loads(entry.task_output)['succeeded'], len(self.students))
+
+    def test_last_subtask_fails(self):
+        """If the last subtask to finish fails, it still merges the rows of the others."""
+        entry = self._create_entry()
+        last_student = self.students[-1]
+
+        def _iterate_grades_for(course_id, students, batch_size):
+            """Fail to grade the slice of students with the last student in it."""
+            if last_student in students:
+                raise Exception("Cannot grade {}".format(last_student.username))
+            return iterate_grades_for(course_id, students, batch_size=batch_size)
+
+        grades_download = {'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.report_dir}
+        with override_settings(GRADES_DOWNLOAD=grades_download, GRADES_DOWNLOAD_STUDENTS_PER_TASK=2):
+            with patch('instructor_task.tasks_helper.iterate_grades_for', _iterate_grades_for):
+                with self.assertRaises(Exception):
+                    perform_delegate_grade_batches(self._grade_subtask(), entry.id, self.course.id, {}, 'graded')
+
+            report_store = ReportStore.from_config()
+            links = report_store.links_for(self.course.id)
+            self.assertEqual(len(links), 1)
+            rows = list(report_store.read_rows(self.course.id, links[0][0]))
+            self.assertEqual(os.listdir(report_store.path_to(self.course.id, '')), [links[0][0]])
+
+        self.assertEqual([row[2] for row in rows[1:]], [student.username for student in self.students[:-1]])
@@ -357,10 +357,40 @@ TRACKING_BACKENDS.update(AUTH_TOKENS.get("TRACKING_BACKENDS", {}))
 # Student identity verification settings
 VERIFY_STUDENT = AUTH_TOKENS.get("VERIFY_STUDENT", VERIFY_STUDENT)
 
+# Local disk cache for large static content
+CONTENTSERVER_DISK_CACHE_DIR = ENV_TOKENS.get("CONTENTSERVER_DISK_CACHE_DIR", CONTENTSERVER_DISK_CACHE_DIR)
+CONTENTSERVER_DISK_CACHE_MAX_BYTES = ENV_TOKENS.get(
+    "CONTENTSERVER_DISK_CACHE_MAX_BYTES", CONTENTSERVER_DISK_CACHE_MAX_BYTES
+)
+
+# Grade cache
+GRADE_CACHE_TIMEOUT = ENV_TOKENS.get("GRADE_CACHE_TIMEOUT", GRADE_CACHE_TIMEOUT)
+
 # Grades download
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
 
 GRADES_DOWNLOAD = ENV_TOKENS.get("GRADES_DOWNLOAD", GRADES_DOWNLOAD)
+GRADES_DOWNLOAD_STUDENTS_PER_QUERY = ENV_TOKENS.get(
+    "GRADES_DOWNLOAD_STUDENTS_PER_QUERY", GRADES_DOWNLOAD_STUDENTS_PER_QUERY
+)
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = ENV_TOKENS.get(
+    "GRADES_DOWNLOAD_STUDENTS_PER_TASK", GRADES_DOWNLOAD_STUDENTS_PER_TASK
+)
+
+# StudentModule history
+STUDENT_MODULE_HISTORY_WRITER = ENV_TOKENS.get("STUDENT_MODULE_HISTORY_WRITER", STUDENT_MODULE_HISTORY_WRITER)
+STUDENT_MODULE_HISTORY_BATCH_SIZE = ENV_TOKENS.get(
+    "STUDENT_MODULE_HISTORY_BATCH_SIZE", STUDENT_MODULE_HISTORY_BATCH_SIZE
+)
+STUDENT_MODULE_HISTORY_FLUSH_INTERVAL = ENV_TOKENS.get(
+    "STUDENT_MODULE_HISTORY_FLUSH_INTERVAL", STUDENT_MODULE_HISTORY_FLUSH_INTERVAL
+)
+STUDENT_MODULE_HISTORY_MAX_QUEUED = ENV_TOKENS.get(
+    "STUDENT_MODULE_HISTORY_MAX_QUEUED", STUDENT_MODULE_HISTORY_MAX_QUEUED
+)
+STUDENT_MODULE_HISTORY_DROP_WHEN_FULL = ENV_TOKENS.get(
+    "STUDENT_MODULE_HISTORY_DROP_WHEN_FULL", STUDENT_MODULE_HISTORY_DROP_WHEN_FULL
+)
 
 ##### ACCOUNT LOCKOUT DEFAULT PARAMETERS #####
 MAX_FAILED_LOGIN_ATTEMPTS_ALLOWED = ENV_TOKENS.get("MAX_FAILED_LOGIN_ATTEMPTS_ALLOWED", 5)
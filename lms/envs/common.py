@@ -209,6 +209,9 @@ FEATURES = {
     # whether to use password policy enforcement or not
     'ENFORCE_PASSWORD_POLICY': False,
 
+    # Cache students' course grades until their state or the course changes
+    'ENABLE_GRADE_CACHE': False,
+
     # Give course staff unrestricted access to grade downloads (if set to False,
     # only edX superusers can perform the downloads)
     'ALLOW_COURSE_STAFF_GRADE_DOWNLOADS': False,
@@ -426,6 +429,12 @@ MODULESTORE = {
     }
 }
 CONTENTSTORE = None
+
+# If set, static content that is too large for memcached is cached in this
+# directory on each server, keeping the least recently used files under
+# CONTENTSERVER_DISK_CACHE_MAX_BYTES in total.
+CONTENTSERVER_DISK_CACHE_DIR = None
+CONTENTSERVER_DISK_CACHE_MAX_BYTES = 10 * 1024 ** 3
 DOC_STORE_CONFIG = {
     'host': 'localhost',
     'db': 'xmodule',
@@ -738,6 +747,8 @@ MIDDLEWARE_CLASSES = (
     # Detects user-requested locale from 'accept-language' header in http request
     'django.middleware.locale.LocaleMiddleware',
 
+    # queues StudentModuleHistory entries once the transaction commits, so must come before it
+    'courseware.middleware.HistoryWriterMiddleware',
     'django.middleware.transaction.TransactionMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
 
@@ -1241,15 +1252,47 @@ REGISTRATION_EXTRA_FIELDS = {
 CERT_NAME_SHORT = "Certificate"
 CERT_NAME_LONG = "Certificate of Achievement"
 
+###################### Grade Cache ######################
+# Grade summaries cached by the ENABLE_GRADE_CACHE feature are recomputed at
+# least this often (in seconds), since they also depend on dates such as
+# section release dates.
+GRADE_CACHE_TIMEOUT = 60 * 5
+
 ###################### Grade Downloads ######################
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
 
+# Number of students whose StudentModules are loaded with a single query
+# when generating grade reports.
+GRADES_DOWNLOAD_STUDENTS_PER_QUERY = 100
+
+# If set, grade reports are generated by subtasks that each grade at most
+# this many students in parallel, instead of by a single task.
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = None
+
 GRADES_DOWNLOAD = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-grades',
     'ROOT_PATH': '/tmp/edx-s3/grades',
 }
 
+###################### StudentModule History ######################
+# How StudentModuleHistory entries are written (see courseware.history_writer):
+#   'sync': in the request which saves their StudentModule
+#   'thread': in batches by a background thread in each process
+#   'celery': in batches by the save_student_module_history celery task
+STUDENT_MODULE_HISTORY_WRITER = 'sync'
+
+# Batched entries are written once this many are queued, or at least this
+# often (in seconds)
+STUDENT_MODULE_HISTORY_BATCH_SIZE = 100
+STUDENT_MODULE_HISTORY_FLUSH_INTERVAL = 1.0
+
+# At most this many entries are queued in each process, which bounds how
+# many can be lost if it dies. Once the queue is full, further entries are
+# written in the request, or dropped if STUDENT_MODULE_HISTORY_DROP_WHEN_FULL.
+STUDENT_MODULE_HISTORY_MAX_QUEUED = 10000
+STUDENT_MODULE_HISTORY_DROP_WHEN_FULL = False
+
 #### PASSWORD POLICY SETTINGS #####
 
 PASSWORD_MIN_LENGTH = None